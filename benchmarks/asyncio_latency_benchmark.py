@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Measure the latency that other clients of an asyncio server see while the
+debugger is stopped in one of its tasks.
+
+A small echo server is queried by a client every few milliseconds. Meanwhile,
+one task "stops in the debugger" for one second, in two ways: blocking the
+thread (like the default prompt), and serving the event loop with an
+`EventLoopPump` (like `set_trace(serve_event_loop=True)`). The prompt is
+simulated by a pipe that becomes readable after one second.
+"""
+from __future__ import unicode_literals, print_function
+from ptpdb.coroutines import EventLoopPump
+
+import asyncio
+import os
+import threading
+import time
+
+SESSION_TIME = 1.
+REQUEST_INTERVAL = .005
+
+
+class FakeInputHookContext(object):
+    " Like prompt_toolkit's `InputHookContext`: there is input after a while. "
+    def __init__(self, delay):
+        self._r, self._w = os.pipe()
+        threading.Timer(delay, os.write, (self._w, b'x')).start()
+
+    def fileno(self):
+        return self._r
+
+    def close(self):
+        os.close(self._r)
+        os.close(self._w)
+
+
+async def handle_client(reader, writer):
+    while True:
+        data = await reader.readline()
+        if not data:
+            break
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+
+async def client(port, latencies, stop):
+    """
+    Send a request every `REQUEST_INTERVAL`. The latency is counted from the
+    moment the request was due, so that time in which the client itself
+    didn't get scheduled counts too.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    due = time.perf_counter()
+
+    while not stop.is_set():
+        await asyncio.sleep(max(0, due - time.perf_counter()))
+        writer.write(b'ping\n')
+        await reader.readline()
+        latencies.append(time.perf_counter() - due)
+        due = max(due + REQUEST_INTERVAL, time.perf_counter())
+    writer.close()
+
+
+def stop_in_debugger(serve_event_loop):
+    " Called from the task that hits the breakpoint. "
+    if serve_event_loop:
+        context = FakeInputHookContext(SESSION_TIME)
+        try:
+            EventLoopPump.for_running_loop()(context)
+        finally:
+            context.close()
+    else:
+        time.sleep(SESSION_TIME)
+
+
+async def debugged_task(serve_event_loop):
+    await asyncio.sleep(.2)
+    stop_in_debugger(serve_event_loop)
+
+
+async def run(serve_event_loop):
+    server = await asyncio.start_server(handle_client, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    latencies = []
+    stop = asyncio.Event()
+    clients = [asyncio.ensure_future(client(port, latencies, stop)) for i in range(4)]
+
+    await debugged_task(serve_event_loop)
+    await asyncio.sleep(.2)
+
+    stop.set()
+    await asyncio.gather(*clients)
+    server.close()
+    await server.wait_closed()
+    return latencies
+
+
+def report(title, latencies):
+    latencies = sorted(latencies)
+    print('%s:' % title)
+    print('    Requests:    %i' % len(latencies))
+    print('    Median:      %.2fms' % (latencies[len(latencies) // 2] * 1000))
+    print('    99th perc.:  %.2fms' % (latencies[int(len(latencies) * .99)] * 1000))
+    print('    Maximum:     %.2fms' % (latencies[-1] * 1000))
+
+
+def main():
+    report('Blocking prompt', asyncio.run(run(serve_event_loop=False)))
+    report('Serving the event loop', asyncio.run(run(serve_event_loop=True)))
+
+
+if __name__ == '__main__':
+    main()
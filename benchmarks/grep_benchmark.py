@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Measure the `grep` command on the loaded modules.
+
+Imports most of the standard library, and measures how long it takes to build
+the trigram index of the loaded modules, and the latency of searches with
+selective and with common patterns.
+"""
+from __future__ import unicode_literals, print_function
+from ptpdb.textsearch import TrigramIndex, get_source_files
+
+import os
+import pkgutil
+import time
+import timeit
+import warnings
+
+
+def import_standard_library():
+    " Import the modules of the standard library (the ones that can be). "
+    directory = os.path.dirname(os.__file__)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for module in pkgutil.walk_packages([directory], onerror=lambda name: None):
+            name = module.name
+            if name in ('antigravity', 'this') or '__main__' in name or '.test' in name or \
+                    name.startswith(('test', 'idlelib', 'tkinter', 'turtle')):
+                continue
+            try:
+                __import__(name)
+            except BaseException:
+                pass
+
+
+def main():
+    import_standard_library()
+
+    filenames = get_source_files()
+    size = sum(os.path.getsize(f) for f in filenames if os.path.exists(f))
+    print('Loaded modules:       %i files, %.1f MiB' % (len(filenames), size / 1024. / 1024))
+
+    index = TrigramIndex()
+    start = time.time()
+    index.build()
+    index.ready.wait()
+    print('Index:                %.1f s' % (time.time() - start))
+
+    number = 10
+    for pattern in [r'def get_\w+_handler', 'NotImplementedError', r'\bself\b']:
+        duration = timeit.timeit(lambda: index.search(pattern), number=number)
+        print('Search %-22r %.1f ms' % (pattern, duration / number * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Measure the prompt history with a large history file.
+
+Writes a history file of about 20MB (many repeated commands, like after years
+of use), and measures how long it takes before the prompt can be shown, how
+long it takes to build the index and compact the file, and the latency of
+searching the complete history.
+"""
+from __future__ import unicode_literals, print_function
+from ptpdb.history import PdbHistory, _format
+
+import os
+import random
+import tempfile
+import time
+import timeit
+
+
+def create_history_file(filename, count):
+    random.seed(0)
+    commands = ['next', 'step', 'continue', 'where', 'up', 'down']
+
+    with open(filename, 'wb') as f:
+        for i in range(count):
+            if random.random() < .7:
+                entry = random.choice(commands)
+            else:
+                entry = 'p variable_%i[%i]' % (random.randrange(50000), random.randrange(10))
+            f.write(_format(entry))
+
+
+def main():
+    filename = os.path.join(tempfile.mkdtemp(), 'history')
+    create_history_file(filename, 500000)
+    print('History file:         %.1f MiB' % (os.path.getsize(filename) / 1024. / 1024))
+
+    start = time.time()
+    history = PdbHistory(filename)
+    print('Startup:              %.1f ms' % ((time.time() - start) * 1000))
+
+    history._loader.join()
+    print('Index and compaction: %.1f ms' % ((time.time() - start) * 1000))
+    print('Compacted file:       %.1f MiB' % (os.path.getsize(filename) / 1024. / 1024))
+    print('Entries in the index: %i' % len(history.index))
+
+    number = 1000
+    for text, prefix in [('variable_123', False), ('p variable_4', True), ('not there', False)]:
+        duration = timeit.timeit(lambda: next(history.search(text, prefix=prefix), None), number=number)
+        print('Search %-15r %.1f us' % (text, duration / number * 1e6))
+
+    os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
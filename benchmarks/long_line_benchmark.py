@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Measure the rendering of source files with extremely long lines.
+
+Writes a module with a line of 10MB (a minified JSON document, like generated
+code often contains), stops in it, and measures what the debugger does for
+every stop: creating the document of the source pane, lexing the visible
+lines, and the line preview of the call stack.
+"""
+from __future__ import unicode_literals, print_function
+from ptpdb import PtPdb
+from ptpdb.layout import format_stack_entry
+from ptpdb.prefetch import SourceView
+
+from prompt_toolkit.document import Document
+from prompt_toolkit.layout.lexers import PygmentsLexer
+from pygments.lexers import PythonLexer
+
+import json
+import linecache
+import os
+import sys
+import tempfile
+import timeit
+
+LINE_SIZE = 10 * 1024 * 1024
+
+
+def create_module(directory):
+    " Write the fixture: a module with a line of `LINE_SIZE` characters. "
+    items = []
+    size = 0
+    while size < LINE_SIZE:
+        item = {'id': len(items), 'name': 'item-%i' % len(items), 'tags': ['a', 'b']}
+        items.append(item)
+        size += len(json.dumps(item, separators=(',', ':'))) + 1
+
+    filename = os.path.join(directory, 'long_line_module.py')
+    with open(filename, 'w') as f:
+        f.write('import sys\n')
+        f.write('DATA = %s; frame = sys._getframe()\n' % json.dumps(items, separators=(',', ':')))
+        f.write('def get_frame():\n')
+        f.write('    return frame\n')
+    return filename
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    filename = create_module(directory)
+    print('Longest line:         %.1f MiB' % (os.path.getsize(filename) / 1024. / 1024))
+
+    sys.path.insert(0, directory)
+    import long_line_module
+    frame = long_line_module.get_frame()
+
+    pdb = PtPdb()
+    pdb.curframe = pdb.curframe_locals = None
+    pdb.reset()
+    pdb.setup(frame, None)
+
+    def show_source():
+        pdb.source_hscroll = None
+        view = SourceView(linecache.getlines(filename), pdb.long_line_width, 0)
+
+        # Lex the visible lines, like the source pane does.
+        document = Document(view.text)
+        get_line = PygmentsLexer(PythonLexer).lex_document(None, document)
+        for i in range(document.line_count):
+            get_line(i)
+
+    number = 10
+    duration = timeit.timeit(show_source, number=number)
+    print('Source pane:          %.1f ms' % (duration / number * 1000))
+
+    duration = timeit.timeit(lambda: format_stack_entry(pdb, frame, 2), number=number)
+    print('Call stack entry:     %.1f ms' % (duration / number * 1000))
+
+    os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Measure the overhead of the execution recorder.
+
+Runs a small workload three times: without tracing, with an empty trace
+function (the minimal cost of tracing), and with a trace function that feeds
+every line event into an `ExecutionRecorder`.
+"""
+from __future__ import unicode_literals, print_function
+from ptpdb.recorder import ExecutionRecorder
+
+import sys
+import timeit
+
+
+def workload():
+    total = 0
+    for i in range(20000):
+        if i % 3:
+            total += i
+        else:
+            total -= 1
+    return total
+
+
+def run_traced(trace):
+    sys.settrace(trace)
+    try:
+        workload()
+    finally:
+        sys.settrace(None)
+
+
+def main():
+    number = 10
+
+    def empty_trace(frame, event, arg):
+        return empty_trace
+
+    recorder = ExecutionRecorder(capacity=100000, snapshot_interval=0)
+    depth = [0]
+
+    def recording_trace(frame, event, arg):
+        if event == 'line':
+            recorder.record(frame, depth[0])
+        elif event == 'call':
+            depth[0] += 1
+        elif event == 'return':
+            depth[0] -= 1
+        return recording_trace
+
+    plain = timeit.timeit(workload, number=number)
+    empty = timeit.timeit(lambda: run_traced(empty_trace), number=number)
+    recording = timeit.timeit(lambda: run_traced(recording_trace), number=number)
+
+    events = recorder.count
+    print('Events recorded:      %i' % events)
+    print('Ring buffer size:     %i KiB' % (recorder.memory_size // 1024))
+    print('No tracing:           %.3fs' % plain)
+    print('Empty trace function: %.3fs' % empty)
+    print('Recording:            %.3fs' % recording)
+    print('Recording overhead:   %.0f ns/event' % ((recording - empty) / events * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,19 +12,21 @@ from __future__ import unicode_literals, absolute_import, print_function
 from pygments.lexers import PythonLexer
 from pygments.token import Token
 
+from prompt_toolkit.auto_suggest import ConditionalAutoSuggest
 from prompt_toolkit.buffer import Buffer, AcceptAction
 from prompt_toolkit.completion import Completer
+from prompt_toolkit.contrib.completers import WordCompleter
 from prompt_toolkit.contrib.regular_languages.completion import GrammarCompleter
 from prompt_toolkit.contrib.regular_languages.validation import GrammarValidator
 from prompt_toolkit.document import Document
-from prompt_toolkit.enums import DEFAULT_BUFFER
+from prompt_toolkit.enums import DEFAULT_BUFFER, DUMMY_BUFFER
 from prompt_toolkit.filters import IsDone, Condition
 from prompt_toolkit.interface import CommandLineInterface
 from prompt_toolkit.layout.containers import HSplit, Window, ConditionalContainer, FloatContainer, Float, VSplit, ScrollOffsets
 from prompt_toolkit.layout.controls import BufferControl, FillControl
 from prompt_toolkit.layout.dimension import LayoutDimension
 from prompt_toolkit.layout.lexers import Lexer, PygmentsLexer
-from prompt_toolkit.layout.margins import Margin, NumberredMargin, ScrollbarMargin
+from prompt_toolkit.layout.margins import Margin, NumberredMargin, ScrollbarMargin, ConditionalMargin
 from prompt_toolkit.layout.processors import ConditionalProcessor, HighlightSearchProcessor, HighlightSelectionProcessor
 from prompt_toolkit.layout.utils import split_lines
 from prompt_toolkit.shortcuts import create_eventloop
@@ -32,32 +34,74 @@ from prompt_toolkit.validation import Validator
 
 from ptpython.completer import PythonCompleter
 from ptpython.layout import CompletionVisualisation
-from ptpython.python_input import PythonInput
-from ptpython.repl import embed
+from ptpython.python_input import PythonInput, PythonCommandLineInterface
+from ptpython.repl import PythonRepl
 from ptpython.validator import PythonValidator
 
 from .commands import commands_with_help, shortcuts
-from .completers import PythonFileCompleter, PythonFunctionCompleter, BreakPointListCompleter, AliasCompleter, PdbCommandsCompleter
+from .completers import PythonFileCompleter, PythonFunctionCompleter, BreakPointListCompleter, AliasCompleter, PdbCommandsCompleter, ExceptionClassCompleter, CatchpointListCompleter, WatchpointListCompleter, ThreadListCompleter
 from .grammar import create_pdb_grammar
 from .key_bindings import load_custom_pdb_key_bindings
-from .layout import PdbPromptStyle, CallStack, format_stack_entry
-from .toolbars import PdbShortcutsToolbar, SourceTitlebar, StackTitlebar, BreakPointInfoToolbar
+from .layout import PdbPromptStyle, CallStack, WatchPanel, ResultList, ResultRow, ResultListControl, format_stack_entry, get_preview_line, PREVIEW_WIDTH
+from .toolbars import PdbShortcutsToolbar, SourceTitlebar, StackTitlebar, WatchTitlebar, ResultListTitlebar, BreakPointInfoToolbar, LocalsChangesToolbar, StepStatisticsToolbar, EventLoopToolbar, RenderProfileOverlay
 from .completion_hints import CompletionHint
 from .style import get_ui_style
-
+from .watches import Watch
+from .changes import LocalsDiff, take_snapshot, diff_snapshots
+from .namespace import FrameNamespace
+from .recorder import ExecutionRecorder, get_frame_depth
+from .linecounter import LineCounter
+from .memory import AllocationTracker, format_size
+from .profiling import StepProfiler, ProfileEntry
+from .stats import StepStatistics
+from .catchpoints import is_user_code
+from .watchpoints import hook_code
+from .pending import SavedBreakpoint
+from .coroutines import EventLoopCode, EventLoopPump, is_coroutine, is_suspended, get_tasks, get_task_state, get_await_stack
+from .watchdog import Watchdog
+from .threads import ThreadSession
+from .remote import RemoteTerminal, start_broker, worker_address
+from .snapshots import Snapshot, snapshot, install_excepthook
+from .history import get_history, HistoryAutoSuggest
+from .prefetch import SourcePrefetcher, SourceView, PrefetchedLexer, get_instruction_column
+from .symbols import SymbolIndex, Definition
+from .textsearch import TrigramIndex
+from .renderprofile import RenderProfiler
+
+import atexit
+import bdb
+import collections
+import itertools
 import linecache
 import os
 import pdb
+import re
 import six
 import sys
+import threading
+import time
+import traceback
+import types
 import weakref
 
 
 __all__ = (
     'PtPdb',
     'set_trace',
+    'debug_workers',
+    'snapshot',
+    'install_excepthook',
+    'SnapshotPdb',
+    'load_snapshot',
 )
 
+_timer = getattr(time, 'perf_counter', time.time)
+
+# Line events can be turned off per frame. (Python 3.7+)
+_has_trace_lines = sys.version_info >= (3, 7)
+
+_module_name_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
 
 class DynamicCompleter(Completer):
     """
@@ -145,9 +189,8 @@ class SourceCodeMargin(Margin):
         return 3
 
     def create_margin(self, cli, window_render_info, width, height):
-        filename = self.ptpdb.curframe.f_code.co_filename
+        filename, current_lineno = self.ptpdb.get_source_location()
         breaklist = self.ptpdb.get_file_breaks(filename)
-        curframe = self.ptpdb.curframe
 
         visible_line_to_input_line = window_render_info.visible_line_to_input_line
 
@@ -157,7 +200,7 @@ class SourceCodeMargin(Margin):
             lineno = visible_line_to_input_line.get(y)
 
             if lineno is not None:
-                is_current_line = lineno + 1 == curframe.f_lineno
+                is_current_line = lineno + 1 == current_lineno
                 is_break = (lineno + 1) in breaklist
                 result.extend(get_line_prefix_tokens(is_break, is_current_line))
 
@@ -166,35 +209,230 @@ class SourceCodeMargin(Margin):
         return result
 
     def invalidation_hash(self, cli, document):
-        filename = self.ptpdb.curframe.f_code.co_filename
+        filename, current_lineno = self.ptpdb.get_source_location()
 
         return (
             tuple(self.ptpdb.get_file_breaks(filename)),
-            self.ptpdb.curframe.f_lineno
+            current_lineno
+        )
+
+
+class HeatmapMargin(Margin):
+    """
+    Margin that shows how often every line was executed since the last stop.
+    """
+    def __init__(self, ptpdb):
+        self.ptpdb = ptpdb
+
+    def get_width(self, cli, _=None):
+        return 5
+
+    def create_margin(self, cli, window_render_info, width, height):
+        filename = self.ptpdb.get_source_location()[0]
+        counts = self.ptpdb.line_counter.get_file_counts(filename)
+        maximum = max(counts.values()) if counts else 0
+
+        visible_line_to_input_line = window_render_info.visible_line_to_input_line
+
+        result = []
+
+        for y in range(window_render_info.window_height):
+            lineno = visible_line_to_input_line.get(y)
+
+            if lineno is not None and (lineno + 1) in counts:
+                count = counts[lineno + 1]
+                result.append(get_heatmap_token(count, maximum))
+
+            result.append((Token, '\n'))
+
+        return result
+
+    def invalidation_hash(self, cli, document):
+        return (
+            self.ptpdb.get_source_location()[0],
+            self.ptpdb.line_counter.generation,
         )
 
 
+def get_heatmap_token(count, maximum):
+    """
+    Return the (token, text) tuple to show in the heatmap margin.
+    """
+    if count == 0:
+        return (Token.Heatmap.Unexecuted, '   \xb7 ')
+
+    if count < 10000:
+        text = '%4i ' % count
+    elif count < 10000000:
+        text = '%3ik ' % (count // 1000)
+    else:
+        text = '%3iM ' % (count // 1000000)
+
+    ratio = float(count) / maximum
+    if ratio > .66:
+        return (Token.Heatmap.Hot, text)
+    elif ratio > .33:
+        return (Token.Heatmap.Warm, text)
+    else:
+        return (Token.Heatmap.Cold, text)
+
+
 class PtPdb(pdb.Pdb):
-    def __init__(self):
+    #: File in which the breakpoints are saved, relative to the project
+    #: directory. (See `ptpdb.symbols.find_project_root`. Outside of a
+    #: project, nothing is saved.) `None` to disable.
+    breakpoints_filename = '.ptpdb_breakpoints'
+
+    #: Trace the other threads, so that they stop at breakpoints too. (Off
+    #: by default: while there are breakpoints, every function call of the
+    #: process becomes slower.)
+    follow_threads = False
+
+    def __init__(self, serve_event_loop=False, remote=None, follow_threads=None):
         pdb.Pdb.__init__(self)
 
+        # In a worker process, use the broker of the parent.
+        if remote is None:
+            remote = worker_address()
+
+        if follow_threads is not None:
+            self.follow_threads = follow_threads
+
+        # The options are reused for the debuggers of the other threads.
+        self.options = dict(serve_event_loop=serve_event_loop, remote=remote,
+                            follow_threads=self.follow_threads)
+
+        # When debugging remotely, the user interface runs on a
+        # `RemoteTerminal`. (Not passed to `Pdb.__init__`, because that would
+        # turn off `use_rawinput`.)
+        if remote:
+            self.remote_terminal = RemoteTerminal(remote)
+            self.stdout = self.remote_terminal.stdout
+        else:
+            self.remote_terminal = None
+
+        # State that's shared with the debuggers of the other threads. (The
+        # terminal, and the breakpoint tables.)
+        self.session = ThreadSession.get(type(self))
+        self.breaks = self.session.breaks
+
         # Cache for the grammar.
         self._grammar_cache = None  # (current_pdb_commands, grammar) tuple.
 
+        # The completer and validator for the grammar. (They don't depend on
+        # the current frame, so they are only created again when the grammar
+        # changes.)
+        self._completer_cache = None  # (grammar, completer, validator) tuple.
+
         self.completer = None
         self.validator = None
         self.lexer = None
 
+        # `display` expressions. Maps frames to an ordered dictionary that maps
+        # expressions to `Watch` instances.
+        self.displaying = {}
+        self.display_time_budget = .1  # Seconds, per expression.
+        self.display_sample_size = 8  # Zero disables hashing of samples.
+
+        # Time budget (in seconds) for evaluating user expressions. (`p`, `pp`,
+        # conditions and Python code.) `None` means no limit.
+        self.evaluation_budget = 10.
+        self.watchdog = Watchdog()
+        self.last_evaluation_time = None  # Shown after the command output.
+
+        # Objects that receive every line event while the program runs. (When
+        # there are any, tracing is never turned off.)
+        self.line_tracers = []
+
+        # The frame of the last line event, and its depth. (Consecutive line
+        # events mostly come from the same frame.)
+        self._depth_cache = (None, 0)
+
+        # Execution recorder, and the position of the virtual cursor in the
+        # recording. (`None` when we're not looking back.)
+        self.recorder = None
+        self.replay_index = None
+        self._replay_stack_cache = None  # (replay_index, stack) tuple.
+
+        # The results pane. (Profiler output, search results, ...)
+        self.result_list = None
+        self.result_list_focussed = False
+
+        # Source location that the user opened from the results pane, as a
+        # (frame, filename, lineno) tuple. Only valid as long as the current
+        # frame doesn't change.
+        self.source_view = None
+
+        # Lines of the source pane that are longer than `long_line_width`
+        # (minified or generated code) are cut to a window of that many
+        # columns, starting at `source_hscroll`. (`None`: around the current
+        # instruction.)
+        self.long_line_width = 1000
+        self.source_hscroll = None
+        self.source_has_long_lines = False
+
+        # Profiler, running between `profile` and the next stop.
+        self.profiler = None
+
+        # Allocation tracker for the `mem` command.
+        self.allocation_tracker = None
+
+        # Timing of the last step, and the overhead of tracing.
+        self.step_stats = StepStatistics()
+
+        # Profiler of the user interface. (The `render` command, or F5.)
+        self.render_profiler = RenderProfiler()
+
+        # Exception breakpoints. (When there are any, every frame is traced
+        # for exception events.)
+        self.catchpoints = self.session.catchpoints
+
+        # Data watchpoints, and the one that caused the current stop.
+        self.watchpoints = self.session.watchpoints
+        self.watchpoint_hit = None
+        self._interacting = False
+
+        # Code objects of the event loop (asyncio), in which stepping doesn't
+        # stop.
+        self.skip_event_loop = True
+        self.event_loop_code = EventLoopCode()
+
+        # When `serve_event_loop` is set, the other tasks of the asyncio event
+        # loop keep running while the prompt is shown. (Only the task in
+        # which we stopped is suspended.)
+        self.serve_event_loop = serve_event_loop
+        self.event_loop_pump = None
+
+        # Breakpoints of the breakpoint file. (Loaded at the first stop.)
+        self.saved_breakpoints = self.session.saved_breakpoints
+
+        # Number of the stopped thread to switch to, before reading the next
+        # command.
+        self.thread_switch = None
+
+        # Line execution counter for the heatmap. When `heatmap_cumulative` is
+        # False, the counts are reset every time we resume.
+        self.line_counter = None
+        self.heatmap_cumulative = False
+
+        # Snapshot of the locals at the previous stop, as a ((id(frame),
+        # code), snapshot) tuple, and the difference with the current stop.
+        self._locals_snapshot = None
+        self.locals_diff = LocalsDiff()
+
         self._source_code_window = Window(
             BufferControl(
                 buffer_name='source_code',
-                lexer=PygmentsLexer(PythonLexer),
+                lexer=PrefetchedLexer(source_prefetcher, PygmentsLexer(PythonLexer)),
                 input_processors=[
                     HighlightSearchProcessor(preview_search=True),
                     HighlightSelectionProcessor(),
                 ],
             ),
             left_margins=[
+                ConditionalMargin(
+                    HeatmapMargin(self),
+                    filter=Condition(lambda cli: self.line_counter is not None)),
                 SourceCodeMargin(self),
                 NumberredMargin(),
             ],
@@ -233,7 +471,9 @@ class PtPdb(pdb.Pdb):
                                 content=self._source_code_window,
                                 floats=[
                                     Float(right=0, bottom=0,
-                                          content=BreakPointInfoToolbar(weakref.ref(self)))
+                                          content=BreakPointInfoToolbar(weakref.ref(self))),
+                                    Float(right=0, top=0,
+                                          content=RenderProfileOverlay(weakref.ref(self))),
                                 ]),
                         ]),
                         HSplit([
@@ -249,18 +489,47 @@ class PtPdb(pdb.Pdb):
                                    scroll_offsets=ScrollOffsets(top=2, bottom=2),
                                    right_margins=[ScrollbarMargin()],
                                    height=LayoutDimension(preferred=10)),
+                            ConditionalContainer(
+                                HSplit([
+                                    WatchTitlebar(weakref.ref(self)),
+                                    Window(WatchPanel(weakref.ref(self)),
+                                           right_margins=[ScrollbarMargin()],
+                                           height=LayoutDimension(max=8)),
+                                ]),
+                                filter=Condition(lambda cli: bool(self.get_watches()))),
                         ]),
                     ]),
+                    ConditionalContainer(
+                        HSplit([
+                            ResultListTitlebar(weakref.ref(self)),
+                            Window(ResultListControl(weakref.ref(self)),
+                                   scroll_offsets=ScrollOffsets(top=1, bottom=1),
+                                   right_margins=[ScrollbarMargin()],
+                                   height=LayoutDimension(preferred=10, max=12)),
+                        ]),
+                        filter=Condition(lambda cli: self.result_list is not None)),
                 ]),
                 filter=show_pdb_content_filter),
             _extra_toolbars=[
+                ConditionalContainer(
+                    LocalsChangesToolbar(weakref.ref(self)),
+                    show_pdb_content_filter),
+                ConditionalContainer(
+                    StepStatisticsToolbar(weakref.ref(self)),
+                    show_pdb_content_filter),
+                ConditionalContainer(
+                    EventLoopToolbar(weakref.ref(self)),
+                    show_pdb_content_filter),
                 ConditionalContainer(
                     PdbShortcutsToolbar(weakref.ref(self)),
                     show_pdb_content_filter)
             ],
-            history_filename=os.path.expanduser('~/.ptpdb_history'),
         )
 
+        # The history is loaded lazily. (This has to be set before the
+        # application is created.)
+        self.python_input.history = get_history(os.path.expanduser('~/.ptpdb_history'))
+
         # Override prompt style.
         self.python_input.all_prompt_styles['pdb'] = PdbPromptStyle(self._get_current_pdb_commands())
         self.python_input.prompt_style = 'pdb'
@@ -281,8 +550,27 @@ class PtPdb(pdb.Pdb):
         load_custom_pdb_key_bindings(self, self.python_input.key_bindings_registry)
 
         self.cli = CommandLineInterface(
-            eventloop=create_eventloop(),
-            application=self.python_input.create_application())
+            eventloop=create_eventloop(
+                inputhook=self._serve_event_loop if serve_event_loop else None),
+            application=self.python_input.create_application(),
+            input=self.remote_terminal and self.remote_terminal.input,
+            output=self.remote_terminal and self.remote_terminal.output)
+
+        # Suggest from the complete history, using its index.
+        self.cli.buffers[DEFAULT_BUFFER].auto_suggest = ConditionalAutoSuggest(
+            HistoryAutoSuggest(),
+            Condition(lambda cli: self.python_input.enable_auto_suggest))
+
+        if self.remote_terminal:
+            self.remote_terminal.cli = self.cli
+
+        # `PTPDB_RENDER_PROFILE=1` profiles the rendering from the start. Any
+        # other value is the name of a JSON file, written at exit.
+        render_profile = os.environ.get('PTPDB_RENDER_PROFILE')
+        if render_profile:
+            self.render_profiler.start(self.cli)
+            if render_profile != '1':
+                atexit.register(self.render_profiler.dump, render_profile)
 
     def _create_accept_action(self):
         """
@@ -321,6 +609,8 @@ class PtPdb(pdb.Pdb):
                 line = self.cmdqueue.pop(0)
             else:
                 if self.use_rawinput:
+                    self._switch_thread()
+                    self.session.resolve_pending_breakpoints(self)
                     line = self._get_input()
 
             line = self.precmd(line)
@@ -352,6 +642,19 @@ class PtPdb(pdb.Pdb):
 
         return self._grammar_cache[1]
 
+    def _switch_thread(self):
+        """
+        After the `thread` command: Give the terminal to another thread. (We
+        continue when we get it back.)
+        """
+        if self.thread_switch is not None:
+            number, self.thread_switch = self.thread_switch, None
+            if self.session.switch_to(number):
+                thread = threading.current_thread()
+                self.message('Back in thread %i (%s).' % (
+                    self.session.get_number(thread.ident), thread.name))
+                self.print_stack_entry(self.stack[self.curindex])
+
     def _get_input(self):
         """
         Read PDB input. Return input text.
@@ -360,8 +663,12 @@ class PtPdb(pdb.Pdb):
         self.python_input.paste_mode = False
         self.python_input.currently_multiline = False
 
-        # Set source code document.
-        self._show_source_code(self.curframe.f_code.co_filename)
+        # Set source code document. (And prepare the other files of the
+        # stack in the background.)
+        source_prefetcher.prefetch(self.stack, self.curindex, self.long_line_width)
+        symbol_index.refresh()
+        self.source_hscroll = None
+        self._show_source_code(*self.get_source_location())
 
         self.cli.buffers[DEFAULT_BUFFER].document = Document('')
 
@@ -374,7 +681,34 @@ class PtPdb(pdb.Pdb):
         # Set up a new completer and validator for the new grammar.
         g = self._create_grammar()
 
-        self.completer = GrammarCompleter(g, completers={
+        if self._completer_cache is None or self._completer_cache[0] is not g:
+            self._completer_cache = (g,) + self._create_completer_and_validator(g)
+        self.completer, self.validator = self._completer_cache[1:]
+
+        # Make sure not to start in Vi navigation mode.
+        self.python_input.key_bindings_manager.reset(self.cli)
+        self.cli.buffers[DEFAULT_BUFFER].reset()
+
+        def pre_run():
+            self._source_code_window.vertical_scroll = 100000 # source_code_doc.line_count
+
+        if self.serve_event_loop:
+            self.event_loop_pump = EventLoopPump.for_running_loop(
+                on_change=lambda count: self.cli.invalidate())
+
+        try:
+            return self.cli.run(reset_current_buffer=False, pre_run=pre_run).text
+        except EOFError:
+            # Turn Control-D key press into a 'quit' command.
+            return 'quit'
+        finally:
+            self.event_loop_pump = None
+
+    def _create_completer_and_validator(self, g):
+        """
+        Return a (completer, validator) tuple for the grammar.
+        """
+        completer = GrammarCompleter(g, completers={
             'enabled_breakpoint': BreakPointListCompleter(only_enabled=True),
             'disabled_breakpoint': BreakPointListCompleter(only_disabled=True),
             'alias_name': AliasCompleter(self),
@@ -383,174 +717,2124 @@ class PtPdb(pdb.Pdb):
             'pdb_command': PdbCommandsCompleter(self),
             'python_file': PythonFileCompleter(),
             'python_function': PythonFunctionCompleter(self),
+            'profile_mode': WordCompleter(['until', 'return', 'continue']),
+            'exception_class': ExceptionClassCompleter(self),
+            'catchpoint': CatchpointListCompleter(self),
+            'watchpoint': WatchpointListCompleter(self),
+            'thread': ThreadListCompleter(self),
         })
-        self.validator = GrammarValidator(g, {
+        validator = GrammarValidator(g, {
             'python_code': PythonValidator()
         })
+        return completer, validator
 
-        # Make sure not to start in Vi navigation mode.
-        self.python_input.key_bindings_manager.reset(self.cli)
-        self.cli.buffers[DEFAULT_BUFFER].reset()
+    def _serve_event_loop(self, context):
+        """
+        Inputhook of the prompt_toolkit event loop: run the other tasks of the
+        asyncio event loop until there is input.
+        """
+        if self.event_loop_pump is not None:
+            self.event_loop_pump(context)
 
-        def pre_run():
-            self._source_code_window.vertical_scroll = 100000 # source_code_doc.line_count
+    def get_source_location(self):
+        """
+        Return the (filename, lineno) tuple of the source code that is shown
+        in the source pane. This is the current frame, unless we are looking
+        back in the execution recording.
+        """
+        if self.source_view is not None and self.source_view[0] is self.curframe:
+            return self.source_view[1:]
 
-        try:
-            return self.cli.run(reset_current_buffer=False, pre_run=pre_run).text
-        except EOFError:
-            # Turn Control-D key press into a 'quit' command.
-            return 'quit'
+        if self.replay_index is not None:
+            event = self.recorder[self.replay_index]
+            return event.code.co_filename, event.lineno
+
+        return self.curframe.f_code.co_filename, self.curframe.f_lineno
+
+    def select_frame(self, index):
+        """
+        Make the frame at this position in the stack the current frame, while
+        the prompt is running. (Like `up` and `down`, which are added to the
+        history, but without leaving the prompt.)
+        """
+        if index == self.curindex:
+            return
+
+        if index < self.curindex:
+            self.python_input.history.append('up %i' % (self.curindex - index))
+        else:
+            self.python_input.history.append('down %i' % (index - self.curindex))
+
+        # Like `Pdb._select_frame`, without printing.
+        self.curindex = index
+        self.curframe, _ = self.stack[index]
+        self.curframe_locals = self.curframe.f_locals
+        self.lineno = None
+
+        self.callstack_selected_frame = index
+        self.source_view = None
+        self.source_hscroll = None
+        self._show_source_code(*self.get_source_location())
+        self._source_code_window.vertical_scroll = 100000
+        self.cli.invalidate()
+
+    def toggle_breakpoint(self, filename, lineno):
+        """
+        Set or clear a breakpoint, while the prompt is running. (The `break`
+        or `clear` command is added to the history.)
+        """
+        filename = self.canonic(filename)
+
+        if lineno in self.breaks.get(filename, []):
+            self.clear_break(filename, lineno)
+            self.python_input.history.append('clear %s:%i' % (filename, lineno))
+
+        elif not self.set_break(filename, lineno):
+            self._save_breakpoint(self.get_breaks(filename, lineno)[-1])
+            self.python_input.history.append('break %s:%i' % (filename, lineno))
+
+        self.cli.invalidate()
+
+    def go_to_definition(self, name):
+        """
+        Open the definition of a (dotted) name in the source pane. When there
+        are several candidates, list them in the results pane.
+        """
+        definitions = self._find_definitions(name)
+
+        if len(definitions) == 1:
+            self.open_source_location(definitions[0].filename, definitions[0].lineno)
+            return
+
+        def get_rows(sort_order):
+            return [
+                ResultRow([
+                    (Token.Name, definition.dotted_name),
+                    (Token, ' '),
+                    (Token.Comment, '%s:%i' % (os.path.basename(definition.filename), definition.lineno)),
+                ], definition.filename, definition.lineno, definition)
+                for definition in definitions]
+
+        if definitions:
+            title = 'Definitions of %s' % name
+        elif not symbol_index.ready.is_set():
+            title = 'No definition of %s (the index is being built)' % name
+        else:
+            title = 'No definition of %s' % name
+
+        self.show_result_list(ResultList(title, get_rows))
+
+        if definitions:
+            self.result_list_focussed = True
+            self.cli.focus(DUMMY_BUFFER)
+
+    def _find_definitions(self, name):
+        """
+        Look up a (dotted) name in the symbol index. When the module of the
+        name is known (it's defined in the file of the source pane, or
+        imported by the current frame), return only those definitions.
+        """
+        definitions = symbol_index.find(name)
+        if not definitions and '.' in name:
+            # "self.method", "obj.attribute": look for the attribute.
+            definitions = symbol_index.find(name.rpartition('.')[2])
+
+        filename = self.canonic(self.get_source_location()[0])
+        local = [d for d in definitions if self.canonic(d.filename) == filename]
+        if local:
+            return local
+
+        # A name that the current frame imported.
+        if filename == self.canonic(self.curframe.f_code.co_filename):
+            head, _, tail = name.partition('.')
+            value = self.curframe.f_globals.get(head)
+
+            if isinstance(value, types.ModuleType):
+                known = symbol_index.find(value.__name__ + ('.' + tail if tail else ''))
+            else:
+                module = getattr(value, '__module__', None)
+                known = [d for d in definitions if module and d.module == module]
+            if known:
+                return known
+
+        # Definitions in the project first.
+        if symbol_index.root is None:
+            return sorted(definitions, key=lambda d: d.dotted_name)
+
+        root = symbol_index.root + os.sep
+        return sorted(definitions, key=lambda d: (not d.filename.startswith(root), d.dotted_name))
+
+    def open_source_location(self, filename, lineno):
+        """
+        Show the given location in the source pane, and focus it.
+        """
+        self.source_view = (self.curframe, filename, lineno)
+        self.source_hscroll = None
+        self._show_source_code(filename, lineno)
+
+        self.callstack_focussed = False
+        self.result_list_focussed = False
+        self.cli.focus('source_code')
+
+    def show_result_list(self, result_list):
+        """
+        Show a `ResultList` in the results pane.
+        """
+        self.result_list = result_list
+        self.result_list_focussed = False
+
+    def search_history(self, text, limit=100):
+        """
+        Show the entries of the complete prompt history that contain `text`
+        in the results pane, most recent first. (Control-R.) The selected
+        entry is copied to the prompt.
+        """
+        entries = list(itertools.islice(self.python_input.history.search(text), limit))
+
+        def get_rows(sort_order):
+            rows = []
+            for entry in entries:
+                line = entry.split('\n', 1)[0]
+                start = line.find(text) if text else -1
+
+                # Show the match of long lines.
+                if len(line) > PREVIEW_WIDTH:
+                    offset = max(0, start - PREVIEW_WIDTH // 4)
+                    line = line[offset:offset + PREVIEW_WIDTH]
+                    start -= offset
+
+                if start < 0:
+                    tokens = [(Token, line)]
+                else:
+                    end = start + len(text)
+                    tokens = [(Token, line[:start]), (Token.SearchMatch, line[start:end]), (Token, line[end:])]
+                if '\n' in entry:
+                    tokens.append((Token.Comment, ' ...'))
+
+                rows.append(ResultRow(tokens, None, None, entry))
+            return rows
+
+        def on_select(row):
+            self.cli.buffers[DEFAULT_BUFFER].document = Document(row.data)
+            self.result_list = None
+            self.result_list_focussed = False
+            self.cli.focus(DEFAULT_BUFFER)
+
+        if len(entries) >= limit:
+            title = 'Last %i history entries with %r' % (limit, text)
+        else:
+            title = '%i history entr%s with %r' % (len(entries), 'y' if len(entries) == 1 else 'ies', text)
+
+        self.show_result_list(ResultList(title, get_rows, on_select=on_select))
+
+        if entries:
+            self.result_list_focussed = True
+            self.cli.focus(DUMMY_BUFFER)
 
-    def _show_source_code(self, filename):
+    def _show_source_code(self, filename, lineno):
         """
         Show the source code in the `source_code` buffer.
         """
-        source_code_doc = self._get_source_code_document(filename)
-        self.cli.buffers['source_code']._set_text(source_code_doc.text + '\n')
-        self.cli.buffers['source_code']._set_cursor_position(source_code_doc.cursor_position)
+        view = self._get_source_view(filename, lineno)
+        self.cli.buffers['source_code']._set_text(view.text)
+        self.cli.buffers['source_code']._set_cursor_position(view.get_cursor_position(lineno))
 
-    def _get_source_code_document(self, filename):
+    def scroll_source_horizontally(self, columns):
         """
-        Return source code around current line as string.
+        Move the window on the long lines of the source pane. (The cursor
+        stays on the same line.)
         """
-        source_code = linecache.getlines(filename)
-        if six.PY2:
-            source_code = [l.decode('utf-8') for l in source_code]
+        if not self.source_has_long_lines:
+            return
+
+        buffer = self.cli.buffers['source_code']
+        row = buffer.document.cursor_position_row
+
+        self.source_hscroll = max(0, self.source_hscroll + columns)
+        view = self._get_source_view(*self.get_source_location())
+        buffer._set_text(view.text)
+        buffer._set_cursor_position(view.get_cursor_position(row + 1))
+        self.cli.invalidate()
+
+    def _get_source_view(self, filename, lineno):
+        """
+        Return the `SourceView` for the source pane. (Usually prepared in the
+        background already.)
+
+        Lexing and rendering a line of megabytes would hang the UI, so the
+        long lines are cut to a window of `long_line_width` columns.
+        """
+        frame = self.curframe
+        if (filename, lineno) != (frame.f_code.co_filename, frame.f_lineno):
+            frame = None
 
-        source_code = ''.join(source_code)
-        document = Document(source_code)
+        view = source_prefetcher.get_view(
+            filename, self.long_line_width, self.source_hscroll, frame)
 
-        return Document(document.text, document.translate_row_col_to_index(
-            row=self.curframe.f_lineno - 1, col=0))
+        self.source_hscroll = view.start
+        self.source_has_long_lines = view.has_long_lines
+        return view
 
     #
-    # Methods overriden from Pdb, in order to add highlighting.
+    # Tracing of all line events. (For the execution recorder.)
     #
 
-    def postcmd(self, stop, line):
+    def trace_dispatch(self, frame, event, arg):
         """
-        Override 'postcmd': (Insert whitespace.)
+        Override `Bdb.trace_dispatch`: Count the trace events and the time
+        spent handling them.
         """
-        print('')
-        return pdb.Pdb.postcmd(self, stop, line)
+        if self.session.frozen:
+            self.session.wait_while_frozen()
 
-    def preloop(self):
-        print('')
-        return pdb.Pdb.preloop(self)
+        stats = self.step_stats
+        stats.trace_events += 1
+        stats.dispatch_start = start = _timer()
+        try:
+            return pdb.Pdb.trace_dispatch(self, frame, event, arg)
+        finally:
+            stats.add_dispatch_time(start)
 
-    def do_interact(self, args):
+    def dispatch_call(self, frame, arg):
         """
-        Interact: start interpreter.
-        (Override the 'pdb' implementation. We call ptpython instead.)
+        Override `Bdb.dispatch_call`: Trace every frame when there are line
+        tracers.
         """
-        print('')
-        ns = self.curframe.f_globals.copy()
-        ns.update(self.curframe_locals)
-        embed(globals=ns)
+        # Never trace the `__setattr__` hooks of the watchpoints.
+        if frame.f_code is hook_code:
+            return
 
-    def error(self, msg):
+        result = pdb.Pdb.dispatch_call(self, frame, arg)
+
+        if result is None:
+            if self.line_tracers:
+                return self.trace_dispatch
+
+            if self.catchpoints:
+                # Only the exception events are needed in this frame.
+                if _has_trace_lines:
+                    frame.f_trace_lines = False
+                return self.trace_dispatch
+
+        elif _has_trace_lines and not frame.f_trace_lines:
+            # A generator that was only traced for exceptions before.
+            frame.f_trace_lines = True
+
+        return result
+
+    def dispatch_return(self, frame, arg):
         """
-        Override default error handler from PDB.
+        Override `Bdb.dispatch_return`: Make stepping through coroutines
+        follow the coroutine instead of the event loop.
+
+        Bdb ignores the return events of coroutines while stepping, so `next`
+        or `return` at the end of a coroutine would not stop again. Resume in
+        the awaiting coroutine instead.
         """
-        self.cli.print_tokens([
-            (Token.Pdb.Error, '  %s  \n' % msg)
-        ])
+        if self._depth_cache[0] is frame:
+            self._depth_cache = (None, 0)
 
-    def print_stack_entry(self, frame_lineno, prompt_prefix=': '):
+        try:
+            if self.watchpoints.frame_watchpoints and not is_suspended(frame):
+                self._prune_frame_watchpoints(frame)
+
+            # A coroutine that's suspended at an `await` while stepping: stop in
+            # the same coroutine when it's resumed, not in the event loop.
+            if is_coroutine(frame) and is_suspended(frame):
+                if self.stopframe is None and self.stop_here(frame):
+                    self._set_stopinfo(frame, None)
+                return self.trace_dispatch
+
+            if is_coroutine(frame) and (frame is self.stopframe or frame is self.returnframe):
+                # For coroutines, `Bdb.set_return` sets `stoplineno` to -1.
+                if frame is self.returnframe or self.stoplineno == -1:
+                    try:
+                        self.frame_returning = frame
+                        self.user_return(frame, arg)
+                    finally:
+                        self.frame_returning = None
+                    if self.quitting:
+                        raise bdb.BdbQuit
+
+                # (Unless the user typed `continue` or `step`.)
+                if self.stopframe is frame:
+                    self._stop_in_awaiting_coroutine(frame)
+                return self.trace_dispatch
+
+            return pdb.Pdb.dispatch_return(self, frame, arg)
+        finally:
+            # After the return event (at which we can still stop), forget
+            # the snapshot of the locals of this frame. (Another frame can get
+            # the same id.)
+            snapshot = self._locals_snapshot
+            if snapshot is not None and snapshot[0][0] == id(frame) and not is_suspended(frame):
+                self._locals_snapshot = None
+
+    def _stop_in_awaiting_coroutine(self, frame):
         """
-        Override `print_stack_entry` of Pdb, in order to add highlighting.
+        Stop at the next line of the coroutine that awaits `frame`. When it's
+        awaited by a task instead, stop at the next line outside of the event
+        loop.
         """
-        frame, lineno = frame_lineno
+        caller = frame.f_back
 
-        tokens = []
-        tokens.extend(format_stack_entry(self, frame, lineno))
-        tokens.append((Token, '\n'))
+        if caller is not None and is_coroutine(caller) and caller.f_code not in self.event_loop_code:
+            caller.f_trace = self.trace_dispatch
+            if _has_trace_lines:
+                caller.f_trace_lines = True
+            self._set_stopinfo(caller, None)
+        else:
+            self._set_stopinfo(None, None)
 
-        self.cli.print_tokens(tokens)
+    def stop_here(self, frame):
+        """
+        Override `Bdb.stop_here`: Don't stop in the event loop while stepping.
+        """
+        if self.skip_event_loop and frame.f_code in self.event_loop_code:
+            return False
+        return pdb.Pdb.stop_here(self, frame)
+
+    def dispatch_line(self, frame):
+        if self.line_tracers:
+            # (Computed from the frame chain: not every call event is traced,
+            # so counting call and return events drifts.)
+            cached_frame, depth = self._depth_cache
+            if cached_frame is not frame:
+                depth = get_frame_depth(frame)
+                self._depth_cache = (frame, depth)
+
+            for tracer in self.line_tracers:
+                tracer.record(frame, depth)
+        return pdb.Pdb.dispatch_line(self, frame)
+
+    def dispatch_exception(self, frame, arg):
+        """
+        Override `Bdb.dispatch_exception`: Stop at catchpoints.
+        """
+        catchpoints = self.catchpoints.match(arg[0])
 
-    def do_list(self, arg):
+        if catchpoints and not self.stop_here(frame):
+            catchpoint = self._get_catchpoint_hit(frame, arg, catchpoints)
+
+            if catchpoint:
+                catchpoint.hit_counter.increment()
+                self.message('Catchpoint %i: %s' % (catchpoint.number, catchpoint.name))
+
+                self.user_exception(frame, arg)
+                if self.quitting:
+                    raise bdb.BdbQuit
+                return self.trace_dispatch
+
+        return pdb.Pdb.dispatch_exception(self, frame, arg)
+
+    def _get_catchpoint_hit(self, frame, exc_info, catchpoints):
         """
-        Override `Pdb.do_list`: Add highlighting.
+        Return the catchpoint at which we have to stop for this exception
+        event, or `None`.
         """
-        self.lastcmd = 'list'
-        last = None
-        if arg and arg != '.':
-            try:
-                if ',' in arg:
-                    first, last = arg.split(',')
-                    first = int(first.strip())
-                    last = int(last.strip())
-                    if last < first:
-                        # assume it's a count
-                        last = first + last
-                else:
-                    first = int(arg.strip())
-                    first = max(1, first - 5)
-            except ValueError:
-                self.error('Error in argument: %r' % arg)
-                return
-        elif self.lineno is None or arg == '.':
-            first = max(1, self.curframe.f_lineno - 5)
+        tb = exc_info[2]
+
+        for catchpoint in catchpoints:
+            if catchpoint.user_code_only:
+                # Stop in the first frame of user code that the exception
+                # reaches.
+                if not is_user_code(frame.f_code.co_filename):
+                    continue
+
+                deeper = tb.tb_next if tb is not None else None
+                while deeper is not None:
+                    if is_user_code(deeper.tb_frame.f_code.co_filename):
+                        break
+                    deeper = deeper.tb_next
+                if deeper is not None:
+                    continue
+
+            # Otherwise, stop only where the exception is raised.
+            elif tb is not None and tb.tb_next is not None:
+                continue
+
+            if catchpoint.code is not None:
+                locals = dict(frame.f_locals)
+                locals['__exception__'] = exc_info[1]
+                try:
+                    result, _ = self.watchdog.call(
+                        self.evaluation_budget, eval, catchpoint.code, frame.f_globals, locals)
+                except Exception:
+                    # Like for breakpoints: stop when the condition fails.
+                    result = True
+
+                if not result:
+                    continue
+
+            return catchpoint
+
+    def set_continue(self):
+        """
+        Override `Bdb.set_continue`: Bdb turns off tracing when there are no
+        breakpoints. Don't do that when there are line tracers, catchpoints
+        or watchpoints that compare after every line.
+        """
+        if self.line_tracers or self.catchpoints or self.watchpoints.frame_watchpoints:
+            self._set_stopinfo(self.botframe, None, -1)
         else:
-            first = self.lineno + 1
-        if last is None:
-            last = first + 10
-        filename = self.curframe.f_code.co_filename
-        breaklist = self.get_file_breaks(filename)
-        try:
-            lines = linecache.getlines(filename, self.curframe.f_globals)
-            self._print_lines_2(lines, first, last, breaklist,
-                              self.curframe)
-            self.lineno = min(last, len(lines))
-            if len(lines) < last:
-                self.message('[EOF]')
-        except KeyboardInterrupt:
-            pass
-    do_l = do_list
+            pdb.Pdb.set_continue(self)
 
-    def _print_lines_2(self, lines, start, end, breaks=(), frame=None):
+            # Without tracing, we don't see the frame of the snapshot return.
+            # (And another frame can get the same id.)
+            if not self.breaks:
+                self._locals_snapshot = None
+
+            # (When breakpoints are set later, from another thread, that
+            # thread traces this one again. Only on Python 3.12+.)
+            self.session.update_thread_tracing()
+
+    def set_quit(self):
         """
-        Similar to `Pdb._print_lines`, except that this takes all the lines
-        of the given file as input, it uses Pygments for the highlighting,
-        it does slicing, and it prints everything in color.
+        Override `Bdb.set_quit`: Also stop tracing the other threads.
         """
-        if frame:
-            current_lineno = frame.f_lineno
-        else:
-            current_lineno = exc_lineno = -1
+        self.session.stop_following_threads()
+        pdb.Pdb.set_quit(self)
 
-        # Highlight everything. (Highlighting works much better from the
-        # beginning of the file.)
-        all_tokens = python_lexer.get_tokens(''.join(lines))
+    def do_record(self, arg):
+        """
+        record [on [<capacity> [<snapshot_interval>]] | off]
+        Record every executed line in a ring buffer of the given capacity,
+        for use by `rstep`, `rnext` and `history`.
+        """
+        args = arg.split()
 
-        # Slice lines.
-        lines = list(split_lines(all_tokens))[start-1:end]
+        if not args:
+            if self.recorder:
+                self.message('Recording: %i events (capacity %i, %i KiB).' % (
+                    self.recorder.count - self.recorder.first_index,
+                    self.recorder.capacity, self.recorder.memory_size // 1024))
+            else:
+                self.message('Not recording.')
 
-        # Add left margin. (Numbers + 'B' or '->'.)
-        def add_margin(lineno, tokens):
-            is_break = lineno in breaks
-            is_current_line = lineno == current_lineno
+        elif args[0] == 'on':
+            try:
+                numbers = [int(a) for a in args[1:3]]
+            except ValueError:
+                self.error('Invalid capacity or snapshot interval: %r' % arg)
+                return
 
-            return get_line_prefix_tokens(is_break, is_current_line) \
-                + [(Token.LineNumber, str(lineno).rjust(3) + ' ')] \
-                + tokens + [(Token, '\n')]
+            self._stop_recording()
+            self.recorder = ExecutionRecorder(*numbers)
+            self.line_tracers.append(self.recorder)
+            self.message('Recording enabled (%i KiB).' % (self.recorder.memory_size // 1024))
 
-        lines = [add_margin(i + start, tokens) for i, tokens in enumerate(lines)]
+        elif args[0] == 'off':
+            self._stop_recording()
+            self.message('Recording disabled.')
 
-        for l in lines:
-            self.cli.print_tokens(l)
+        else:
+            self.error('Usage: record [on [<capacity> [<snapshot_interval>]] | off]')
 
-    def message(self, msg):
-        """ Print message to stdout. This function is present in Pdb for
-        Python3, but not in Python2. """
-        print(msg, file=self.stdout)
+    def do_profile(self, arg):
+        """
+        profile [until | return | continue]
+        Resume execution under a profiler until the next stop, and show the
+        most expensive functions.
+        """
+        mode = arg.strip() or 'continue'
 
+        if mode not in ('until', 'return', 'continue'):
+            self.error('Usage: profile [until | return | continue]')
+            return
 
-python_lexer = PythonLexer(
-    stripnl=False,
-    stripall=False,
-    ensurenl=False)
+        self.profiler = StepProfiler()
+        self.message('Profiling until the next stop...')
+        self.profiler.start()
 
+        return getattr(self, 'do_' + mode)('')
+
+    def _show_profile_results(self):
+        """
+        Stop the profiler and show the results in the results pane.
+        """
+        profiler = self.profiler
+        profiler.stop()
+        self.profiler = None
+
+        overhead = profiler.estimated_overhead
+        self.message('Profiled %.3fs, %i calls, estimated profiler overhead %.3fs (%.0f%%).' % (
+            profiler.wall_time, profiler.total_calls, overhead,
+            100. * overhead / profiler.wall_time if profiler.wall_time else 0))
+
+        def get_rows(sort_order):
+            rows = []
+            for entry in profiler.get_top_entries(sort_order):
+                tokens = [
+                    (Token.Number, '%9i ' % entry.calls),
+                    (Token.Number, '%9.4f ' % entry.total_time),
+                    (Token.Number, '%9.4f ' % entry.cumulative_time),
+                    (Token.Name, entry.funcname),
+                    (Token, ' '),
+                ]
+                if entry.has_source:
+                    tokens.append((Token.Comment, '%s:%i' % (
+                        os.path.basename(entry.filename), entry.lineno)))
+                    rows.append(ResultRow(tokens, entry.filename, entry.lineno, entry))
+                else:
+                    rows.append(ResultRow(tokens, None, None, entry))
+            return rows
+
+        self.show_result_list(ResultList(
+            'Profile: %.3fs (overhead ~%.3fs)' % (profiler.wall_time, overhead),
+            get_rows,
+            header=[(Token.Toolbar.Title.Text, '      calls   tottime   cumtime  function ')],
+            sort_orders=['cumulative', 'total', 'calls']))
+
+    def set_break_at_row(self, row):
+        """
+        Set a breakpoint at the location of a row in the results pane.
+        """
+        if row.filename is None:
+            return
+
+        filename = self.canonic(row.filename)
+
+        # For functions, break at the first executable line, like
+        # "break <function>" does.
+        if isinstance(row.data, ProfileEntry):
+            self.set_break(filename, row.lineno, funcname=row.data.funcname)
+        elif isinstance(row.data, Definition) and row.data.kind == 'function':
+            self.set_break(filename, row.data.body_lineno)
+        else:
+            self.set_break(filename, row.lineno)
+
+        self.cli.invalidate()
+
+    def do_mem(self, arg):
+        """
+        mem [on [<nframes>] | off | show | break [<n>]]
+        Track the memory allocations between resuming and the next stop, and
+        report the net growth and the top allocation sites at every stop.
+        """
+        args = arg.split()
+        tracker = self.allocation_tracker
+
+        if not args:
+            if tracker:
+                self.message('Memory tracking enabled.')
+                self._print_allocation_summary()
+            else:
+                self.message('Memory tracking disabled.')
+
+        elif args[0] == 'on':
+            try:
+                nframes = int(args[1]) if len(args) > 1 else 1
+            except ValueError:
+                self.error('Invalid number of frames: %r' % args[1])
+                return
+
+            if tracker:
+                tracker.stop()
+
+            try:
+                self.allocation_tracker = AllocationTracker(nframes)
+            except RuntimeError as e:
+                self.error(e)
+                return
+
+            self.allocation_tracker.start()
+            self.message('Memory tracking enabled. (Allocations are reported at the next stop.)')
+
+        elif args[0] == 'off':
+            if tracker:
+                tracker.stop()
+                self.allocation_tracker = None
+            self.message('Memory tracking disabled.')
+
+        elif args[0] == 'show' and tracker:
+            self._show_allocation_sites()
+
+        elif args[0] == 'break' and tracker:
+            try:
+                n = int(args[1]) if len(args) > 1 else 1
+                sites = [s for s in tracker.get_top_sites(limit=None) if s.has_source]
+                if n < 1:
+                    raise IndexError
+                site = sites[n - 1]
+            except (ValueError, IndexError):
+                self.error('No such allocation site: %r' % ' '.join(args[1:]))
+                return
+
+            self.do_break('%s:%i' % (site.filename, site.lineno))
+
+        elif args[0] in ('show', 'break'):
+            self.error('Memory tracking is disabled. Use "mem on" first.')
+
+        else:
+            self.error('Usage: mem [on [<nframes>] | off | show | break [<n>]]')
+
+    def _print_allocation_summary(self, count=3):
+        tracker = self.allocation_tracker
+
+        self.message('Memory: %s%s since resuming (%s traced).' % (
+            '+' if tracker.net_growth > 0 else '',
+            format_size(tracker.net_growth), format_size(tracker.total_size)))
+
+        for i, site in enumerate(tracker.get_top_sites(limit=count)):
+            if site.size_diff <= 0:
+                break
+            self.message('  %i. %s:%i  +%s in %+i blocks' % (
+                i + 1, os.path.basename(site.filename), site.lineno,
+                format_size(site.size_diff), site.count_diff))
+
+    def _show_allocation_sites(self):
+        """
+        Show the allocation sites of the last step in the results pane.
+        """
+        tracker = self.allocation_tracker
+
+        def get_rows(sort_order):
+            rows = []
+            for site in tracker.get_top_sites(sort_order, limit=100):
+                tokens = [
+                    (Token.Number, '%11s ' % format_size(site.size_diff)),
+                    (Token.Number, '%+8i ' % site.count_diff),
+                    (Token.Number, '%11s ' % format_size(site.size)),
+                    (Token.Comment, '%s:%i ' % (os.path.basename(site.filename), site.lineno)),
+                ]
+                line = get_preview_line(site.filename, site.lineno)
+                tokens.extend(python_lexer.get_tokens(line))
+
+                if site.has_source:
+                    rows.append(ResultRow(tokens, site.filename, site.lineno, site))
+                else:
+                    rows.append(ResultRow(tokens, None, None, site))
+            return rows
+
+        self.show_result_list(ResultList(
+            'Allocations: %s net' % format_size(tracker.net_growth),
+            get_rows,
+            header=[(Token.Toolbar.Title.Text, '     growth   blocks        size  location ')],
+            sort_orders=['growth', 'size']))
+
+    def do_stats(self, arg):
+        """
+        stats
+        Show how long the program ran between resuming and this stop, and the
+        overhead of the debugger.
+        """
+        stats = self.step_stats
+
+        if stats.wall_time is None:
+            self.message('The program did not run yet.')
+            return
+
+        self.message('Wall time:      %.6fs' % stats.wall_time)
+        self.message('CPU time:       %.6fs' % stats.cpu_time)
+        self.message('Trace events:   %i' % stats.trace_events)
+        self.message('Debugger time:  %.6fs (%.1f%% of the wall time)' % (
+            stats.trace_time, 100. * (stats.overhead or 0)))
+
+    def do_render(self, arg):
+        """
+        render [on | off | dump <file>]
+        Profile the rendering of the user interface: show the slowest parts
+        of the layout and the latency of key presses in an overlay. (F5
+        toggles it too.) "dump" writes the profiled frames to a JSON file.
+        """
+        args = arg.split(None, 1)
+        profiler = self.render_profiler
+
+        if not args:
+            self.message('Render profiling %s.' % ('enabled' if profiler.enabled else 'disabled'))
+
+        elif args == ['on']:
+            profiler.start(self.cli)
+
+        elif args == ['off']:
+            profiler.stop()
+
+        elif args[0] == 'dump' and len(args) == 2:
+            if not profiler.frames:
+                self.error('No frames were profiled. Use "render on" first.')
+                return
+
+            filename = os.path.expanduser(args[1])
+            try:
+                profiler.dump(filename)
+            except (IOError, OSError) as e:
+                self.error(e)
+                return
+            self.message('Wrote %i frames to %s' % (len(profiler.frames), filename))
+
+        else:
+            self.error('Usage: render [on | off | dump <file>]')
+
+    def do_catch(self, arg):
+        """
+        catch [-u] <exception_class> [, <condition>]
+        Stop when an exception of this class (or a subclass) is raised. With
+        -u, stop where it enters user code instead. The exception is
+        available as `__exception__` in the condition.
+        Without argument, list all catchpoints.
+        """
+        if not arg.strip():
+            self._print_catchpoints()
+            return
+
+        user_code_only = False
+        if arg.split()[0] == '-u':
+            user_code_only = True
+            arg = arg.split(None, 1)[1] if len(arg.split()) > 1 else ''
+
+        name, _, condition = arg.partition(',')
+        name = name.strip()
+        condition = condition.strip() or None
+
+        try:
+            exception_class = eval(name, self.curframe.f_globals, self.curframe_locals)
+        except Exception:
+            self._error_exc()
+            return
+
+        if not (isinstance(exception_class, type) and issubclass(exception_class, BaseException)):
+            self.error('%s is not an exception class.' % name)
+            return
+
+        try:
+            catchpoint = self.catchpoints.add(exception_class, condition, user_code_only)
+        except SyntaxError:
+            self._error_exc()
+            return
+
+        self.session.update_thread_tracing()
+
+        self.message('Catchpoint %i: %s%s' % (
+            catchpoint.number, catchpoint.name,
+            ' (user code only)' if user_code_only else ''))
+
+    def do_uncatch(self, arg):
+        """
+        uncatch [<number>...]
+        Remove the given catchpoints, or all of them.
+        """
+        if not arg.strip():
+            self.catchpoints.clear()
+            self.message('Removed all catchpoints.')
+        else:
+            for number in arg.split():
+                try:
+                    self.catchpoints.remove(int(number))
+                except (ValueError, KeyError):
+                    self.error('No catchpoint numbered %s' % number)
+                else:
+                    self.message('Removed catchpoint %s' % number)
+
+        self.session.update_thread_tracing()
+
+    def _print_catchpoints(self):
+        if not self.catchpoints:
+            self.message('No catchpoints.')
+            return
+
+        self.message('Num Type         Hits  Exception')
+        for catchpoint in self.catchpoints:
+            self.message('%-3i %-12s %-5i %s%s' % (
+                catchpoint.number, 'catch -u' if catchpoint.user_code_only else 'catch',
+                catchpoint.hits, catchpoint.name,
+                ', %s' % catchpoint.condition if catchpoint.condition else ''))
+
+    def do_watch(self, arg):
+        """
+        watch <expression>.<attribute>
+        Stop when the attribute changes. Without argument, list all
+        watchpoints.
+        """
+        if not arg.strip():
+            self._print_watchpoints()
+            return
+
+        expression, _, attr = arg.strip().rpartition('.')
+        if not expression or not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', attr):
+            self.error('Usage: watch <expression>.<attribute>')
+            return
+
+        try:
+            obj = eval(expression, self.curframe.f_globals, self.curframe_locals)
+        except Exception:
+            self._error_exc()
+            return
+
+        watchpoint = self.watchpoints.add(arg.strip(), obj, attr, self.curframe)
+
+        self.message('Watchpoint %i: %s = %s%s' % (
+            watchpoint.number, watchpoint.expression, watchpoint.value_repr,
+            ' (only in the current frame)' if watchpoint.frame else ''))
+
+    def do_unwatch(self, arg):
+        """
+        unwatch [<number>...]
+        Remove the given watchpoints, or all of them.
+        """
+        if not arg.strip():
+            self.watchpoints.clear()
+            self.message('Removed all watchpoints.')
+            return
+
+        for number in arg.split():
+            try:
+                self.watchpoints.remove(int(number))
+            except (ValueError, KeyError):
+                self.error('No watchpoint numbered %s' % number)
+            else:
+                self.message('Removed watchpoint %s' % number)
+
+    def _print_watchpoints(self):
+        if not self.watchpoints:
+            self.message('No watchpoints.')
+            return
+
+        self.message('Num Type         Hits  Attribute')
+        for watchpoint in self.watchpoints:
+            self.message('%-3i %-12s %-5i %s = %s%s' % (
+                watchpoint.number, 'watch', watchpoint.hits,
+                watchpoint.expression, watchpoint.value_repr,
+                ' (only in frame %s)' % watchpoint.frame.f_code.co_name if watchpoint.frame else ''))
+
+    def _watchpoint_changed(self, watchpoint, frame):
+        """
+        Called by the `__setattr__` hooks when a watched attribute changes.
+        """
+        # Changes made from the prompt don't stop.
+        if self._interacting:
+            return
+
+        watchpoint.hit_counter.increment()
+        self.watchpoint_hit = watchpoint
+        self._print_watchpoint_hit(watchpoint)
+
+        # Don't stop inside the hook: stop at the next line event of the frame
+        # that changed the attribute (or when it returns), like after `next`.
+        # The frames are not necessarily traced. (And when we continued
+        # without breakpoints, tracing is turned off.) Trace them, for
+        # stepping after this stop.
+        f = frame
+        while f is not None and f is not self.botframe:
+            if f.f_trace is None:
+                f.f_trace = self.trace_dispatch
+            f = f.f_back
+
+        if _has_trace_lines:
+            frame.f_trace_lines = True
+
+        self._set_stopinfo(frame, None)
+
+        if sys.gettrace() is None:
+            sys.settrace(self.trace_dispatch)
+
+    def _prune_frame_watchpoints(self, frame):
+        """
+        Remove the watchpoints of a frame that returns. When they were the
+        only reason to trace every line, stop doing that.
+        """
+        removed = self.watchpoints.remove_frame(frame)
+        for watchpoint in removed:
+            self.message('Watchpoint %i deleted: frame %s returned.' % (
+                watchpoint.number, frame.f_code.co_name))
+
+        if (removed and not self.watchpoints.frame_watchpoints and
+                self.stopframe is self.botframe and self.stoplineno == -1):
+            self.set_continue()
+
+    def _print_watchpoint_hit(self, watchpoint):
+        self.message('Watchpoint %i: %s' % (watchpoint.number, watchpoint.expression))
+        self.message('Old value: %s' % watchpoint.old_value_repr)
+        self.message('New value: %s' % watchpoint.value_repr)
+
+    def set_trace(self, frame=None):
+        """
+        Override `Bdb.set_trace`: Become the debugger of this thread, and
+        trace the other threads for breakpoints.
+        """
+        if frame is None:
+            frame = sys._getframe().f_back
+
+        self.session.set_debugger(self)
+        self.session.debugger_options = self.options
+        if self.follow_threads:
+            self.session.follow_threads()
+        else:
+            self.session.stop_following_threads()
+
+        pdb.Pdb.set_trace(self, frame)
+
+    def forget(self):
+        """
+        Override `Pdb.forget`: Also forget the locals of the current frame.
+        (Pdb keeps them alive until the next stop.)
+        """
+        pdb.Pdb.forget(self)
+        self.curframe_locals = {}
+
+    def interaction(self, frame, traceback):
+        """
+        Override `Pdb.interaction`: Wait until no other thread is at the
+        prompt.
+        """
+        self.session.set_debugger(self)
+        self.session.acquire_terminal(self, frame)
+        self._interacting = True
+
+        if self.remote_terminal:
+            self.remote_terminal.update_info(location='%s:%s' % (
+                os.path.basename(frame.f_code.co_filename), frame.f_lineno))
+        try:
+            pdb.Pdb.interaction(self, frame, traceback)
+        finally:
+            self._interacting = False
+            self.session.release_terminal()
+
+            if self.remote_terminal:
+                self.remote_terminal.update_info(location=None)
+
+    def do_break(self, arg, temporary=0):
+        """
+        Override 'break': Keep breakpoints in modules that were not imported
+        yet pending, and save breakpoints in the breakpoint file. Without
+        argument, also list the pending breakpoints, catchpoints and
+        watchpoints.
+        """
+        if not arg:
+            pdb.Pdb.do_break(self, arg, temporary)
+
+            pending = self.saved_breakpoints.pending
+            if pending:
+                self.message('Pending (until the module is imported):')
+                for saved in pending:
+                    self.message('    %s' % saved)
+
+            if self.catchpoints:
+                self._print_catchpoints()
+
+            if self.watchpoints:
+                self._print_watchpoints()
+            return
+
+        arg = self._translate_module_location(arg)
+
+        if not temporary:
+            saved = self._get_pending_breakpoint(arg)
+            if saved is not None:
+                self.saved_breakpoints.add(saved)
+                self.message('Pending breakpoint at %s (set when the module is imported)' % saved)
+                return
+
+        count = len(bdb.Breakpoint.bpbynumber)
+
+        name, _, condition = arg.partition(',')
+        name = name.strip()
+
+        if _module_name_re.match(name):
+            # (Evaluated here, only once: `Pdb.do_break` would evaluate the
+            # name again, without the evaluation budget.)
+            function = self._get_function(name)
+            if function is not None:
+                self._set_function_break(function, condition.strip() or None, temporary)
+                arg = None
+            else:
+                arg = self._resolve_function_name(name, condition)
+
+        if arg is not None:
+            pdb.Pdb.do_break(self, arg, temporary)
+
+        if not temporary and len(bdb.Breakpoint.bpbynumber) > count:
+            self._save_breakpoint(bdb.Breakpoint.bpbynumber[-1])
+
+    do_b = do_break
+
+    def _save_breakpoint(self, bp):
+        " Add a breakpoint that was set to the breakpoint file. "
+        saved = SavedBreakpoint(bp.file, bp.line, bp.cond)
+        saved.resolved = True
+        self.saved_breakpoints.add(saved)
+
+    def _split_location(self, arg):
+        """
+        Split a "<target>:<lineno>[, <condition>]" argument into a (target,
+        lineno, condition) tuple. Return `None` for other arguments.
+        """
+        location, _, condition = arg.partition(',')
+        target, _, lineno = location.rpartition(':')
+
+        try:
+            lineno = int(lineno)
+        except ValueError:
+            return
+        if target.strip():
+            return target.strip(), lineno, condition.strip() or None
+
+    def _translate_module_location(self, arg):
+        """
+        Replace the module name in "<module>:<lineno>" by the filename of the
+        module, when it has been imported.
+        """
+        location = self._split_location(arg)
+
+        if location and _module_name_re.match(location[0]) and not self.lookupmodule(location[0]):
+            filename = getattr(sys.modules.get(location[0]), '__file__', None)
+            if filename:
+                arg = '%s:%i' % (os.path.splitext(filename)[0] + '.py', location[1])
+                if location[2]:
+                    arg += ', %s' % location[2]
+        return arg
+
+    def _get_function(self, name):
+        """
+        Evaluate a name under the evaluation budget. Return the function, or
+        `None` when it's not a function.
+        """
+        try:
+            value = self._evaluate(eval, name, self.curframe.f_globals, self.curframe_locals)
+        except Exception:
+            return None
+
+        if hasattr(value, '__func__'):
+            value = value.__func__
+        if isinstance(getattr(value, '__code__', None), types.CodeType):
+            return value
+
+    def _set_function_break(self, function, condition, temporary):
+        " Like `Pdb.do_break` for a function. "
+        code = function.__code__
+        filename = code.co_filename
+
+        line = self.checkline(filename, code.co_firstlineno)
+        if not line:
+            return
+
+        error = self.set_break(filename, line, temporary, condition, code.co_name)
+        if error:
+            self.error(error)
+        else:
+            bp = self.get_breaks(filename, line)[-1]
+            self.message('Breakpoint %d at %s:%d' % (bp.number, bp.file, bp.line))
+
+    def _resolve_function_name(self, name, condition):
+        """
+        Return the location of a (dotted) function name that doesn't evaluate
+        in the current frame: a function that Pdb finds in the source files,
+        or the first line of the function in the symbol index. (A method, or a
+        function in a module that the current frame didn't import.) Return
+        `None` when it's not found or ambiguous.
+        """
+        if self.lineinfo(name)[0]:
+            return name + (',' + condition if condition else '')
+
+        definitions = [d for d in symbol_index.find(name) if d.kind == 'function']
+
+        if not definitions and not symbol_index.built:
+            symbol_index.refresh()
+            self.error('%s was not found. (The symbol index is not ready yet, try again '
+                       'in a moment.)' % name)
+            return
+
+        if not definitions:
+            self.error('The specified object %r is not a function or was not found '
+                       'along sys.path.' % name)
+            return
+
+        if len(definitions) > 1:
+            self.error('%s is ambiguous:' % name)
+            for definition in definitions:
+                self.message('    %s  %s:%i' % (definition.dotted_name, definition.filename, definition.lineno))
+            return
+
+        arg = '%s:%i' % (definitions[0].filename, definitions[0].body_lineno)
+        if condition.strip():
+            arg += ', %s' % condition.strip()
+        return arg
+
+    def _get_pending_breakpoint(self, arg):
+        """
+        When `arg` is the location of a module that hasn't been imported yet,
+        return a `SavedBreakpoint` for it. (Not for an existing file: it may
+        never be imported, when it's run with `runpy.run_path` or `exec`. Like
+        Pdb, the breakpoint is set immediately.)
+        """
+        location = self._split_location(arg)
+        if location is None:
+            return
+
+        target, lineno, condition = location
+
+        if (not self.lookupmodule(target) and _module_name_re.match(target) and
+                target not in sys.modules):
+            return SavedBreakpoint(target, lineno, condition)
+
+    def _resolve_saved_breakpoint(self, saved, filename):
+        """
+        Set a breakpoint from the breakpoint file. (Called when the module is
+        imported, or when the file is loaded.)
+        """
+        filename = self.canonic(filename)
+        err = self.set_break(filename, saved.lineno, cond=saved.condition)
+
+        if err:
+            self.error(err)
+            return
+
+        bp = self.get_breaks(filename, saved.lineno)[-1]
+        self.message('Breakpoint %d at %s:%d' % (bp.number, bp.file, bp.line))
+
+        # When we continued without breakpoints, tracing was turned off.
+        if sys.gettrace() is None:
+            sys.settrace(self.trace_dispatch)
+
+    def clear_break(self, filename, lineno):
+        """
+        Override `Bdb.clear_break`: Also remove the breakpoint from the
+        breakpoint file, or from the pending breakpoints.
+        """
+        removed = self.saved_breakpoints.remove(filename, lineno)
+        if self.canonic(filename) != filename:
+            removed.extend(self.saved_breakpoints.remove(self.canonic(filename), lineno))
+
+        pending = [saved for saved in removed if not saved.resolved]
+        for saved in pending:
+            self.message('Deleted pending breakpoint at %s' % saved)
+
+        if pending and not self.get_breaks(self.canonic(filename), lineno):
+            return
+
+        return pdb.Pdb.clear_break(self, filename, lineno)
+
+    def clear_bpbynumber(self, arg):
+        """
+        Override `Bdb.clear_bpbynumber`: Also remove the breakpoint from the
+        breakpoint file.
+        """
+        try:
+            bp = self.get_bpbynumber(arg)
+        except ValueError as err:
+            return str(err)
+
+        err = pdb.Pdb.clear_bpbynumber(self, arg)
+        if not err and not self.get_breaks(bp.file, bp.line):
+            self.saved_breakpoints.remove(bp.file, bp.line)
+        return err
+
+    def clear_all_breaks(self):
+        """
+        Override `Bdb.clear_all_breaks`: Also clear the breakpoint file. (And
+        keep sharing `self.breaks` with the other threads; Bdb replaces it.)
+        """
+        self.saved_breakpoints.clear()
+        result = pdb.Pdb.clear_all_breaks(self)
+
+        self.breaks = self.session.breaks
+        self.breaks.clear()
+        self.session.update_thread_tracing()
+        return result
+
+    def do_grep(self, arg):
+        """
+        grep [-i] <pattern>
+        Search a regular expression in the source files of all loaded
+        modules, and show the matching lines in the results pane. (Select a
+        line to open it in the source pane, or press 'b' to set a breakpoint.)
+        """
+        ignore_case = arg.startswith('-i ')
+        pattern = arg[3:].strip() if ignore_case else arg.strip()
+
+        if not pattern:
+            self.error('Usage: grep [-i] <pattern>')
+            return
+
+        if not text_index.ready.is_set():
+            text_index.build()
+            self.message('Indexing the source files of the loaded modules...')
+            text_index.ready.wait()
+
+        limit = 1000
+        matches = text_index.search(pattern, ignore_case=ignore_case, limit=limit)
+
+        def get_rows(sort_order):
+            rows = []
+            for match in matches:
+                line = match.line
+                start = match.start
+
+                # Show the match of long lines.
+                if len(line) > PREVIEW_WIDTH:
+                    offset = max(0, start - PREVIEW_WIDTH // 4)
+                    line = line[offset:offset + PREVIEW_WIDTH]
+                    start -= offset
+
+                indent = len(line) - len(line.lstrip())
+                end = min(start + match.end - match.start, len(line))
+
+                rows.append(ResultRow([
+                    (Token.Comment, '%s:%i ' % (os.path.basename(match.filename), match.lineno)),
+                    (Token, line[indent:start]),
+                    (Token.SearchMatch, line[start:end]),
+                    (Token, line[end:]),
+                ], match.filename, match.lineno, match))
+            return rows
+
+        if len(matches) >= limit:
+            title = 'First %i matches of %s' % (limit, pattern)
+        else:
+            title = '%i match%s of %s in %i files' % (
+                len(matches), '' if len(matches) == 1 else 'es', pattern, text_index.file_count)
+
+        self.show_result_list(ResultList(title, get_rows))
+
+        if matches:
+            self.result_list_focussed = True
+            self.cli.focus(DUMMY_BUFFER)
+
+    def do_tasks(self, arg):
+        """
+        tasks
+        Show the asyncio tasks of the running event loop, with the
+        coroutines that they are awaiting, in the results pane.
+        """
+        if not get_tasks():
+            self.error('No running asyncio event loop.')
+            return
+
+        def get_rows(sort_order):
+            # (Called when the pane is rendered, not when the debugger stops.)
+            rows = []
+            for task in get_tasks():
+                rows.append(ResultRow([
+                    (Token.Name, task.get_name()),
+                    (Token, ' '),
+                    (Token.Comment, get_task_state(task)),
+                ], None, None, task))
+
+                for frame in get_await_stack(task):
+                    tokens = [
+                        (Token, '    '),
+                        (Token.CurrentLine if frame is self.curframe else Token, 'await '),
+                        (Token.Name, frame.f_code.co_name),
+                        (Token, ' '),
+                        (Token.Comment, '%s:%i ' % (os.path.basename(frame.f_code.co_filename), frame.f_lineno)),
+                    ]
+                    line = get_preview_line(frame.f_code.co_filename, frame.f_lineno)
+                    tokens.extend(python_lexer.get_tokens(line))
+                    rows.append(ResultRow(tokens, frame.f_code.co_filename, frame.f_lineno, frame))
+            return rows
+
+        self.show_result_list(ResultList('Tasks', get_rows))
+
+    def do_threads(self, arg):
+        """
+        threads
+        Show the threads in the results pane. Select a stopped thread to
+        switch to it.
+        """
+        session = self.session
+
+        def get_rows(sort_order):
+            stopped = session.stopped
+            current_frames = sys._current_frames()
+            rows = []
+
+            for thread in threading.enumerate():
+                ident = thread.ident
+                if ident in stopped:
+                    frame = stopped[ident].frame
+                    state = 'prompt' if ident == session.owner else 'stopped'
+                else:
+                    frame = current_frames.get(ident)
+                    state = 'frozen' if session.frozen else 'running'
+
+                tokens = [
+                    (Token.CurrentLine if ident == session.owner else Token,
+                     '%3i ' % session.get_number(ident)),
+                    (Token.Name, '%-20s ' % thread.name),
+                    (Token.Comment, '%-8s ' % state),
+                ]
+
+                if frame is None:
+                    rows.append(ResultRow(tokens, None, None, thread))
+                else:
+                    filename = frame.f_code.co_filename
+                    tokens.append((Token, '%s:%i ' % (os.path.basename(filename), frame.f_lineno)))
+                    line = get_preview_line(filename, frame.f_lineno)
+                    tokens.extend(python_lexer.get_tokens(line))
+                    rows.append(ResultRow(tokens, filename, frame.f_lineno, thread))
+
+            return rows
+
+        def on_select(row):
+            ident = row.data.ident
+
+            if ident in session.stopped and ident != session.owner:
+                # Run the `thread` command, so that it shows in the output.
+                buffer = self.cli.buffers[DEFAULT_BUFFER]
+                buffer.document = Document('thread %i' % session.get_number(ident))
+                self.cli.set_return_value(buffer.document)
+            elif row.filename:
+                self.open_source_location(row.filename, row.lineno)
+
+        self.show_result_list(ResultList('Threads', get_rows, on_select=on_select))
+
+    def do_thread(self, arg):
+        """
+        thread [<number> | freeze | thaw]
+        Switch to another stopped thread. (This thread stays stopped.) With
+        'freeze', pause the other threads while a thread is at the prompt.
+        Without argument, show the current thread.
+        """
+        session = self.session
+        arg = arg.strip()
+
+        if arg in ('freeze', 'thaw'):
+            session.set_freeze_threads(arg == 'freeze')
+            self.message('Other threads are %s while stopped.' % (
+                'frozen' if arg == 'freeze' else 'running'))
+            return
+
+        if not arg:
+            thread = threading.current_thread()
+            self.message('Thread %i (%s). %i stopped thread(s)%s.' % (
+                session.get_number(thread.ident), thread.name, len(session.stopped),
+                ', others frozen' if session.freeze_threads else ''))
+            return
+
+        try:
+            number = int(arg)
+        except ValueError:
+            self.error('Usage: thread [<number> | freeze | thaw]')
+            return
+
+        target = session.get_thread(number)
+        if target is None:
+            self.error('Thread %s is not stopped.' % number)
+        elif target.ident == session.owner:
+            self.message('Already in thread %i.' % number)
+        else:
+            self.message('Switching to thread %i (%s).' % (number, target.name))
+            self.thread_switch = number
+
+    def thread_stopped(self):
+        """
+        Called from another thread that stopped while we are at the prompt.
+        """
+        if self.result_list is not None and self.result_list.title == 'Threads':
+            self.result_list.invalidate()
+        self.cli.invalidate()
+
+    def do_heatmap(self, arg):
+        """
+        heatmap [on [cumulative] | off | reset]
+        Show in the source pane how often every line was executed since the
+        last stop. (Or since the heatmap was enabled, in cumulative mode.)
+        """
+        args = arg.split()
+
+        if not args:
+            if self.line_counter:
+                self.message('Heatmap enabled (%s).' % (
+                    'cumulative' if self.heatmap_cumulative else 'since last stop'))
+                if self.line_counter.overflow:
+                    self.message('Some code objects were not counted (limit: %i).' %
+                                 self.line_counter.max_code_objects)
+            else:
+                self.message('Heatmap disabled.')
+
+        elif args[0] == 'on':
+            self.heatmap_cumulative = args[1:] == ['cumulative']
+            if self.line_counter is None:
+                self.line_counter = LineCounter()
+                self.line_tracers.append(self.line_counter)
+
+        elif args[0] == 'off':
+            if self.line_counter is not None:
+                self.line_tracers.remove(self.line_counter)
+                self.line_counter = None
+
+        elif args[0] == 'reset' and self.line_counter:
+            self.line_counter.reset()
+
+        else:
+            self.error('Usage: heatmap [on [cumulative] | off | reset]')
+
+    def _stop_recording(self):
+        if self.recorder:
+            self.line_tracers.remove(self.recorder)
+            self.recorder = None
+            self.replay_index = None
+
+    def _move_replay_cursor(self, arg, same_depth):
+        """
+        Move the virtual cursor `count` events backwards. (Or forward for
+        negative numbers.)
+        """
+        if not self.recorder or not self.recorder.count:
+            self.error('Nothing recorded. Use "record on" first.')
+            return
+
+        try:
+            count = int(arg or 1)
+        except ValueError:
+            self.error('Invalid count: %r' % arg)
+            return
+
+        recorder = self.recorder
+        index = recorder.count - 1 if self.replay_index is None else self.replay_index
+
+        if count >= 0:
+            for i in range(count):
+                max_depth = recorder[index].depth if same_depth else None
+                previous = recorder.find_previous(index, max_depth)
+                if previous is None:
+                    self.error('Reached the beginning of the recording.')
+                    break
+                index = previous
+        else:
+            index -= count
+
+        if index >= recorder.count - 1:
+            self.replay_index = None
+        else:
+            self.replay_index = index
+
+        self._print_replay_position()
+
+    def _print_replay_position(self):
+        if self.replay_index is None:
+            self.message('Back at the current position.')
+        else:
+            event = self.recorder[self.replay_index]
+            self.message('[%i events back] %s(%i)%s()' % (
+                self.recorder.count - 1 - self.replay_index,
+                os.path.basename(event.code.co_filename), event.lineno,
+                event.code.co_name))
+
+            snapshot = self.recorder.get_snapshot(self.replay_index)
+            if snapshot and snapshot[0] >= self.recorder.first_index:
+                snapshot_event = self.recorder[snapshot[0]]
+                if snapshot_event.code is event.code:
+                    self.message('  locals at event %i: %s' % (
+                        snapshot[0], ', '.join('%s=%s' % item for item in sorted(snapshot[1].items()))))
+
+    def do_rstep(self, arg):
+        """
+        rstep [<count>]
+        Move the virtual cursor one recorded line back.
+        """
+        self._move_replay_cursor(arg, same_depth=False)
+
+    def do_rnext(self, arg):
+        """
+        rnext [<count>]
+        Move the virtual cursor one recorded line back, skipping calls.
+        """
+        self._move_replay_cursor(arg, same_depth=True)
+
+    def do_history(self, arg):
+        """
+        history [<count>]
+        Show the last recorded lines.
+        """
+        if not self.recorder:
+            self.error('Nothing recorded. Use "record on" first.')
+            return
+
+        try:
+            count = int(arg or 20)
+        except ValueError:
+            self.error('Invalid count: %r' % arg)
+            return
+
+        recorder = self.recorder
+        first = max(recorder.first_index, recorder.count - count)
+
+        events = [recorder[index] for index in range(first, recorder.count)]
+        min_depth = min(event.depth for event in events) if events else 0
+
+        for event in events:
+            index = event.index
+            tokens = [
+                (Token.CurrentLine if index == self.replay_index else Token,
+                 '->' if index == self.replay_index else '  '),
+                (Token.Number, ' %6i ' % (recorder.count - 1 - index)),
+                (Token, '  ' * (event.depth - min_depth)),
+                (Token.Name, os.path.basename(event.code.co_filename)),
+                (Token.Number, '(%i)' % event.lineno),
+                (Token.Name, event.code.co_name),
+                (Token, '  '),
+            ]
+            line = get_preview_line(event.code.co_filename, event.lineno)
+            tokens.extend(python_lexer.get_tokens(line))
+            tokens.append((Token, '\n'))
+            self.cli.print_tokens(tokens)
+
+    def get_replay_stack(self):
+        """
+        Return the virtual call stack at the replay cursor. (A list of
+        `RecordedEvent` objects.)
+        """
+        if self.replay_index is None:
+            return []
+
+        if self._replay_stack_cache is None or self._replay_stack_cache[0] != self.replay_index:
+            self._replay_stack_cache = (self.replay_index, self.recorder.get_stack(self.replay_index))
+        return self._replay_stack_cache[1]
+
+    #
+    # Methods overriden from Pdb, in order to add highlighting.
+    #
+
+    def precmd(self, line):
+        """
+        Override 'precmd': Tell when a command has the name of a variable of
+        the current frame. (The command wins; "!name" evaluates the name.)
+        """
+        line = pdb.Pdb.precmd(self, line)
+        name = line.strip()
+
+        if name in commands_with_help and self.curframe is not None and (
+                name in self.curframe_locals or name in self.curframe.f_globals):
+            self.message('("%s" is a debugger command. Type "!%s" for the variable.)' % (name, name))
+
+        return line
+
+    def postcmd(self, stop, line):
+        """
+        Override 'postcmd': (Show evaluation time and insert whitespace.)
+        """
+        if self.last_evaluation_time is not None:
+            self.cli.print_tokens([
+                (Token.Pdb.Elapsed, '  (%.1f ms)\n' % (self.last_evaluation_time * 1000))
+            ])
+            self.last_evaluation_time = None
+
+        print('', file=self.stdout)
+        return pdb.Pdb.postcmd(self, stop, line)
+
+    def preloop(self):
+        """
+        Override 'preloop': Update the `display` expressions. (Instead of
+        printing them, like Pdb does, they are shown in the watch panel.)
+        """
+        print('', file=self.stdout)
+
+        self.step_stats.stopped()
+        self.replay_index = None
+
+        if not self.saved_breakpoints.loaded:
+            self.saved_breakpoints.load()
+
+        # Other threads are waiting for the terminal.
+        if len(self.session.stopped) > 1 and self.result_list is None:
+            self.do_threads('')
+
+        # Frames that were only traced for exceptions need their line events
+        # back, for stepping.
+        if _has_trace_lines:
+            for frame, lineno in self.stack:
+                frame.f_trace_lines = True
+        self.source_view = None
+
+        if self.allocation_tracker:
+            self.allocation_tracker.update()
+            self._print_allocation_summary()
+
+        if self.profiler:
+            self._show_profile_results()
+
+        if self.line_counter:
+            self.line_counter.invalidate()
+
+        for watch in self.get_watches():
+            watch.update(self.curframe.f_globals, self.curframe_locals,
+                         watchdog=self.watchdog)
+
+        self._update_locals_diff()
+
+    def _update_locals_diff(self):
+        """
+        Take a shallow snapshot of the locals of the current frame, and
+        compare it with the snapshot of the previous stop, if that was in the
+        same frame.
+        """
+        # (Not the frame itself: that would keep the frame and its locals
+        # alive after it returned. See `dispatch_return`.)
+        key = (id(self.curframe), self.curframe.f_code)
+        snapshot = take_snapshot(self.curframe_locals)
+
+        if self._locals_snapshot is not None and self._locals_snapshot[0] == key:
+            self.locals_diff = diff_snapshots(self._locals_snapshot[1], snapshot)
+        else:
+            self.locals_diff = LocalsDiff()
+
+        self._locals_snapshot = (key, snapshot)
+
+    def do_changes(self, arg):
+        """
+        changes
+        Show which locals were added, removed, rebound or mutated since the
+        previous stop in this frame.
+        """
+        diff = self.locals_diff
+        if not diff:
+            self.message('No changes.')
+            return
+
+        locals = self.curframe_locals
+        for title, names in [('added', diff.added), ('rebound', diff.rebound),
+                             ('mutated', diff.mutated)]:
+            for name in names:
+                self.message('%-8s %s = %s' % (
+                    title, name, self._safe_repr(locals.get(name), name)))
+
+        for name in diff.removed:
+            self.message('%-8s %s' % ('removed', name))
+
+    def postloop(self):
+        """
+        Called when we resume execution.
+        """
+        if self.line_counter and not self.heatmap_cumulative:
+            self.line_counter.reset()
+
+        if self.allocation_tracker:
+            self.allocation_tracker.mark()
+
+        self.watchpoint_hit = None
+
+        self.step_stats.resumed()
+
+        return pdb.Pdb.postloop(self)
+
+    def get_watches(self):
+        """
+        Return the list of `Watch` objects for the current frame.
+        """
+        return list(self.displaying.get(self.curframe, {}).values())
+
+    def do_display(self, arg):
+        """
+        Override 'display': Add a (precompiled) watch expression.
+        """
+        if not arg:
+            self.message('Currently displaying:')
+            for watch in self.get_watches():
+                self.message('%s: %s' % (watch.expression, watch.value_repr))
+            return
+
+        try:
+            watch = Watch(arg, budget=self.display_time_budget,
+                          sample_size=self.display_sample_size)
+        except SyntaxError as e:
+            self.error('Invalid expression: %s' % e)
+            return
+
+        displaying = self.displaying.setdefault(self.curframe, collections.OrderedDict())
+        displaying[arg] = watch
+
+        watch.update(self.curframe.f_globals, self.curframe_locals,
+                     watchdog=self.watchdog)
+        self.message('display %s: %s' % (arg, watch.value_repr))
+
+    def do_undisplay(self, arg):
+        """
+        Override 'undisplay': Remove the watch expression(s).
+        """
+        if arg:
+            try:
+                del self.displaying.get(self.curframe, {})[arg]
+            except KeyError:
+                self.error('not displaying %s' % arg)
+        else:
+            self.displaying.pop(self.curframe, None)
+
+    def do_interact(self, args):
+        """
+        Interact: start interpreter.
+        (Override the 'pdb' implementation. We call ptpython instead.)
+        """
+        print('', file=self.stdout)
+        namespace = FrameNamespace(self.curframe, self.curframe_locals)
+        repl_globals = namespace
+
+        if six.PY2:
+            # (Python 2 doesn't look up the globals of nested scopes through
+            # `FrameNamespace`, give them a copy that includes the locals.)
+            repl_globals = dict(namespace.globals)
+            repl_globals.update(namespace.locals)
+
+        repl = PythonRepl(
+            get_globals=lambda: repl_globals,
+            get_locals=lambda: namespace,
+            vi_mode=self.python_input.vi_mode)
+
+        # Share the history with the debugger prompt. (This has to be set
+        # before the application is created.)
+        repl.history = self.python_input.history
+
+        # Reuse the event loop of the debugger prompt.
+        cli = PythonCommandLineInterface(
+            python_input=repl, eventloop=self.cli.eventloop,
+            input=self.remote_terminal and self.remote_terminal.input,
+            output=self.remote_terminal and self.remote_terminal.output)
+        cli.run()
+
+    def _evaluate(self, func, *a):
+        """
+        Call `func` (`eval` or `exec`) under the evaluation budget, and show
+        how long it took.
+        """
+        self.last_evaluation_time = None
+        result, self.last_evaluation_time = self.watchdog.call(
+            self.evaluation_budget, func, *a)
+        return result
+
+    def _getval(self, arg):
+        """
+        Override `Pdb._getval`: Evaluate under the evaluation budget.
+        (Used by `p`, `pp` and `whatis`.)
+        """
+        try:
+            return self._evaluate(eval, arg, self.curframe.f_globals, self.curframe_locals)
+        except:
+            self._error_exc()
+            raise
+
+    def _error_exc(self):
+        exc_info = sys.exc_info()[:2]
+        self.error(traceback.format_exception_only(*exc_info)[-1].strip())
+
+    def default(self, line):
+        """
+        Override `Pdb.default`: Execute Python code under the evaluation
+        budget.
+        """
+        if line[:1] == '!':
+            line = line[1:]
+
+        locals = self.curframe_locals
+        globals = self.curframe.f_globals
+
+        try:
+            code = compile(line + '\n', '<stdin>', 'single')
+            save_stdout = sys.stdout
+            save_stdin = sys.stdin
+            save_displayhook = sys.displayhook
+            try:
+                sys.stdin = self.stdin
+                sys.stdout = self.stdout
+                sys.displayhook = getattr(self, 'displayhook', sys.displayhook)
+                self._evaluate(six.exec_, code, globals, locals)
+            finally:
+                sys.stdout = save_stdout
+                sys.stdin = save_stdin
+                sys.displayhook = save_displayhook
+        except:
+            self._error_exc()
+
+    def break_here(self, frame):
+        """
+        Override `Bdb.break_here`: Evaluate breakpoint conditions under the
+        evaluation budget. (When a condition times out, we stop.) Also stop
+        when a watchpoint of this frame changed.
+        """
+        if self.watchpoints.frame_watchpoints:
+            watchpoint = self.watchpoints.check_frame(frame)
+            if watchpoint is not None:
+                watchpoint.hit_counter.increment()
+                self.watchpoint_hit = watchpoint
+                self._print_watchpoint_hit(watchpoint)
+                return True
+
+        # Only arm the watchdog when there is a breakpoint on this line.
+        # (Like `Bdb.break_here`, but `self.breaks` is shared with other
+        # threads, so we look up the list only once.)
+        filename = self.canonic(frame.f_code.co_filename)
+        breaks = self.breaks.get(filename)
+        if not breaks:
+            return False
+
+        lineno = frame.f_lineno
+        if lineno not in breaks:
+            lineno = frame.f_code.co_firstlineno
+            if lineno not in breaks:
+                return False
+
+        # `bdb.effective` updates the hit and ignore counts of the
+        # breakpoints. Only one thread at a time does that for a line.
+        with self.session.get_line_lock(filename, lineno):
+            (bp, flag), _ = self.watchdog.call(
+                self.evaluation_budget, bdb.effective, filename, lineno, frame)
+
+        if self.watchdog.interrupted:
+            self.message('Evaluation of the breakpoint condition took longer than %ss.'
+                         % self.evaluation_budget)
+
+        if not bp:
+            return False
+
+        self.currentbp = bp.number
+        if flag and bp.temporary:
+            self.do_clear(str(bp.number))
+        return True
+
+    def _add_to_breaks(self, filename, lineno):
+        """
+        Override `Bdb._add_to_breaks`: Replace the list of lines, instead of
+        appending to it. (Other threads read it without locking.)
+        """
+        lines = self.breaks.get(filename, [])
+        if lineno not in lines:
+            self.breaks[filename] = lines + [lineno]
+
+            # (`Bdb.__init__` loads the existing breakpoints before there is
+            # a session.)
+            if hasattr(self, 'session'):
+                self.session.update_thread_tracing()
+
+    def _prune_breaks(self, filename, lineno):
+        """
+        Override `Bdb._prune_breaks`: Replace the list of lines, instead of
+        removing from it.
+        """
+        lines = self.breaks[filename]
+        if (filename, lineno) not in bdb.Breakpoint.bplist:
+            lines = [l for l in lines if l != lineno]
+
+        if lines:
+            self.breaks[filename] = lines
+        else:
+            del self.breaks[filename]
+            self.session.update_thread_tracing()
+
+    def error(self, msg):
+        """
+        Override default error handler from PDB.
+        """
+        self.cli.print_tokens([
+            (Token.Pdb.Error, '  %s  \n' % msg)
+        ])
+
+    def print_stack_entry(self, frame_lineno, prompt_prefix=': '):
+        """
+        Override `print_stack_entry` of Pdb, in order to add highlighting.
+        """
+        frame, lineno = frame_lineno
+
+        tokens = []
+        tokens.extend(format_stack_entry(self, frame, lineno))
+        tokens.append((Token, '\n'))
+
+        self.cli.print_tokens(tokens)
+
+    def do_list(self, arg):
+        """
+        Override `Pdb.do_list`: Add highlighting.
+        """
+        self.lastcmd = 'list'
+        last = None
+        if arg and arg != '.':
+            try:
+                if ',' in arg:
+                    first, last = arg.split(',')
+                    first = int(first.strip())
+                    last = int(last.strip())
+                    if last < first:
+                        # assume it's a count
+                        last = first + last
+                else:
+                    first = int(arg.strip())
+                    first = max(1, first - 5)
+            except ValueError:
+                self.error('Error in argument: %r' % arg)
+                return
+        elif self.lineno is None or arg == '.':
+            first = max(1, self.curframe.f_lineno - 5)
+        else:
+            first = self.lineno + 1
+        if last is None:
+            last = first + 10
+        filename = self.curframe.f_code.co_filename
+        breaklist = self.get_file_breaks(filename)
+        try:
+            lines = linecache.getlines(filename, self.curframe.f_globals)
+            self._print_lines_2(lines, first, last, breaklist,
+                              self.curframe)
+            self.lineno = min(last, len(lines))
+            if len(lines) < last:
+                self.message('[EOF]')
+        except KeyboardInterrupt:
+            pass
+    do_l = do_list
+
+    def _print_lines(self, lines, start, breaks=(), frame=None):
+        """
+        Override `Pdb._print_lines` (for `longlist` and `source`): Print in
+        color, with the long lines cut, like `list`.
+        """
+        self._print_lines_2(['\n'] * (start - 1) + lines, start,
+                            start + len(lines) - 1, breaks, frame)
+
+    def _print_lines_2(self, lines, start, end, breaks=(), frame=None):
+        """
+        Similar to `Pdb._print_lines`, except that this takes all the lines
+        of the given file as input, it uses Pygments for the highlighting,
+        it does slicing, and it prints everything in color.
+
+        Like in the source pane, lines that are longer than `long_line_width`
+        are cut. (Lexing a line of megabytes would hang.)
+        """
+        if frame:
+            current_lineno = frame.f_lineno
+        else:
+            current_lineno = exc_lineno = -1
+
+        # The columns of the source pane, or the ones around the current
+        # instruction.
+        width = self.long_line_width
+        column = self.source_hscroll
+        if column is None:
+            column = max(0, get_instruction_column(frame) - width // 4) if frame else 0
+
+        # Highlight everything. (Highlighting works much better from the
+        # beginning of the file.)
+        view = SourceView(lines, width, column)
+        view.highlight(lambda: False)
+
+        # Slice lines.
+        lines = view.token_lines[start-1:end]
+
+        # Add left margin. (Numbers + 'B' or '->'.)
+        def add_margin(lineno, tokens):
+            is_break = lineno in breaks
+            is_current_line = lineno == current_lineno
+
+            return get_line_prefix_tokens(is_break, is_current_line) \
+                + [(Token.LineNumber, str(lineno).rjust(3) + ' ')] \
+                + tokens + [(Token, '\n')]
+
+        lines = [add_margin(i + start, tokens) for i, tokens in enumerate(lines)]
+
+        for l in lines:
+            self.cli.print_tokens(l)
+
+    def _safe_repr(self, obj, expr):
+        """ Repr that doesn't raise. (Not available in Pdb for Python 2.) """
+        try:
+            return repr(obj)
+        except Exception as e:
+            return '*** repr(%s) failed: %r ***' % (expr, e)
+
+    def message(self, msg):
+        """ Print message to stdout. This function is present in Pdb for
+        Python3, but not in Python2. """
+        print(msg, file=self.stdout)
+
+
+class SnapshotPdb(PtPdb):
+    """
+    Read-only debugger for a crash snapshot. (See `ptpdb.snapshots`.) The
+    stack can be navigated, and expressions can be evaluated on the saved
+    locals, but nothing can be executed.
+    """
+    # Don't change the breakpoint file of the project.
+    breakpoints_filename = None
+    follow_threads = False
+
+    def __init__(self, snapshot):
+        PtPdb.__init__(self)
+        self.snapshot = snapshot
+
+    def run(self):
+        """
+        Show the snapshot, until the user quits.
+        """
+        snapshot = self.snapshot
+        index = snapshot.index
+
+        self.message('Snapshot of pid %i (%s), %s' % (
+            index['pid'], ' '.join(index['argv']),
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(index['time']))))
+
+        if snapshot.exception:
+            self.message(snapshot.exception['traceback'].rstrip())
+
+        if not snapshot.frames:
+            self.error('The snapshot has no frames.')
+            return
+
+        self.botframe = snapshot.frames[0]
+        try:
+            self.interaction(snapshot.frames[-1], None)
+        except bdb.BdbQuit:
+            pass
+
+    def _read_only(self, arg):
+        self.error('This is a snapshot: nothing can be executed. (Use "quit" to leave.)')
+
+    do_step = do_s = do_next = do_n = do_return = do_r = _read_only
+    do_until = do_unt = do_jump = do_j = do_run = do_restart = _read_only
+    do_debug = do_profile = do_record = do_longlist = do_ll = _read_only
+
+    def do_continue(self, arg):
+        " Leave the snapshot. "
+        return self.do_quit(arg)
+
+    do_c = do_cont = do_continue
+
+
+def load_snapshot(path):
+    """
+    Open the debugger on a snapshot file. (`python -m ptpdb --load <path>`)
+    """
+    SnapshotPdb(Snapshot(path)).run()
+
+
+python_lexer = PythonLexer(
+    stripnl=False,
+    stripall=False,
+    ensurenl=False)
+
+source_prefetcher = SourcePrefetcher()
+symbol_index = SymbolIndex(os.path.expanduser('~/.ptpdb_symbols'))
+text_index = TrigramIndex()
+
+
+def set_trace(serve_event_loop=False, remote=None, follow_threads=False):
+    """
+    Start the debugger in the calling frame.
+
+    :param serve_event_loop: Keep running the other tasks of the asyncio event
+        loop while the prompt is shown.
+    :param remote: Show the prompt through `ptpdb-attach` instead of in this
+        terminal. A Unix socket path, a 'host:port' string, a port number, or
+        `True` for the default socket. (See `ptpdb.remote`.)
+    :param follow_threads: Stop at the breakpoints in the other threads too.
+    """
+    PtPdb(serve_event_loop=serve_event_loop, remote=remote,
+          follow_threads=follow_threads).set_trace(sys._getframe().f_back)
+
+
+def debug_workers(address=True, follow_in_terminal=False):
+    """
+    Debug the worker processes that are started from now on (forked, or
+    started by `multiprocessing`). The workers that stop register with a
+    broker in this process. `ptpdb-attach --follow` (in another terminal)
+    shows them one at a time, in the order in which they stopped. The other
+    stopped workers wait.
+
+    :param address: The address of the broker, like `remote` for `set_trace`.
+    :param follow_in_terminal: Show the workers in the terminal of this
+        process instead, from a background thread. Only for a parent process
+        that's not debugged itself: its own prompt would use the same
+        terminal.
+    :raises RuntimeError: When `follow_in_terminal` is set, and this process
+        is debugged. Before Python 3.7, where forked children can't reset
+        the state of the debugger.
+    """
+    if follow_in_terminal and (sys.gettrace() is not None or ThreadSession._instance is not None):
+        raise RuntimeError(
+            'This process is debugged, its prompt would use the same terminal as '
+            'the workers. Use `ptpdb-attach --follow` in another terminal.')
 
-def set_trace():
-    PtPdb().set_trace(sys._getframe().f_back)
+    start_broker(address, follow_in_terminal=follow_in_terminal)
@@ -0,0 +1,28 @@
+"""
+Command line interface::
+
+    python -m ptpdb --load <snapshot>
+"""
+from __future__ import unicode_literals, absolute_import, print_function
+
+from . import load_snapshot
+
+import argparse
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m ptpdb')
+    parser.add_argument('--load', metavar='SNAPSHOT', required=True,
+                        help='Open a crash snapshot. (See ptpdb.snapshot.)')
+    args = parser.parse_args()
+
+    try:
+        load_snapshot(args.load)
+    except (IOError, OSError, ValueError) as e:
+        print('Could not open %s: %s' % (args.load, e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Exception breakpoints, for the `catch` command.
+
+Every exception that's raised while tracing reaches `CatchpointTable.match`.
+To keep that cheap for programs that raise and catch many exceptions, the
+catchpoints that apply to an exception class are computed once (by walking its
+MRO) and cached in a dictionary, so afterwards it's a single dict lookup.
+
+The table is read by all traced threads without locking. That's why changes
+replace the dictionaries instead of modifying them.
+"""
+from __future__ import unicode_literals, absolute_import
+
+import os
+import sysconfig
+
+from .counter import Counter
+
+__all__ = (
+    'Catchpoint',
+    'CatchpointTable',
+    'is_user_code',
+)
+
+
+class Catchpoint(object):
+    """
+    Stop when an exception of the given class (or a subclass) is raised.
+
+    :param condition: Python expression (string), evaluated in the frame that
+        raises the exception, or `None`.
+    :param user_code_only: Only stop where the exception enters user code.
+        (Not in the standard library or in installed packages.)
+    """
+    def __init__(self, number, exception_class, condition=None, user_code_only=False):
+        self.number = number
+        self.exception_class = exception_class
+        self.condition = condition
+        self.user_code_only = user_code_only
+        self.hit_counter = Counter()
+
+        self.code = compile(condition, '<catch condition>', 'eval') if condition else None
+
+    @property
+    def name(self):
+        return self.exception_class.__name__
+
+    @property
+    def hits(self):
+        return self.hit_counter.value
+
+    def __repr__(self):
+        return 'Catchpoint(%i, %s)' % (self.number, self.name)
+
+
+class CatchpointTable(object):
+    """
+    All the catchpoints.
+    """
+    def __init__(self):
+        self._catchpoints = {}  # Number -> `Catchpoint`.
+        self._next_number = 1
+
+        # Maps exception classes to the list of catchpoints that apply.
+        self._match_cache = {}
+
+    def __len__(self):
+        return len(self._catchpoints)
+
+    def __iter__(self):
+        return iter(sorted(self._catchpoints.values(), key=lambda c: c.number))
+
+    def add(self, exception_class, condition=None, user_code_only=False):
+        catchpoint = Catchpoint(self._next_number, exception_class,
+                                condition, user_code_only)
+        catchpoints = dict(self._catchpoints)
+        catchpoints[catchpoint.number] = catchpoint
+        self._next_number += 1
+        self._replace(catchpoints)
+        return catchpoint
+
+    def remove(self, number):
+        " Remove a catchpoint. Raise `KeyError` when it doesn't exist. "
+        catchpoints = dict(self._catchpoints)
+        del catchpoints[number]
+        self._replace(catchpoints)
+
+    def clear(self):
+        self._replace({})
+
+    def _replace(self, catchpoints):
+        # First the catchpoints, then the cache. (A thread that fills the old
+        # cache in the meantime doesn't affect the new one.)
+        self._catchpoints = catchpoints
+        self._match_cache = {}
+
+    def match(self, exception_class):
+        """
+        Return the list of catchpoints that apply to this exception class.
+        """
+        cache = self._match_cache
+        try:
+            return cache[exception_class]
+        except KeyError:
+            mro = set(getattr(exception_class, '__mro__', ()))
+            result = [c for c in self if c.exception_class in mro]
+            cache[exception_class] = result
+            return result
+
+
+# Directories that don't contain user code.
+_library_directories = tuple(set(
+    os.path.normcase(os.path.abspath(path)) + os.sep
+    for path in [sysconfig.get_path(name) for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')]
+    if path))
+
+_user_code_cache = {}
+
+
+def is_user_code(filename):
+    """
+    True when the file is not part of the standard library, or an installed
+    package. (Code that wasn't loaded from a file, like `exec`, counts as user
+    code, except for frozen modules.)
+    """
+    try:
+        return _user_code_cache[filename]
+    except KeyError:
+        if filename.startswith('<'):
+            result = not filename.startswith('<frozen')
+        else:
+            path = os.path.normcase(os.path.abspath(filename))
+            result = not path.startswith(_library_directories)
+        _user_code_cache[filename] = result
+        return result
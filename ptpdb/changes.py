@@ -0,0 +1,85 @@
+"""
+Shallow snapshots of the local variables of a frame.
+
+At every stop, we record for every local name the identity of the value and a
+cheap fingerprint. When we stop again in the same frame, comparing both
+snapshots tells which names were added, removed or rebound, and which small
+containers were mutated in place. The cost of this is bounded by the number
+of locals, not by the size of the objects.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from .watches import fingerprint
+
+import six
+
+__all__ = (
+    'LocalsDiff',
+    'take_snapshot',
+    'diff_snapshots',
+)
+
+
+def take_snapshot(namespace, sample_size=16):
+    """
+    Return a snapshot of the given namespace (usually `frame.f_locals`): a
+    dictionary mapping the names to (id, fingerprint) tuples.
+
+    Containers with up to `sample_size` items are fully covered by the
+    fingerprint, so that in-place mutations are detected.
+    """
+    return dict((name, (id(value), fingerprint(value, sample_size)))
+                for name, value in six.iteritems(namespace))
+
+
+class LocalsDiff(object):
+    """
+    Difference between two snapshots of the same frame.
+    """
+    def __init__(self, added=(), removed=(), rebound=(), mutated=()):
+        self.added = sorted(added)
+        self.removed = sorted(removed)
+        self.rebound = sorted(rebound)
+        self.mutated = sorted(mutated)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.rebound or self.mutated)
+
+    __nonzero__ = __bool__  # Python 2.
+
+    def __repr__(self):
+        return 'LocalsDiff(added=%r, removed=%r, rebound=%r, mutated=%r)' % (
+            self.added, self.removed, self.rebound, self.mutated)
+
+
+def diff_snapshots(old, new):
+    """
+    Compare two snapshots, taken by :func:`.take_snapshot`, and return a
+    :class:`.LocalsDiff` instance.
+    """
+    added = []
+    rebound = []
+    mutated = []
+
+    for name, (new_id, new_fingerprint) in six.iteritems(new):
+        try:
+            old_id, old_fingerprint = old[name]
+        except KeyError:
+            added.append(name)
+            continue
+
+        if new_fingerprint == old_fingerprint:
+            # For numbers and strings the fingerprint contains the value
+            # itself, so a new object with the same value is not reported.
+            if new_id == old_id or isinstance(new_fingerprint[0], type):
+                continue
+
+        if new_id != old_id:
+            rebound.append(name)
+        else:
+            mutated.append(name)
+
+    removed = [name for name in old if name not in new]
+
+    return LocalsDiff(added=added, removed=removed, rebound=rebound,
+                      mutated=mutated)
@@ -33,10 +33,29 @@ commands_with_help = {
     'where': 'Print a stack trace.',
     'until': 'Continue execution until.',
     'display': 'Display the value of the expression if it changed.',
+    'undisplay': 'Do not display the expression any more in the current frame.',
     'longlist': 'List the whole source code for the current function or frame.',
     'retval': 'Print the return value for the last return of a function.',
     'source': 'Try to get source code for the given object and display it.',
     'interact': 'Start an interactive interpreter.',
+    'changes': 'Show the locals that changed since the previous stop.',
+    'record': 'Record executed lines for reverse stepping.',
+    'rstep': 'Move the virtual cursor one recorded line back.',
+    'rnext': 'Move the virtual cursor one recorded line back, skipping calls.',
+    'history': 'Show the last recorded lines.',
+    'heatmap': 'Show how often every line was executed since the last stop.',
+    'profile': 'Resume under a profiler until the next stop, and show hot functions.',
+    'mem': 'Track memory allocations between stops.',
+    'stats': 'Show the run time of the last step, and the overhead of the debugger.',
+    'render': 'Profile the rendering of the user interface.',
+    'catch': 'Stop when an exception of the given type is raised.',
+    'uncatch': 'Remove catchpoints.',
+    'watch': 'Stop when an attribute of an object changes.',
+    'unwatch': 'Remove watchpoints.',
+    'tasks': 'Show the asyncio tasks and the coroutines they are awaiting.',
+    'threads': 'Show the threads, and switch to a stopped one.',
+    'thread': 'Switch to another stopped thread, or freeze the other threads.',
+    'grep': 'Search a regular expression in the source files of the loaded modules.',
 }
 
 shortcuts = {
@@ -77,4 +96,15 @@ completion_hints = [
     (('display', 'undisplay'), '[<expression>]'),
     (('source', ), '<expression>'),
     (('commands', ), '[<bpnumber>]'),
+    (('record', ), '[on [<capacity> [<snapshot_interval>]] | off]'),
+    (('rstep', 'rnext', 'history'), '[<count>]'),
+    (('heatmap', ), '[on [cumulative] | off | reset]'),
+    (('profile', ), '[until | return | continue]'),
+    (('mem', ), '[on [<nframes>] | off | show | break [<n>]]'),
+    (('catch', ), '[-u] <exception_class> [, <condition>]'),
+    (('uncatch', 'unwatch'), '[<number>...]'),
+    (('watch', ), '<expression>.<attribute>'),
+    (('thread', ), '[<number> | freeze | thaw]'),
+    (('grep', ), '[-i] <pattern>'),
+    (('render', ), '[on | off | dump <file>]'),
 ]
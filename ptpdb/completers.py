@@ -9,7 +9,9 @@ from ptpdb.commands import commands_with_help
 import bdb
 import os
 import re
+import six
 import sys
+import types
 
 
 class PdbCommandsCompleter(WordCompleter):
@@ -107,3 +109,110 @@ class AliasCompleter(WordCompleter):
         super(AliasCompleter, self).__init__(
             pdb.aliases.keys(),
             meta_dict=pdb.aliases)
+
+
+try:
+    from inspect import getattr_static as _getattr_static
+except ImportError:  # Python 2.
+    def _getattr_static(obj, name, *default):
+        if isinstance(obj, types.ModuleType):
+            return obj.__dict__[name] if not default else obj.__dict__.get(name, *default)
+        if isinstance(obj, type):
+            for cls in obj.__mro__:
+                if name in cls.__dict__:
+                    return cls.__dict__[name]
+        if default:
+            return default[0]
+        raise AttributeError(name)
+
+
+class ExceptionClassCompleter(Completer):
+    """
+    Complete on the exception classes that are visible from the current
+    frame. (And on exception classes in modules, for dotted names.)
+    """
+    def __init__(self, pdb):
+        self.pdb = pdb
+
+    def get_completions(self, document, complete_event):
+        text = document.text
+        frame = self.pdb.curframe
+
+        names = {}
+        names.update(six.moves.builtins.__dict__)
+        names.update(frame.f_globals)
+        names.update(self.pdb.curframe_locals)
+
+        if '.' in text:
+            # Look up the dotted name, without evaluating anything: this runs
+            # at every key press. (No properties or `__getattr__` hooks.)
+            parent_name, _, prefix = text.rpartition('.')
+            parts = parent_name.split('.')
+            try:
+                parent = names[parts[0]]
+                for part in parts[1:]:
+                    parent = _getattr_static(parent, part)
+                names = dict((name, _getattr_static(parent, name, None)) for name in dir(parent))
+            except Exception:
+                return
+        else:
+            prefix = text
+
+        for name, value in sorted(names.items()):
+            if name.startswith(prefix):
+                if isinstance(value, type) and issubclass(value, BaseException):
+                    yield Completion(name, -len(prefix), display_meta=value.__module__)
+                elif isinstance(value, types.ModuleType):
+                    yield Completion(name, -len(prefix), display_meta='module')
+
+
+class CatchpointListCompleter(WordCompleter):
+    """
+    Completer for catchpoint numbers.
+    """
+    def __init__(self, pdb):
+        commands = []
+        meta_dict = {}
+
+        for catchpoint in pdb.catchpoints:
+            commands.append('%s' % catchpoint.number)
+            meta_dict['%s' % catchpoint.number] = catchpoint.name
+
+        super(CatchpointListCompleter, self).__init__(
+            commands,
+            meta_dict=meta_dict)
+
+
+class WatchpointListCompleter(WordCompleter):
+    """
+    Completer for watchpoint numbers.
+    """
+    def __init__(self, pdb):
+        commands = []
+        meta_dict = {}
+
+        for watchpoint in pdb.watchpoints:
+            commands.append('%s' % watchpoint.number)
+            meta_dict['%s' % watchpoint.number] = '%s (%i hits)' % (
+                watchpoint.expression, watchpoint.hits)
+
+        super(WatchpointListCompleter, self).__init__(
+            commands,
+            meta_dict=meta_dict)
+
+
+class ThreadListCompleter(WordCompleter):
+    """
+    Completer for the numbers of the stopped threads.
+    """
+    def __init__(self, pdb):
+        commands = ['freeze', 'thaw']
+        meta_dict = {}
+
+        for thread in pdb.session.stopped.values():
+            commands.append('%s' % thread.number)
+            meta_dict['%s' % thread.number] = thread.name
+
+        super(ThreadListCompleter, self).__init__(
+            commands,
+            meta_dict=meta_dict)
@@ -0,0 +1,293 @@
+"""
+Support for debugging asyncio code.
+
+Stepping should not end up in the internals of the event loop. Instead of
+matching module names with `fnmatch` for every frame (like Bdb's `skip`
+option), we decide once per code object whether it belongs to the event loop,
+and cache that in a dictionary.
+"""
+from __future__ import unicode_literals, absolute_import
+
+import dis
+import inspect
+import os
+import six
+import sys
+import time
+
+__all__ = (
+    'EventLoopCode',
+    'is_coroutine',
+    'is_suspended',
+    'get_tasks',
+    'get_task_state',
+    'get_await_stack',
+    'EventLoopPump',
+)
+
+#: Modules that implement event loops.
+EVENT_LOOP_MODULES = ('asyncio', 'selectors', 'concurrent.futures', 'uvloop')
+
+_COROUTINE_FLAGS = getattr(inspect, 'CO_COROUTINE', 0) | getattr(inspect, 'CO_ITERABLE_COROUTINE', 0)
+_YIELD_VALUE = dis.opmap.get('YIELD_VALUE')
+_RESUME = dis.opmap.get('RESUME')  # Python 3.11+.
+
+
+class EventLoopCode(object):
+    """
+    Collection of code objects that belong to the event loop.
+    (`code in event_loop_code` is a dictionary lookup.)
+    """
+    def __init__(self, module_names=EVENT_LOOP_MODULES):
+        self.module_names = module_names
+
+        self._paths = ()
+        self._loaded_modules = set()
+        self._cache = {}  # Maps code objects to booleans.
+
+    def __contains__(self, code):
+        try:
+            return self._cache[code]
+        except KeyError:
+            self._update_paths()
+            result = self._cache[code] = code.co_filename.startswith(self._paths)
+            return result
+
+    def _update_paths(self):
+        """
+        Compute the locations of the event loop modules that were imported.
+        (Only when new ones were imported.)
+        """
+        loaded = set(name for name in self.module_names if name in sys.modules)
+
+        if loaded != self._loaded_modules:
+            paths = []
+            for name in loaded:
+                filename = getattr(sys.modules[name], '__file__', None)
+                if filename:
+                    if os.path.basename(filename).startswith('__init__.'):
+                        paths.append(os.path.dirname(filename) + os.sep)
+                    else:
+                        paths.append(os.path.splitext(filename)[0] + '.py')
+
+            self._paths = tuple(paths)
+            self._loaded_modules = loaded
+            self._cache.clear()
+
+
+def is_coroutine(frame):
+    " True when this frame runs a coroutine. "
+    return bool(frame.f_code.co_flags & _COROUTINE_FLAGS)
+
+
+def is_suspended(frame):
+    """
+    For a 'return' event of a coroutine or generator frame: True when it is
+    suspended (at an `await` or `yield`), False when it really returns.
+    """
+    code = frame.f_code.co_code
+    opcode = six.indexbytes(code, frame.f_lasti)
+
+    if opcode == _YIELD_VALUE:
+        return True
+
+    # Python 3.13+: the event comes after the `YIELD_VALUE`, at the `RESUME`
+    # that follows it. (Its argument is zero only at the start of the code.)
+    return opcode == _RESUME and six.indexbytes(code, frame.f_lasti + 1) & 3 != 0
+
+
+def get_tasks():
+    """
+    Return the tasks of the event loop that runs in this thread. (An empty
+    list when there is no running event loop.)
+    """
+    asyncio = sys.modules.get('asyncio')
+    if asyncio is None:
+        return []
+
+    try:
+        loop = asyncio.get_running_loop()
+    except (AttributeError, RuntimeError):
+        return []
+
+    return sorted(asyncio.all_tasks(loop), key=lambda t: t.get_name())
+
+
+def get_task_state(task):
+    " Return 'cancelled', 'done' or 'pending'. "
+    # (A cancelled task is also done.)
+    if task.cancelled():
+        return 'cancelled'
+    elif task.done():
+        return 'done'
+    else:
+        return 'pending'
+
+
+def get_await_stack(task):
+    """
+    Return the frames of the coroutines that the task is awaiting, outermost
+    first.
+    """
+    asyncio = sys.modules['asyncio']
+
+    # The task that runs now (and that the debugger stopped in): its
+    # coroutines are on the call stack.
+    if task is asyncio.current_task():
+        result = []
+        frame = sys._getframe()
+        while frame is not None:
+            if is_coroutine(frame):
+                result.append(frame)
+            frame = frame.f_back
+        return result[::-1]
+
+    result = []
+    awaitable = task.get_coro()
+
+    while awaitable is not None:
+        frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None)
+        if frame is None:
+            break
+        result.append(frame)
+        awaitable = getattr(awaitable, 'cr_await', None) or getattr(awaitable, 'gi_yieldfrom', None)
+
+    return result
+
+
+class EventLoopPump(object):
+    """
+    Keep serving the other tasks of an asyncio event loop while the debugger
+    waits for input. Called as the inputhook of the prompt_toolkit event loop.
+
+    The debugger stops inside one iteration of the event loop (in the frame
+    of `task`), so we run nested iterations of the same loop, until there is
+    input for the prompt. While that happens, `task` is detached from the loop,
+    so that the other tasks can be stepped. Their code runs from inside the
+    trace function, so it's not traced.
+
+    This depends on private internals of CPython's asyncio:
+
+    - `BaseEventLoop._run_once` is called re-entrantly, from inside the
+      iteration that runs `task`.
+    - `_run_once` pops a fixed number of handles from `loop._ready`. The
+      nested iterations pop some of them, so we put cancelled dummy
+      `Handle` objects back in their place.
+    - `asyncio.tasks._leave_task` and `_enter_task` swap the current task,
+      so that the other tasks can be stepped.
+
+    That's why `is_supported` is only True for the Python versions on which
+    this was tested, and for event loops that have these internals.
+
+    :param on_change: Callable, called with the number of other tasks every
+        time that it changes.
+    """
+    #: Seconds between checks of the number of tasks.
+    check_interval = .5
+
+    #: Oldest and newest Python version on which the internals are known to
+    #: behave as described above.
+    tested_versions = ((3, 7), (3, 13))
+
+    def __init__(self, loop, task, on_change=None):
+        self.loop = loop
+        self.task = task
+        self.on_change = on_change
+
+        #: Number of other tasks that are not done.
+        self.running_tasks = self._count_tasks()
+
+        #: Number of loop iterations that ran while the prompt was open.
+        self.iterations = 0
+
+    @classmethod
+    def for_running_loop(cls, on_change=None):
+        """
+        Create an `EventLoopPump` for the event loop that runs in this
+        thread. Return `None` when there is none, or when it's not supported.
+        """
+        asyncio = sys.modules.get('asyncio')
+        if asyncio is None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except (AttributeError, RuntimeError):
+            return
+
+        if not cls.is_supported(loop):
+            return
+
+        return cls(loop, asyncio.current_task(loop), on_change)
+
+    @classmethod
+    def is_supported(cls, loop):
+        oldest, newest = cls.tested_versions
+        if not oldest <= sys.version_info[:2] <= newest:
+            return False
+
+        tasks = sys.modules['asyncio'].tasks
+        return (hasattr(loop, '_run_once') and hasattr(loop, '_ready') and
+                hasattr(loop, 'add_reader') and
+                hasattr(tasks, '_enter_task') and hasattr(tasks, '_leave_task'))
+
+    def _count_tasks(self):
+        asyncio = sys.modules['asyncio']
+        return len([t for t in asyncio.all_tasks(self.loop) if t is not self.task])
+
+    def _check_tasks(self):
+        count = self._count_tasks()
+        if count != self.running_tasks:
+            self.running_tasks = count
+            if self.on_change:
+                self.on_change(count)
+
+    def __call__(self, context):
+        """
+        Run the event loop until `context` reports that there is input.
+        """
+        asyncio = sys.modules['asyncio']
+        loop = self.loop
+        ready = []
+
+        try:
+            loop.add_reader(context.fileno(), ready.append, True)
+        except NotImplementedError:
+            return
+
+        # Wake up regularly, for updating the number of tasks.
+        def heartbeat():
+            handle[0] = loop.call_later(self.check_interval, heartbeat)
+        handle = [None]
+        heartbeat()
+
+        # We are inside `loop._run_once`, which pops a fixed number of
+        # handles from `loop._ready`. Make sure that they are still there when
+        # we return.
+        ready_count = len(loop._ready)
+
+        if self.task is not None:
+            asyncio.tasks._leave_task(loop, self.task)
+
+        try:
+            last_check = time.time()
+            while not ready:
+                loop._run_once()
+                self.iterations += 1
+
+                if time.time() - last_check >= self.check_interval:
+                    last_check = time.time()
+                    self._check_tasks()
+        finally:
+            if self.task is not None:
+                asyncio.tasks._enter_task(loop, self.task)
+
+            handle[0].cancel()
+            loop.remove_reader(context.fileno())
+
+            for i in range(ready_count - len(loop._ready)):
+                dummy = asyncio.Handle(lambda: None, (), loop)
+                dummy.cancel()
+                loop._ready.appendleft(dummy)
+
+        self._check_tasks()
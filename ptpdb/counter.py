@@ -0,0 +1,32 @@
+"""
+Counters that are incremented from many threads.
+"""
+from __future__ import unicode_literals, absolute_import
+
+import threading
+
+__all__ = (
+    'Counter',
+)
+
+
+class Counter(object):
+    """
+    Counter that many threads can increment at the same time, without a lock:
+    every thread increments its own slot, and reading the value adds them.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._slots = []
+
+    def increment(self):
+        try:
+            slot = self._local.slot
+        except AttributeError:
+            slot = self._local.slot = [0]
+            self._slots.append(slot)
+        slot[0] += 1
+
+    @property
+    def value(self):
+        return sum(slot[0] for slot in list(self._slots))
@@ -25,7 +25,14 @@ def create_pdb_grammar(pdb_commands):
             (?P<pdb_command>alias)           \s+  [^\s]+   \s+  """ + (create_grammar(False) if recursive else '.+') + """
             (?P<pdb_command>unalias)         \s+  (?P<alias_name>.*) |
             (?P<pdb_command>h|help)          \s+  (?P<pdb_command>.*) |
-            (?P<pdb_command>display)         \s+  (?P<python_code>.*) |
+            (?P<pdb_command>display|undisplay) \s+  (?P<python_code>.*) |
+            (?P<pdb_command>profile)         \s+  (?P<profile_mode>[^\s]*) |
+            (?P<pdb_command>catch)           \s+  (-u \s+)?  (?P<exception_class>[^\s,]+)
+                                             \s* (, \s* (?P<python_code>.*))? |
+            (?P<pdb_command>uncatch)         \s+  (?P<catchpoint>.*) |
+            (?P<pdb_command>watch)           \s+  (?P<python_code>.*) |
+            (?P<pdb_command>unwatch)         \s+  (?P<watchpoint>.*) |
+            (?P<pdb_command>thread)          \s+  (?P<thread>.*) |
 
             # For the break command, do autocompletion on file and function names.
             # After the comma, do completion on python code.
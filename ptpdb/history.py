@@ -0,0 +1,350 @@
+"""
+The history of the debugger prompt.
+
+The file has the format of prompt_toolkit's `FileHistory` (so that it can be
+shared with older versions), but it's never read completely at startup. Only
+the end of the file is parsed, up to `recent_count` distinct entries. These
+are what the input buffer browses with the arrow keys. (Control-R searches
+the complete history, in the results pane.)
+
+The complete history is read by a background thread, which builds an index
+for searching it, and compacts the file when it has grown too large: every
+entry is kept only once (its most recent occurrence), and only the last
+`max_entries` entries are kept.
+
+The index is a single string with all the entries, separated by NUL
+characters, and the offsets of the entries in it. Searching is done from the
+end with `str.rfind`, so that finding the most recent match, the common case,
+only looks at the end of the history.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
+from prompt_toolkit.history import History
+
+import bisect
+import datetime
+import os
+import sys
+import threading
+
+__all__ = (
+    'get_history',
+    'PdbHistory',
+    'HistoryIndex',
+    'HistoryAutoSuggest',
+)
+
+_SEPARATOR = '\x00'
+
+
+def _parse(data):
+    """
+    Parse the contents of a history file (bytes). Return the list of entries,
+    oldest first.
+    """
+    result = []
+    lines = []
+
+    for line in data.decode('utf-8', 'replace').splitlines(True):
+        if line.startswith('+'):
+            lines.append(line[1:])
+        elif lines:
+            # Join and drop trailing newline.
+            result.append(''.join(lines)[:-1])
+            lines = []
+
+    if lines:
+        result.append(''.join(lines)[:-1])
+    return result
+
+
+def _format(string):
+    " Return the bytes for one entry in the history file. "
+    return ('\n# %s\n' % datetime.datetime.now() + ''.join(
+        '+%s\n' % line for line in string.split('\n'))).encode('utf-8')
+
+
+def _unique(entries, count=None):
+    """
+    Keep only the most recent occurrence of every entry, and at most `count`
+    entries. (Oldest first, like the input.)
+    """
+    seen = set()
+    result = []
+
+    for entry in reversed(entries):
+        if entry not in seen:
+            seen.add(entry)
+            result.append(entry)
+            if count is not None and len(result) == count:
+                break
+
+    result.reverse()
+    return result
+
+
+class HistoryIndex(object):
+    """
+    Search index over the complete history.
+
+    :param entries: List of distinct strings, oldest first.
+    """
+    def __init__(self, entries):
+        self._entries = []
+        self._starts = []  # Offset of every entry in `_text`.
+        self._latest = {}  # Maps entries to their most recent position.
+        self._text = ''
+
+        parts = []
+        offset = 0
+        for entry in entries:
+            offset += 1
+            self._latest[entry] = len(self._entries)
+            self._entries.append(entry)
+            self._starts.append(offset)
+            parts.append(_SEPARATOR + entry.replace(_SEPARATOR, ' '))
+            offset += len(entry)
+
+        self._text = ''.join(parts)
+
+    def __len__(self):
+        return len(self._latest)
+
+    def add(self, entry):
+        """
+        Add an entry. (When it was already there, the older occurrence is
+        skipped by the searches from now on.)
+        """
+        self._latest[entry] = len(self._entries)
+        self._entries.append(entry)
+        self._starts.append(len(self._text) + 1)
+        self._text += _SEPARATOR + entry.replace(_SEPARATOR, ' ')
+
+    def search(self, text, prefix=False):
+        """
+        Yield the entries that contain `text` (or that start with it, when
+        `prefix` is set), most recent first.
+        """
+        if _SEPARATOR in text:
+            return
+
+        if prefix:
+            text = _SEPARATOR + text
+            skip = 1
+        else:
+            skip = 0
+
+        end = len(self._text)
+        while end > 0:
+            offset = self._text.rfind(text, 0, end)
+            if offset < 0:
+                return
+
+            i = bisect.bisect_right(self._starts, offset + skip) - 1
+            entry = self._entries[i]
+            if self._latest[entry] == i:
+                yield entry
+
+            # Continue before the separator of this entry.
+            end = self._starts[i] - 1
+
+
+class PdbHistory(History):
+    """
+    `History` that loads only the recent entries at startup, and keeps the
+    file small.
+
+    :param filename: The history file.
+    :param recent_count: Number of distinct entries that are loaded at
+        startup, for browsing.
+    :param max_entries: Number of distinct entries that are kept when the file
+        is compacted.
+    :param max_size: Compact the file when it's larger than this (in bytes).
+    """
+    def __init__(self, filename, recent_count=1000, max_entries=10000,
+                 max_size=1024 * 1024):
+        self.filename = filename
+        self.recent_count = recent_count
+        self.max_entries = max_entries
+        self.max_size = max_size
+
+        #: The recent entries, oldest first. (`Buffer` uses this attribute.)
+        self.strings = []
+
+        #: The index of the complete history, once it has been loaded.
+        self.index = None
+
+        # Held while writing to the file, and while the index is replaced.
+        self._lock = threading.RLock()
+
+        self._load_recent()
+
+        self._loader = threading.Thread(target=self._load_all, name='ptpdb-history')
+        self._loader.daemon = True
+        self._loader.start()
+
+    def _load_recent(self):
+        " Parse the end of the file, until we have `recent_count` entries. "
+        try:
+            f = open(self.filename, 'rb')
+        except IOError:
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            chunk_size = 64 * 1024
+
+            while True:
+                start = max(0, size - chunk_size)
+                f.seek(start)
+                data = f.read(size - start)
+
+                if start:
+                    # Start at the first complete entry.
+                    data = data[data.find(b'\n#') + 1:] if b'\n#' in data else b''
+
+                entries = _unique(_parse(data), self.recent_count)
+                if not start or len(entries) == self.recent_count:
+                    break
+                chunk_size *= 4
+
+        self.strings = entries
+
+    def _load_all(self):
+        " Build the index. Compact the file when it's too large. (In a thread.) "
+        sys.settrace(None)
+
+        try:
+            with open(self.filename, 'rb') as f:
+                data = f.read()
+        except IOError:
+            data = b''
+
+        entries = _parse(data)
+        unique_entries = _unique(entries, self.max_entries)
+        compact = len(data) > self.max_size
+
+        with self._lock:
+            # Entries that were appended while we were reading.
+            try:
+                with open(self.filename, 'rb') as f:
+                    f.seek(len(data))
+                    appended = f.read()
+            except IOError:
+                appended = b''
+
+            if compact:
+                try:
+                    self._write_compacted(unique_entries, appended)
+                except (IOError, OSError):
+                    pass
+
+            index = HistoryIndex(unique_entries)
+            for entry in _parse(appended):
+                index.add(entry)
+            self.index = index
+
+    def _write_compacted(self, entries, appended):
+        tmp_filename = '%s.%i.tmp' % (self.filename, os.getpid())
+
+        with open(tmp_filename, 'wb') as f:
+            for entry in entries:
+                f.write(_format(entry))
+            f.write(appended)
+
+        os.rename(tmp_filename, self.filename)
+
+    def append(self, string):
+        if self.strings and self.strings[-1] == string:
+            return
+
+        # Keep only the most recent occurrence.
+        try:
+            self.strings.remove(string)
+        except ValueError:
+            if len(self.strings) >= self.recent_count:
+                del self.strings[0]
+        self.strings.append(string)
+
+        with self._lock:
+            try:
+                with open(self.filename, 'ab') as f:
+                    f.write(_format(string))
+            except IOError:
+                pass
+
+            if self.index is not None:
+                self.index.add(string)
+
+    def search(self, text, prefix=False):
+        """
+        Yield the entries of the complete history that contain `text` (or
+        start with it), most recent first. While the complete history is being
+        loaded, only the recent entries are searched.
+        """
+        index = self.index
+        if index is not None:
+            return index.search(text, prefix=prefix)
+
+        if prefix:
+            matches = (s for s in reversed(self.strings) if s.startswith(text))
+        else:
+            matches = (s for s in reversed(self.strings) if text in s)
+        return matches
+
+    def __getitem__(self, key):
+        return self.strings[key]
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __len__(self):
+        return len(self.strings)
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def get_history(filename):
+    """
+    Return the `PdbHistory` for this file. (The debuggers of all threads share
+    it.)
+    """
+    with _histories_lock:
+        try:
+            return _histories[filename]
+        except KeyError:
+            history = _histories[filename] = PdbHistory(filename)
+            return history
+
+
+def _after_fork_in_child():
+    global _histories_lock
+    _histories_lock = threading.Lock()
+    for history in _histories.values():
+        history._lock = threading.RLock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class HistoryAutoSuggest(AutoSuggest):
+    """
+    Like `AutoSuggestFromHistory`, but suggest from the complete history,
+    using its index.
+    """
+    def get_suggestion(self, cli, buffer, document):
+        history = buffer.history
+        text = document.text
+
+        # Only for the first line, and not for an empty line.
+        if '\n' in text or not text.strip() or not isinstance(history, PdbHistory):
+            return
+
+        for entry in history.search(text, prefix=True):
+            suggestion = entry.split('\n', 1)[0][len(text):]
+            if suggestion:
+                return Suggestion(suggestion)
@@ -5,6 +5,8 @@ from prompt_toolkit.filters import HasFocus, Condition
 from prompt_toolkit.key_binding.vi_state import InputMode
 from prompt_toolkit.keys import Keys
 
+from .symbols import get_dotted_name
+
 __all__ = (
     'load_custom_pdb_key_bindings',
 )
@@ -38,15 +40,39 @@ def load_custom_pdb_key_bindings(ptpdb, registry):
             event.cli.focus('source_code')
             vi_state.input_mode = InputMode.NAVIGATION
 
-        elif event.cli.current_buffer_name == 'source_code' and not ptpdb.callstack_focussed:
+        elif event.cli.current_buffer_name == 'source_code':
             ptpdb.callstack_focussed = True
             event.cli.focus(DUMMY_BUFFER)
 
+        elif ptpdb.callstack_focussed and ptpdb.result_list is not None:
+            ptpdb.callstack_focussed = False
+            ptpdb.result_list_focussed = True
+
         else:
             ptpdb.callstack_focussed = False
+            ptpdb.result_list_focussed = False
             event.cli.focus(DEFAULT_BUFFER)
             vi_state.input_mode = InputMode.INSERT
 
+    @handle(Keys.ControlR, filter=HasFocus(DEFAULT_BUFFER))
+    def _(event):
+        """
+        Search the complete history for the text of the prompt. (The results
+        are shown in the results pane.)
+        """
+        ptpdb.search_history(event.cli.current_buffer.text)
+
+    @handle(Keys.F5)
+    def _(event):
+        """
+        Show or hide the render profiler.
+        """
+        profiler = ptpdb.render_profiler
+        if profiler.enabled:
+            profiler.stop()
+        else:
+            profiler.start(event.cli)
+
     @handle(' ', filter=source_code_has_focus)
     @handle('b', filter=source_code_has_focus)
     @handle(Keys.ControlJ, filter=source_code_has_focus)
@@ -55,14 +81,33 @@ def load_custom_pdb_key_bindings(ptpdb, registry):
         Set/clear break.
         """
         lineno = event.cli.current_buffer.document.cursor_position_row + 1
+        ptpdb.toggle_breakpoint(ptpdb.get_source_location()[0], lineno)
 
-        filename = ptpdb.canonic(ptpdb.curframe.f_code.co_filename)
-        breaks = ptpdb.breaks
+    @handle('<', filter=source_code_has_focus)
+    @handle(Keys.ControlLeft, filter=source_code_has_focus)
+    def _(event):
+        """
+        Scroll long lines to the left.
+        """
+        ptpdb.scroll_source_horizontally(-ptpdb.long_line_width // 2)
 
-        if lineno in breaks.get(filename, []):
-            ptpdb.clear_break(filename, lineno)
-        else:
-            ptpdb.set_break(filename, lineno)
+    @handle('>', filter=source_code_has_focus)
+    @handle(Keys.ControlRight, filter=source_code_has_focus)
+    def _(event):
+        """
+        Scroll long lines to the right.
+        """
+        ptpdb.scroll_source_horizontally(ptpdb.long_line_width // 2)
+
+    @handle('d', filter=source_code_has_focus)
+    def _(event):
+        """
+        Go to the definition of the name under the cursor.
+        """
+        document = event.cli.current_buffer.document
+        name = get_dotted_name(document.current_line, document.cursor_position_col)
+        if name:
+            ptpdb.go_to_definition(name)
 
     @handle('n', filter=source_code_has_focus)
     def _(event):
@@ -96,6 +141,7 @@ def load_custom_pdb_key_bindings(ptpdb, registry):
         vi_state = ptpdb.python_input.key_bindings_manager.get_vi_state(event.cli)
 
         ptpdb.callstack_focussed = False
+        ptpdb.result_list_focussed = False
         event.cli.focus(DEFAULT_BUFFER)
         vi_state.input_mode = InputMode.INSERT
 
@@ -123,18 +169,64 @@ def load_custom_pdb_key_bindings(ptpdb, registry):
     @handle(Keys.ControlJ, filter=call_stack_has_focus)
     def _(event):
         """
-        Go up/down to the selected frame.
+        Go up/down to the selected frame. (Without leaving the prompt.)
         """
-        # Find index of current frame.
-        current = 0
-        selected = ptpdb.callstack_selected_frame
+        ptpdb.select_frame(ptpdb.callstack_selected_frame)
+
+    # Results pane key bindings.
+
+    result_list_has_focus = Condition(lambda cli: ptpdb.result_list_focussed)
+
+    @handle(Keys.Up, filter=result_list_has_focus)
+    @handle(Keys.ControlP, filter=result_list_has_focus)
+    @handle('k', filter=result_list_has_focus)
+    def _(event):
+        " Go to previous row. "
+        result_list = ptpdb.result_list
+        if result_list.selected_index > 0:
+            result_list.selected_index -= 1
+
+    @handle(Keys.Down, filter=result_list_has_focus)
+    @handle(Keys.ControlN, filter=result_list_has_focus)
+    @handle('j', filter=result_list_has_focus)
+    def _(event):
+        " Go to next row. "
+        result_list = ptpdb.result_list
+        if result_list.selected_index < len(result_list.rows) - 1:
+            result_list.selected_index += 1
+
+    @handle(Keys.ControlJ, filter=result_list_has_focus)
+    def _(event):
+        " Open the selected row. "
+        result_list = ptpdb.result_list
+        row = result_list.selected_row
 
-        for i, (frame, lineno) in enumerate(ptpdb.stack):
-            if frame is ptpdb.curframe:
-                current = i
+        if row is None:
+            return
 
-        if current > selected:
-            return_text(event, 'up %i' % (current - selected))
+        if result_list.on_select:
+            result_list.on_select(row)
+        elif row.filename:
+            ptpdb.open_source_location(row.filename, row.lineno)
 
-        elif current < selected:
-            return_text(event, 'down  %i' % (selected - current))
+    @handle('b', filter=result_list_has_focus)
+    def _(event):
+        " Set a breakpoint at the selected row. "
+        row = ptpdb.result_list.selected_row
+        if row is not None:
+            ptpdb.set_break_at_row(row)
+
+    @handle('s', filter=result_list_has_focus)
+    def _(event):
+        " Change sort order. "
+        ptpdb.result_list.cycle_sort_order()
+
+    @handle(Keys.Escape, filter=result_list_has_focus)
+    def _(event):
+        " Close the results pane. "
+        vi_state = ptpdb.python_input.key_bindings_manager.get_vi_state(event.cli)
+
+        ptpdb.result_list = None
+        ptpdb.result_list_focussed = False
+        event.cli.focus(DEFAULT_BUFFER)
+        vi_state.input_mode = InputMode.INSERT
@@ -9,12 +9,18 @@ from ptpython.prompt_style import PromptStyle
 from pygments.token import Token
 from pygments.lexers import PythonLexer
 
+import collections
 import linecache
 import os
+import weakref
 
 __all__ = (
     'PdbPromptStyle',
     'CallStack',
+    'WatchPanel',
+    'ResultList',
+    'ResultRow',
+    'ResultListControl',
     'format_stack_entry',
 )
 
@@ -54,6 +60,39 @@ python_lexer = PythonLexer(
     stripall=False,
     ensurenl=False)
 
+# Maps lines of code to their tokens.
+_highlighted_lines = {}
+
+#: Lines of code in the call stack and the results pane are cut to this width.
+PREVIEW_WIDTH = 200
+
+
+def get_preview_line(filename, lineno, module_globals=None):
+    """
+    Return a line of code, stripped and cut to `PREVIEW_WIDTH`. (Without
+    copying the complete line, which can be megabytes long in minified or
+    generated code.)
+    """
+    line = linecache.getline(filename, lineno, module_globals)
+    if len(line) > PREVIEW_WIDTH:
+        line = line[:PREVIEW_WIDTH * 2].strip()[:PREVIEW_WIDTH] + '\u2026'
+    return line.strip()
+
+
+def highlight_line(line):
+    """
+    Return the tokens of a line of Python code. (Cached: the call stack is
+    rendered again for every key press, while walking through it.)
+    """
+    try:
+        return _highlighted_lines[line]
+    except KeyError:
+        if len(_highlighted_lines) >= 1000:
+            _highlighted_lines.clear()
+
+        result = _highlighted_lines[line] = list(python_lexer.get_tokens(line))
+        return result
+
 
 class CallStack(TokenListControl):
     def __init__(self, pdb_ref):
@@ -64,10 +103,26 @@ class CallStack(TokenListControl):
             pdb = pdb_ref()
             result = []
 
+            if pdb.replay_index is not None:
+                return get_replay_tokens(pdb)
+
+            hidden = 0  # Number of event loop frames that are collapsed.
+
             for i, (frame, lineno) in enumerate(pdb.stack):
                 is_selected = i == pdb.callstack_selected_frame
                 has_focus = is_selected and pdb.callstack_focussed
 
+                # Collapse event loop frames, in order to show the chain of
+                # coroutines.
+                if (pdb.skip_event_loop and not is_selected and
+                        frame.f_code in pdb.event_loop_code):
+                    hidden += 1
+                    continue
+
+                if hidden:
+                    result.append((Token.Comment, '   [%i event loop frames]\n' % hidden))
+                    hidden = 0
+
                 result.extend(format_stack_entry(pdb, frame, lineno, has_focus))
 
                 # Focus cursor.
@@ -76,12 +131,186 @@ class CallStack(TokenListControl):
 
                 result.append((Token, '\n'))
 
+            if hidden:
+                result.append((Token.Comment, '   [%i event loop frames]\n' % hidden))
+
+            return result
+
+        def get_replay_tokens(pdb):
+            """
+            Virtual call stack at the position of the replay cursor.
+            """
+            result = [(Token.Replay, ' [replay: %i events back] ' % (
+                pdb.recorder.count - 1 - pdb.replay_index)), (Token, '\n')]
+
+            stack = pdb.get_replay_stack()
+            for i, event in enumerate(stack):
+                is_current = i == len(stack) - 1
+
+                result.extend([
+                    (Token.CurrentLine, '->') if is_current else (Token, '  '),
+                    (Token, ' '),
+                    (Token.Name, os.path.basename(event.code.co_filename)),
+                    (Token.Number, '(%r)' % event.lineno),
+                    (Token.Name, event.code.co_name),
+                    (Token, '\n     '),
+                ])
+                line = get_preview_line(event.code.co_filename, event.lineno)
+                result.extend(highlight_line(line))
+
+                if is_current:
+                    result.append((Token.SetCursorPosition, ' '))
+                result.append((Token, '\n'))
+
             return result
 
         super(CallStack, self).__init__(
             get_tokens, has_focus=Condition(lambda cli: pdb_ref().callstack_focussed))
 
 
+class WatchPanel(TokenListControl):
+    """
+    Show the `display` expressions of the current frame.
+
+    Only the entries of which the value changed are formatted again. Changed
+    values are highlighted.
+    """
+    def __init__(self, pdb_ref):
+        # Maps Watch objects to (generation, changed, tokens) tuples.
+        token_cache = weakref.WeakKeyDictionary()
+
+        def get_watch_tokens(watch):
+            key = (watch.generation, watch.changed)
+            cached = token_cache.get(watch)
+
+            if cached is None or cached[0] != key:
+                if watch.suspended:
+                    value_token = Token.Watch.Suspended
+                    value = '[suspended: took %.3fs]' % watch.elapsed
+                elif watch.changed:
+                    value_token = Token.Watch.Changed
+                    value = watch.value_repr
+                else:
+                    value_token = Token.Watch.Value
+                    value = watch.value_repr
+
+                tokens = [
+                    (Token.Watch.Expression, ' %s' % watch.expression),
+                    (Token.Watch, ': '),
+                    (value_token, value),
+                    (Token, '\n'),
+                ]
+                cached = (key, tokens)
+                token_cache[watch] = cached
+
+            return cached[1]
+
+        def get_tokens(cli):
+            result = []
+            for watch in pdb_ref().get_watches():
+                result.extend(get_watch_tokens(watch))
+            return result
+
+        super(WatchPanel, self).__init__(get_tokens)
+
+
+#: One row in a `ResultList`: the tokens to display and the source location
+#: that belongs to it. (`filename` is `None` for rows without location.)
+ResultRow = collections.namedtuple('ResultRow', 'tokens filename lineno data')
+
+
+class ResultList(object):
+    """
+    List of results (profiler output, search results, ...) shown in the
+    results pane, in which the user can select a row to open its source or to
+    set a breakpoint.
+
+    :param title: Title to be displayed above the list.
+    :param get_rows: Callable that takes the sort order and returns a list of
+        `ResultRow` instances.
+    :param header: Tokens to display above the rows.
+    :param sort_orders: List of sort orders. The user can cycle through them.
+    :param on_select: Callable that receives a `ResultRow` when it's selected.
+        (When not given, the source location of the row is opened.)
+    """
+    def __init__(self, title, get_rows, header=None, sort_orders=None,
+                 on_select=None):
+        assert callable(get_rows)
+
+        self.title = title
+        self.header = header or []
+        self.sort_orders = list(sort_orders or [None])
+        self.on_select = on_select
+
+        self._get_rows = get_rows
+        self.sort_order = self.sort_orders[0]
+        self.selected_index = 0
+        self._rows = None
+
+    @property
+    def rows(self):
+        " The rows. (Computed the first time they are needed.) "
+        if self._rows is None:
+            self._rows = self._get_rows(self.sort_order)
+        return self._rows
+
+    @property
+    def selected_row(self):
+        if self.rows:
+            return self.rows[min(self.selected_index, len(self.rows) - 1)]
+
+    def invalidate(self):
+        " Compute the rows again, the next time they are needed. "
+        self._rows = None
+
+    def cycle_sort_order(self):
+        """
+        Sort by the next sort order.
+        """
+        index = self.sort_orders.index(self.sort_order)
+        self.sort_order = self.sort_orders[(index + 1) % len(self.sort_orders)]
+        self._rows = None
+        self.selected_index = 0
+
+
+class ResultListControl(TokenListControl):
+    """
+    Shows the current `ResultList` of the debugger.
+    """
+    def __init__(self, pdb_ref):
+        def get_tokens(cli):
+            pdb = pdb_ref()
+            result_list = pdb.result_list
+            has_focus = pdb.result_list_focussed
+
+            if result_list is None:
+                return []
+
+            result = []
+            result.extend(result_list.header)
+            result.append((Token, '\n'))
+
+            for i, row in enumerate(result_list.rows):
+                if i == result_list.selected_index:
+                    result.append((Token.SetCursorPosition, ''))
+                    result.append((Token.SelectedRow.Marker, '> '))
+
+                    if has_focus:
+                        result.extend((Token.SelectedRow, t[1]) for t in row.tokens)
+                    else:
+                        result.extend(row.tokens)
+                else:
+                    result.append((Token, '  '))
+                    result.extend(row.tokens)
+
+                result.append((Token, '\n'))
+
+            return result
+
+        super(ResultListControl, self).__init__(
+            get_tokens, has_focus=Condition(lambda cli: pdb_ref().result_list_focussed))
+
+
 def format_stack_entry(pdb, frame, lineno, has_focus=False):
     result = []
 
@@ -104,16 +333,24 @@ def format_stack_entry(pdb, frame, lineno, has_focus=False):
     else:
         result.append((Token.Name, '<lambda>'))
 
+    # Don't call `frame.f_locals` for the current frame. That would refresh
+    # the dictionary from the frame and undo assignments done from the
+    # debugger.
+    if frame is pdb.curframe:
+        f_locals = pdb.curframe_locals
+    else:
+        f_locals = frame.f_locals
+
     # Args.
-    if '__args__' in frame.f_locals:
-        args = frame.f_locals['__args__']
+    if '__args__' in f_locals:
+        args = f_locals['__args__']
         result.append((Token.Name, repr(args)))
     else:
         result.append((Token.Punctuation, '()'))
 
     # Return value.
-    if '__return__' in frame.f_locals:
-        rv = frame.f_locals['__return__']
+    if '__return__' in f_locals:
+        rv = f_locals['__return__']
         result.append((Token.Operator, '->'))
         result.append((Token, repr(rv)))
 
@@ -122,7 +359,7 @@ def format_stack_entry(pdb, frame, lineno, has_focus=False):
         result.append((Token.SelectedFrame, ''))
     result.append((Token, '     '))
 
-    line = linecache.getline(filename, lineno, frame.f_globals).strip()
-    result.extend(python_lexer.get_tokens(line))
+    line = get_preview_line(filename, lineno, frame.f_globals)
+    result.extend(highlight_line(line))
 
     return result
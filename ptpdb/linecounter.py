@@ -0,0 +1,105 @@
+"""
+Low-overhead line execution counter, for the heatmap in the source pane.
+
+For every code object, we keep an array of counters, indexed by the offset of
+the line relative to the first line of the code object. Recording an event is
+a dictionary lookup and an array increment.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from array import array
+
+import dis
+
+__all__ = (
+    'LineCounter',
+)
+
+
+class LineCounter(object):
+    """
+    Count how often every line was executed.
+
+    :param max_code_objects: Memory cap. Code objects that are seen after
+        this number of code objects is tracked are not counted.
+    """
+    def __init__(self, max_code_objects=5000):
+        self.max_code_objects = max_code_objects
+
+        # Maps code objects to (first_lineno, array) tuples.
+        self._counters = {}
+
+        #: Incremented every time the debugger stops or the counts are reset.
+        #: (Counts don't change while the debugger is stopped, so this is all
+        #: the margin needs for its invalidation hash.)
+        self.generation = 0
+
+        #: True when code objects were skipped because of the memory cap.
+        self.overflow = False
+
+        self._file_counts_cache = {}  # filename -> (generation, counts)
+
+    def record(self, frame, depth):
+        """
+        Count a line event. (Called from the trace function.)
+        """
+        code = frame.f_code
+
+        try:
+            first_lineno, counts = self._counters[code]
+        except KeyError:
+            if len(self._counters) >= self.max_code_objects:
+                self.overflow = True
+                return
+            first_lineno, counts = self._counters[code] = self._create_counter(code)
+
+        offset = frame.f_lineno - first_lineno
+        if 0 <= offset < len(counts):
+            counts[offset] += 1
+
+    def _create_counter(self, code):
+        linenos = _get_linenos(code)
+        first_lineno = min(linenos)
+        return first_lineno, array('L', [0]) * (max(linenos) - first_lineno + 1)
+
+    def invalidate(self):
+        """
+        Invalidate the cached counts per file. (Called when the debugger
+        stops.)
+        """
+        self._file_counts_cache.clear()
+        self.generation += 1
+
+    def reset(self):
+        """
+        Reset all the counters.
+        """
+        self._counters.clear()
+        self.overflow = False
+        self.invalidate()
+
+    def get_file_counts(self, filename):
+        """
+        Return a dictionary that maps line numbers of the given file to the
+        number of times they were executed. Lines of code that didn't run
+        (in code objects that did run) are included with a count of zero.
+        """
+        cached = self._file_counts_cache.get(filename)
+        if cached is not None and cached[0] == self.generation:
+            return cached[1]
+
+        result = {}
+        for code, (first_lineno, counts) in list(self._counters.items()):
+            if code.co_filename == filename:
+                for lineno in _get_linenos(code):
+                    result[lineno] = result.get(lineno, 0) + counts[lineno - first_lineno]
+
+        self._file_counts_cache[filename] = (self.generation, result)
+        return result
+
+
+def _get_linenos(code):
+    " Return all the line numbers that have code in this code object. "
+    linenos = set(lineno for _, lineno in dis.findlinestarts(code) if lineno is not None)
+    linenos.add(code.co_firstlineno)
+    return linenos
@@ -0,0 +1,159 @@
+"""
+Allocation tracking between stops, for the `mem` command.
+
+When the program stops, we take one `tracemalloc` snapshot and group it by
+line. The grouped statistics are compared with the ones of the previous stop,
+and are kept as the starting point of the next step. So, a step takes only
+one snapshot, comparing is linear in the number of allocation sites, not in
+the number of traced memory blocks, and the snapshot itself can be released
+right away. (Only when tracking starts, a snapshot is taken when the program
+resumes. Allocations that are done at the prompt count for the next step.)
+"""
+from __future__ import unicode_literals, absolute_import
+
+import os
+import prompt_toolkit
+import ptpython
+import pygments
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2.
+    tracemalloc = None
+
+__all__ = (
+    'AllocationSite',
+    'AllocationTracker',
+    'format_size',
+)
+
+# Allocations done by the debugger itself (and by the libraries that render
+# its user interface) are not reported.
+_hidden_directories = tuple(
+    os.path.dirname(os.path.abspath(m.__file__))
+    for m in (prompt_toolkit, ptpython, pygments)) + (
+    os.path.dirname(os.path.abspath(__file__)),
+)
+_hidden_modules = ('bdb', 'pdb', 'cmd', 'linecache', 'tracemalloc')
+
+
+def _is_hidden(filename):
+    if filename.startswith(_hidden_directories):
+        return True
+
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return name in _hidden_modules and os.path.dirname(filename) == os.path.dirname(os.__file__)
+
+
+class AllocationSite(object):
+    """
+    Memory allocated at one line, and the difference with the previous stop.
+    """
+    def __init__(self, filename, lineno, size, count, size_diff, count_diff):
+        self.filename = filename
+        self.lineno = lineno
+        self.size = size
+        self.count = count
+        self.size_diff = size_diff
+        self.count_diff = count_diff
+
+    @property
+    def has_source(self):
+        " False for code that was not loaded from a file. (Like `exec`.) "
+        return not self.filename.startswith('<')
+
+
+class AllocationTracker(object):
+    """
+    Keep track of the memory allocations between stops.
+
+    :param nframes: Number of frames to store per traced memory block.
+    """
+    def __init__(self, nframes=1):
+        if tracemalloc is None:
+            raise RuntimeError('tracemalloc is not available in this Python version.')
+
+        self.nframes = nframes
+        self.sites = []
+        self.net_growth = 0
+        self.total_size = 0
+
+        self._started_tracing = False
+        self._previous = None  # Maps (filename, lineno) to (size, count).
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self._started_tracing = True
+
+    def mark(self):
+        """
+        Remember the current allocations, unless the statistics of the last
+        stop are known. (Called when the program resumes.)
+        """
+        if self._previous is None:
+            self._previous = self._take_statistics()
+
+    def stop(self):
+        # Only stop tracing if we started it.
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+        self._previous = None
+
+    def _take_statistics(self):
+        result = {}
+        for stat in tracemalloc.take_snapshot().statistics('lineno'):
+            frame = stat.traceback[0]
+            if not _is_hidden(frame.filename):
+                result[frame.filename, frame.lineno] = (stat.size, stat.count)
+        return result
+
+    def update(self):
+        """
+        Take a new snapshot, and compare it with the previous one. (Called
+        when the program stops.)
+        """
+        current = self._take_statistics()
+        previous = self._previous or {}
+
+        sites = []
+        for key, (size, count) in current.items():
+            old_size, old_count = previous.get(key, (0, 0))
+            sites.append(AllocationSite(key[0], key[1], size, count,
+                                        size - old_size, count - old_count))
+
+        # Sites of which all memory was released.
+        for key, (old_size, old_count) in previous.items():
+            if key not in current:
+                sites.append(AllocationSite(key[0], key[1], 0, 0, -old_size, -old_count))
+
+        self.sites = sites
+        self.net_growth = sum(s.size_diff for s in sites)
+        self.total_size = sum(s.size for s in sites)
+        self._previous = current
+
+    def get_top_sites(self, sort_order='growth', limit=25):
+        """
+        Return the top allocation sites.
+
+        :param sort_order: 'growth' or 'size'.
+        """
+        key = {
+            'growth': lambda s: s.size_diff,
+            'size': lambda s: s.size,
+        }[sort_order]
+
+        return sorted(self.sites, key=key, reverse=True)[:limit]
+
+
+def format_size(size):
+    """
+    Format a number of bytes. (Negative numbers are allowed.)
+    """
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return '%i %s' % (size, unit) if unit == 'B' else '%.1f %s' % (size, unit)
+        size /= 1024.
+    return '%.1f GiB' % size
@@ -0,0 +1,102 @@
+"""
+Namespace for the `interact` command.
+"""
+from __future__ import unicode_literals, absolute_import
+
+__all__ = (
+    'FrameNamespace',
+)
+
+
+class FrameNamespace(dict):
+    """
+    Layered mapping that looks up names in the locals of a frame first and
+    then in the globals, without copying any of them.
+
+    Assignments to local variables of the frame are written in the locals
+    dictionary. (Pdb caches that dictionary as `curframe_locals`, and the
+    interpreter copies it back into the frame when the trace function
+    returns.) Other new names can't become local variables of a function,
+    so they are kept in a separate scratch layer, visible only to the
+    interpreter. For module level frames, where locals and globals are the
+    same dictionary, everything is written to the globals.
+
+    The scratch layer is the dictionary itself, so that the namespace can be
+    passed as the globals of `exec`: then nested scopes (lambdas, and
+    comprehensions before Python 3.12) see the locals of the frame too.
+    (Python 3 looks up the globals of a `dict` subclass through
+    `__missing__`. Python 2 doesn't, there they only see the globals.)
+
+    :param frame: The frame object.
+    :param frame_locals: The locals dictionary of this frame. (Pass
+        `curframe_locals` from Pdb, calling `frame.f_locals` again would
+        overwrite earlier changes.)
+    """
+    def __init__(self, frame, frame_locals):
+        super(FrameNamespace, self).__init__()
+        self.locals = frame_locals
+        self.globals = frame.f_globals
+
+        code = frame.f_code
+        self._local_names = frozenset(
+            code.co_varnames + code.co_cellvars + code.co_freevars)
+
+    @property
+    def scratch(self):
+        " The names that were assigned, but are not in the frame. "
+        return dict(dict.items(self))
+
+    def __missing__(self, name):
+        for layer in (self.locals, self.globals):
+            try:
+                return layer[name]
+            except KeyError:
+                pass
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __setitem__(self, name, value):
+        if (self.locals is self.globals or name in self._local_names or
+                name in self.locals):
+            dict.pop(self, name, None)
+            self.locals[name] = value
+        else:
+            dict.__setitem__(self, name, value)
+
+    def __delitem__(self, name):
+        if dict.__contains__(self, name):
+            dict.__delitem__(self, name)
+        else:
+            del self.locals[name]
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self.locals or name in self.globals
+
+    def __iter__(self):
+        seen = set()
+        for layer in (dict.keys(self), self.locals, self.globals):
+            for name in layer:
+                if name not in seen:
+                    seen.add(name)
+                    yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[name] for name in self]
+
+    def items(self):
+        return [(name, self[name]) for name in self]
+
+    def __repr__(self):
+        return 'FrameNamespace(%i local, %i global names)' % (
+            len(self.locals), len(self.globals))
@@ -0,0 +1,237 @@
+"""
+Saved and pending breakpoints.
+
+Breakpoints that are set with `break` are saved in a per-project file, and
+loaded again in the next session. A breakpoint in a module that hasn't been
+imported yet is kept pending: it doesn't exist for Bdb (so it doesn't keep
+tracing turned on) until an import hook in `sys.meta_path` sees the module
+being imported. Then it's turned into a real breakpoint, right before the
+module's code runs. (Breakpoints in existing files are set immediately: a file
+can also run without being imported, like with `runpy.run_path`.)
+"""
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import sys
+
+__all__ = (
+    'SavedBreakpoint',
+    'SavedBreakpoints',
+)
+
+
+class SavedBreakpoint(object):
+    """
+    A breakpoint that's saved in the breakpoint file.
+
+    :param target: Absolute filename, or module name.
+    """
+    def __init__(self, target, lineno, condition=None):
+        self.target = target
+        self.lineno = lineno
+        self.condition = condition
+
+        #: Filename of the module, once it's imported.
+        self.filename = None if self.is_module else target
+
+        #: True when the breakpoint was set in Bdb.
+        self.resolved = False
+
+    @property
+    def is_module(self):
+        return not os.path.isabs(self.target)
+
+    @property
+    def module_name(self):
+        """
+        Last part of the name of the module. (For matching with the module
+        that's being imported.)
+        """
+        if self.is_module:
+            return self.target.rpartition('.')[2]
+
+        directory, basename = os.path.split(self.target)
+        name = os.path.splitext(basename)[0]
+        if name == '__init__':
+            return os.path.basename(directory)
+        return name
+
+    def __str__(self):
+        if self.condition:
+            return '%s:%i, %s' % (self.target, self.lineno, self.condition)
+        return '%s:%i' % (self.target, self.lineno)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parse a line of the breakpoint file. Return `None` when it's invalid.
+        """
+        location, _, condition = text.partition(',')
+        target, _, lineno = location.strip().rpartition(':')
+
+        try:
+            lineno = int(lineno)
+        except ValueError:
+            return
+        if target:
+            return cls(target, lineno, condition.strip() or None)
+
+
+class SavedBreakpoints(object):
+    """
+    The breakpoints of the breakpoint file.
+
+    :param filename: The breakpoint file, or `None` to disable saving.
+    :param resolve: Callable, called with a `SavedBreakpoint` and the filename
+        of the module, when the module of a pending breakpoint is imported.
+    """
+    def __init__(self, filename, resolve):
+        self.filename = filename
+        self.resolve = resolve
+        self.breakpoints = []
+        self.loaded = False
+
+        self._finder = _PendingBreakpointFinder(self)
+
+    @property
+    def pending(self):
+        return [b for b in self.breakpoints if not b.resolved]
+
+    def load(self):
+        """
+        Read the breakpoint file, and resolve the breakpoints of which the
+        module has been imported already.
+        """
+        self.loaded = True
+
+        if not self.filename or not os.path.exists(self.filename):
+            return
+
+        with io.open(self.filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                breakpoint = SavedBreakpoint.parse(line)
+                if breakpoint is not None:
+                    self.breakpoints.append(breakpoint)
+
+        loaded_files = {}
+        for name, module in list(sys.modules.items()):
+            filename = getattr(module, '__file__', None)
+            if filename:
+                loaded_files[_source_filename(filename)] = name
+
+        for breakpoint in self.breakpoints:
+            if breakpoint.is_module:
+                module = sys.modules.get(breakpoint.target)
+                filename = getattr(module, '__file__', None)
+                if filename:
+                    self._resolve(breakpoint, _source_filename(filename))
+            elif breakpoint.target in loaded_files or os.path.exists(breakpoint.target):
+                self._resolve(breakpoint, breakpoint.target)
+
+        self._update_finder()
+
+    def save(self):
+        if not self.filename:
+            return
+
+        if self.breakpoints:
+            with io.open(self.filename, 'w', encoding='utf-8') as f:
+                for breakpoint in self.breakpoints:
+                    f.write('%s\n' % breakpoint)
+        elif os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def add(self, breakpoint):
+        """
+        Add and save a breakpoint. (Resolved or pending.)
+        """
+        self.breakpoints.append(breakpoint)
+        self.save()
+        self._update_finder()
+
+    def remove(self, target, lineno):
+        """
+        Remove the breakpoints at this location. `target` is a module name or
+        an absolute filename. Return the list of removed breakpoints.
+        """
+        removed = [b for b in self.breakpoints
+                   if b.lineno == lineno and target in (b.target, b.filename)]
+
+        if removed:
+            self.breakpoints = [b for b in self.breakpoints if b not in removed]
+            self.save()
+            self._update_finder()
+
+        return removed
+
+    def clear(self):
+        self.breakpoints = []
+        self.save()
+        self._update_finder()
+
+    def _resolve(self, breakpoint, filename):
+        breakpoint.filename = filename
+        breakpoint.resolved = True
+        self.resolve(breakpoint, filename)
+
+    def _update_finder(self):
+        " Install the import hook only while there are pending breakpoints. "
+        installed = self._finder in sys.meta_path
+
+        if self.pending and not installed:
+            sys.meta_path.insert(0, self._finder)
+        elif not self.pending and installed:
+            sys.meta_path.remove(self._finder)
+
+    def module_imported(self, fullname, filename):
+        """
+        Called by the import hook, right before the module's code runs.
+        """
+        filename = _source_filename(filename)
+
+        for breakpoint in self.pending:
+            if breakpoint.target in (fullname, filename):
+                self._resolve(breakpoint, filename)
+
+        self._update_finder()
+
+
+class _PendingBreakpointFinder(object):
+    """
+    Meta path finder that watches for the modules of pending breakpoints.
+    It doesn't find any modules itself; it asks the other finders for the
+    spec, and then returns `None`, so that the import continues as usual.
+    """
+    def __init__(self, saved_breakpoints):
+        self.saved_breakpoints = saved_breakpoints
+
+    def find_spec(self, fullname, path, target=None):
+        name = fullname.rpartition('.')[2]
+        pending = self.saved_breakpoints.pending
+
+        # Only look further when the name matches. (Cheap check.)
+        if not any(b.module_name == name for b in pending):
+            return
+
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+
+            find_spec = getattr(finder, 'find_spec', None)
+            if find_spec is None:
+                continue
+
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.origin and spec.has_location:
+                    self.saved_breakpoints.module_imported(fullname, spec.origin)
+                return
+
+
+def _source_filename(filename):
+    " Filename of the .py file, given the filename of a module. "
+    filename = os.path.abspath(filename)
+    if filename.endswith(('.pyc', '.pyo')):
+        return filename[:-1]
+    return filename
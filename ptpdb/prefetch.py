@@ -0,0 +1,239 @@
+"""
+Background preparation of the source pane.
+
+When the debugger stops, the files of all frames on the stack are loaded and
+highlighted in a background thread, starting with the frames closest to the
+current frame. Walking through the stack (`up`, `down`, or the call stack
+pane) then only swaps the text of the source buffer, and the lexer of the
+source pane returns the tokens that were prepared.
+
+When the debugger stops again before the work is done, the remaining work is
+cancelled: the stack has changed.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from prompt_toolkit.layout.lexers import Lexer
+from prompt_toolkit.layout.utils import split_lines
+from pygments.lexers import PythonLexer
+
+import collections
+import itertools
+import linecache
+import os
+import six
+import sys
+import threading
+
+__all__ = (
+    'get_instruction_column',
+    'SourceView',
+    'SourcePrefetcher',
+    'PrefetchedLexer',
+)
+
+_lexer = PythonLexer(
+    stripnl=False,
+    stripall=False,
+    ensurenl=False)
+
+
+def get_instruction_column(frame):
+    """
+    Return the column of the instruction that runs in `frame`, or 0 when it's
+    not known. (Python 3.11+.)
+    """
+    co_positions = getattr(frame.f_code, 'co_positions', None)
+    if co_positions is None or frame.f_lasti < 0:
+        return 0
+
+    # One position for every code unit of two bytes.
+    for position in itertools.islice(co_positions(), frame.f_lasti // 2, None):
+        return position[2] or 0
+    return 0
+
+
+class SourceView(object):
+    """
+    The text of a file, as it's shown in the source pane: the lines that are
+    longer than `width` are cut to the columns `start` to `start + width`.
+
+    :param lines: The lines of the file, as returned by `linecache`.
+    """
+    def __init__(self, lines, width, start):
+        self.lines = lines
+        self.width = width
+        self.start = start
+
+        if six.PY2:
+            lines = [l.decode('utf-8') for l in lines]
+
+        self.has_long_lines = any(len(l) > width for l in lines)
+        if self.has_long_lines:
+            lines = [
+                l if len(l) <= width else l[start:start + width].rstrip('\n') + '\n'
+                for l in lines]
+
+        #: The text for the source buffer.
+        self.text = ''.join(lines) + '\n'
+
+        self._line_starts = [0]
+        for l in lines:
+            self._line_starts.append(self._line_starts[-1] + len(l))
+
+        #: The tokens of every line, once the view has been highlighted.
+        self.token_lines = None
+
+    def get_cursor_position(self, lineno):
+        " Return the position of the start of this line in `text`. "
+        return self._line_starts[min(max(lineno - 1, 0), len(self._line_starts) - 1)]
+
+    def highlight(self, is_cancelled):
+        """
+        Lex the text. Return `False` when `is_cancelled()` became true.
+        """
+        tokens = []
+        for i, token in enumerate(_lexer.get_tokens(self.text)):
+            tokens.append(token)
+            if i % 1000 == 0 and is_cancelled():
+                return False
+
+        self.token_lines = list(split_lines(tokens))
+        return True
+
+
+class SourcePrefetcher(object):
+    """
+    Creates and keeps the `SourceView` objects. (One instance, shared by the
+    debuggers of all threads.)
+
+    :param max_views: Number of views to keep.
+    """
+    def __init__(self, max_views=32):
+        self.max_views = max_views
+        self._views = collections.OrderedDict()  # Maps (filename, width, start) to views.
+        self._views_by_text = {}
+
+        self._jobs = []
+        self._generation = 0
+        self._pid = None
+
+    def _start(self):
+        " Start the thread. (Again, in a forked child.) "
+        self._pid = os.getpid()
+        self._condition = threading.Condition()
+        self._jobs = []
+
+        thread = threading.Thread(target=self._run, name='ptpdb-prefetch')
+        thread.daemon = True
+        thread.start()
+
+    def get_view(self, filename, width, start=None, frame=None):
+        """
+        Return the `SourceView` of this file. When the prefetcher didn't
+        create it yet, it's created now.
+
+        :param start: First column of the long lines. `None`: a quarter of
+            `width` before the current instruction of `frame`.
+        """
+        lines = linecache.getlines(filename, frame.f_globals if frame is not None else None)
+
+        if start is None:
+            # The column only matters when there are long lines.
+            if any(len(l) > width for l in lines):
+                column = get_instruction_column(frame) if frame is not None else 0
+                start = max(0, column - width // 4)
+            else:
+                start = 0
+
+        key = (filename, width, start)
+        view = self._views.get(key)
+
+        if view is None or view.lines is not lines:
+            view = SourceView(lines, width, start)
+            self._store(key, view)
+        return view
+
+    def _store(self, key, view):
+        # (Replaces the dictionaries instead of changing them, because the
+        # other thread reads them.)
+        views = collections.OrderedDict(self._views)
+        views.pop(key, None)
+        views[key] = view
+        while len(views) > self.max_views:
+            views.popitem(last=False)
+
+        views_by_text = dict((v.text, v) for v in views.values())
+        self._views = views
+        self._views_by_text = views_by_text
+
+    def get_view_for_text(self, text):
+        " Return the view with this text, or `None`. "
+        return self._views_by_text.get(text)
+
+    def prefetch(self, stack, curindex, width):
+        """
+        Prepare the views of the frames on `stack`, closest to `curindex`
+        first. The work for the previous stack is cancelled.
+
+        :param stack: List of (frame, lineno) tuples, like `Pdb.stack`.
+        """
+        if self._pid != os.getpid():
+            self._start()
+
+        order = sorted(range(len(stack)), key=lambda i: abs(i - curindex))
+
+        with self._condition:
+            self._generation += 1
+            self._jobs = [
+                (self._generation, stack[i][0].f_code.co_filename, stack[i][0], width)
+                for i in order]
+            self._condition.notify()
+
+    def _run(self):
+        sys.settrace(None)
+
+        while True:
+            with self._condition:
+                while not self._jobs:
+                    self._condition.wait()
+                generation, filename, frame, width = self._jobs.pop(0)
+
+            def is_cancelled():
+                return generation != self._generation
+
+            try:
+                view = self.get_view(filename, width, frame=frame)
+                if view.token_lines is None:
+                    view.highlight(is_cancelled)
+            except Exception:
+                # Never break the debugger, for instance because of a file
+                # that can't be decoded.
+                pass
+
+            # Don't keep the frame alive.
+            frame = None
+
+
+class PrefetchedLexer(Lexer):
+    """
+    Lexer for the source pane: returns the tokens of a prepared view, or
+    lexes with `fallback`.
+    """
+    def __init__(self, prefetcher, fallback):
+        self.prefetcher = prefetcher
+        self.fallback = fallback
+
+    def lex_document(self, cli, document):
+        view = self.prefetcher.get_view_for_text(document.text)
+
+        if view is not None and view.token_lines is not None:
+            token_lines = view.token_lines
+
+            def get_line(lineno):
+                try:
+                    return token_lines[lineno]
+                except IndexError:
+                    return []
+            return get_line
+
+        return self.fallback.lex_document(cli, document)
@@ -0,0 +1,138 @@
+"""
+Profiling of the program between two stops, for the `profile` command.
+"""
+from __future__ import unicode_literals, absolute_import
+
+import cProfile
+import os
+import time
+
+__all__ = (
+    'StepProfiler',
+    'ProfileEntry',
+)
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+# Files of which the functions are hidden from the results. (The debugger's
+# own code that runs right after resuming and right before stopping.)
+_hidden_directories = (
+    os.path.dirname(os.path.abspath(__file__)),
+)
+_hidden_modules = ('bdb', 'pdb', 'cmd')
+
+#: Per-call overhead of the profiler, in seconds. (Calibrated once.)
+_call_overhead = None
+
+
+class ProfileEntry(object):
+    """
+    Statistics for one function.
+    """
+    def __init__(self, filename, lineno, funcname, primitive_calls, calls,
+                 total_time, cumulative_time):
+        self.filename = filename
+        self.lineno = lineno
+        self.funcname = funcname
+        self.primitive_calls = primitive_calls
+        self.calls = calls
+        self.total_time = total_time
+        self.cumulative_time = cumulative_time
+
+    @property
+    def has_source(self):
+        " False for built-in functions. "
+        return self.filename not in ('~', '') and not self.filename.startswith('<')
+
+
+def _is_hidden(filename):
+    if filename.startswith(_hidden_directories):
+        return True
+
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return name in _hidden_modules and os.path.dirname(filename) == os.path.dirname(os.__file__)
+
+
+def calibrate(number=20000):
+    """
+    Measure the overhead that the profiler adds to a single function call.
+    """
+    global _call_overhead
+
+    if _call_overhead is None:
+        def func():
+            pass
+
+        def run():
+            for i in range(number):
+                func()
+
+        start = _timer()
+        run()
+        plain = _timer() - start
+
+        profiler = cProfile.Profile()
+        start = _timer()
+        profiler.enable()
+        run()
+        profiler.disable()
+        profiled = _timer() - start
+
+        _call_overhead = max(0., (profiled - plain) / number)
+
+    return _call_overhead
+
+
+class StepProfiler(object):
+    """
+    Profile the program from the moment the debugger resumes until it stops
+    again.
+    """
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+        self.start_time = None
+        self.wall_time = None
+        self.entries = []
+        self.total_calls = 0
+
+    def start(self):
+        calibrate()
+        self.start_time = _timer()
+        self._profiler.enable()
+
+    def stop(self):
+        """
+        Stop profiling and collect the statistics.
+        """
+        self._profiler.disable()
+        self.wall_time = _timer() - self.start_time
+
+        self._profiler.create_stats()
+        stats = self._profiler.stats
+        self.entries = []
+        self.total_calls = 0
+
+        for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in stats.items():
+            self.total_calls += nc
+
+            if not _is_hidden(filename):
+                self.entries.append(ProfileEntry(filename, lineno, funcname, cc, nc, tt, ct))
+
+    @property
+    def estimated_overhead(self):
+        " Estimated time (in seconds) added by the profiler. "
+        return self.total_calls * calibrate()
+
+    def get_top_entries(self, sort_order='cumulative', limit=50):
+        """
+        Return the `limit` most expensive functions.
+
+        :param sort_order: 'cumulative', 'total' or 'calls'.
+        """
+        key = {
+            'cumulative': lambda e: e.cumulative_time,
+            'total': lambda e: e.total_time,
+            'calls': lambda e: e.calls,
+        }[sort_order]
+
+        return sorted(self.entries, key=key, reverse=True)[:limit]
@@ -0,0 +1,183 @@
+"""
+Execution recorder for reverse stepping.
+
+Line events are stored in a fixed-size ring buffer, backed by three arrays:
+the id of the code object, the line number and the frame depth. This takes
+16 bytes per event, regardless of what the program does. Optionally, every
+N events, a shallow snapshot of the locals (a bounded repr of every value)
+is stored as well.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from array import array
+from six.moves import reprlib
+
+try:
+    from array import typecodes as _typecodes
+except ImportError:  # Python 2.
+    _typecodes = ''
+
+import collections
+import six
+
+__all__ = (
+    'ExecutionRecorder',
+    'RecordedEvent',
+    'get_frame_depth',
+)
+
+# 64bit signed integers for the ids of code objects.
+_ID_TYPECODE = 'q' if 'q' in _typecodes else 'l'
+
+_repr = reprlib.Repr()
+_repr.maxstring = 40
+_repr.maxother = 40
+
+#: A single line event.
+RecordedEvent = collections.namedtuple('RecordedEvent', 'index code lineno depth')
+
+
+def get_frame_depth(frame):
+    " Return the number of frames under `frame` on its stack. "
+    depth = 0
+    frame = frame.f_back
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+class ExecutionRecorder(object):
+    """
+    Ring buffer of line events.
+
+    :param capacity: Maximum number of events to keep.
+    :param snapshot_interval: When non-zero, store a shallow snapshot of the
+        locals every `snapshot_interval` events.
+    """
+    def __init__(self, capacity=100000, snapshot_interval=0):
+        assert capacity > 0
+
+        self.capacity = capacity
+        self.snapshot_interval = snapshot_interval
+
+        self._code_ids = array(_ID_TYPECODE, [0]) * capacity
+        self._linenos = array('i', [0]) * capacity
+        self._depths = array('i', [0]) * capacity
+
+        # Keep the code objects alive, so that the ids remain valid.
+        self._code_objects = {}
+
+        # Deque of (event index, snapshot) tuples.
+        self._snapshots = collections.deque()
+
+        #: Total number of events recorded.
+        self.count = 0
+
+    @property
+    def memory_size(self):
+        " Size of the ring buffer in bytes. "
+        return (self._code_ids.itemsize + self._linenos.itemsize +
+                self._depths.itemsize) * self.capacity
+
+    @property
+    def first_index(self):
+        " Index of the oldest event that is still available. "
+        return max(0, self.count - self.capacity)
+
+    def record(self, frame, depth):
+        """
+        Record a line event. (Called from the trace function.)
+        """
+        code = frame.f_code
+        code_id = id(code)
+        if code_id not in self._code_objects:
+            self._code_objects[code_id] = code
+
+        i = self.count % self.capacity
+        self._code_ids[i] = code_id
+        self._linenos[i] = frame.f_lineno
+        self._depths[i] = depth
+
+        if self.snapshot_interval and self.count % self.snapshot_interval == 0:
+            self._take_snapshot(frame)
+
+        self.count += 1
+
+    def _take_snapshot(self, frame):
+        snapshots = self._snapshots
+        snapshots.append((self.count, dict(
+            (name, _safe_repr(value)) for name, value in six.iteritems(frame.f_locals))))
+
+        # Drop snapshots that fell out of the ring buffer.
+        first_index = self.first_index
+        while snapshots and snapshots[0][0] < first_index:
+            snapshots.popleft()
+
+    def __getitem__(self, index):
+        """
+        Return the event with the given (absolute) index as a
+        :class:`.RecordedEvent`.
+        """
+        if not self.first_index <= index < self.count:
+            raise IndexError('Event %i is not available.' % index)
+
+        i = index % self.capacity
+        return RecordedEvent(index, self._code_objects[self._code_ids[i]],
+                             self._linenos[i], self._depths[i])
+
+    def get_snapshot(self, index):
+        """
+        Return the most recent snapshot taken at or before the given event,
+        as an (event index, snapshot) tuple, or `None`.
+        """
+        for snapshot_index, snapshot in reversed(self._snapshots):
+            if snapshot_index <= index:
+                return snapshot_index, snapshot
+
+    def find_previous(self, index, max_depth=None):
+        """
+        Return the index of the last event before `index`, optionally
+        skipping events deeper than `max_depth`. Return `None` when there is
+        no such event in the buffer.
+        """
+        first_index = self.first_index
+        index -= 1
+
+        while index >= first_index:
+            if max_depth is None or self._depths[index % self.capacity] <= max_depth:
+                return index
+            index -= 1
+
+    def get_stack(self, index):
+        """
+        Reconstruct the (virtual) call stack at the given event: a list of
+        events, outermost first, ending with the event itself. Only callers
+        that are still in the buffer are returned.
+        """
+        event = self[index]
+        result = [event]
+        depth = event.depth
+
+        i = index - 1
+        first_index = self.first_index
+        while i >= first_index:
+            d = self._depths[i % self.capacity]
+            if d < depth:
+                result.append(self[i])
+                depth = d
+            i -= 1
+
+        return result[::-1]
+
+    def clear(self):
+        self._code_objects.clear()
+        self._snapshots.clear()
+        self.count = 0
+
+
+def _safe_repr(value):
+    try:
+        return _repr.repr(value)
+    except Exception:
+        return '<repr failed>'
@@ -0,0 +1,1065 @@
+"""
+Remote debugging over a Unix or TCP socket.
+
+A process that calls `set_trace(remote=address)` connects to the listener at
+`address`, and registers a session there. `ptpdb-attach` connects to the same
+listener, picks a session, and from then on the listener relays the frames
+between the two. The first debugged process that doesn't find a listener
+starts one, in a background thread, so that one listener serves all the
+processes that use the same address.
+
+The prompt_toolkit renderer of the debugger only writes the differences
+between the previous and the next screen. These writes are sent as they are,
+compressed with one zlib stream per attached client.
+
+Every frame is a one byte type, a four byte length, and the payload.
+
+The listener requires Python 3. (On Python 2, a debugger can still connect to
+the listener of another process.)
+
+Note that anyone who can connect to the socket can run code in the debugged
+processes. The default Unix socket is in a directory that only its owner can
+access, and both ends check that the other end runs as the same user. TCP
+connections have to send a token first (the `PTPDB_TOKEN` environment
+variable, or the token file next to the default socket). Still, don't bind
+TCP listeners to public interfaces.
+"""
+from __future__ import unicode_literals, absolute_import, print_function
+
+from prompt_toolkit.input import PipeInput
+from prompt_toolkit.layout.screen import Size
+from prompt_toolkit.terminal.vt100_input import raw_mode
+from prompt_toolkit.terminal.vt100_output import Vt100_Output
+from six.moves import input
+
+import argparse
+import binascii
+import errno
+import hmac
+import json
+import os
+import select
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+
+try:
+    import selectors
+except ImportError:  # Python 2. (Only the listener requires it.)
+    selectors = None
+
+try:
+    BlockingIOError
+except NameError:  # Python 2.
+    class BlockingIOError(OSError):
+        " Not raised on Python 2. (Only caught by the listener.) "
+
+__all__ = (
+    'DEFAULT_ADDRESS',
+    'Listener',
+    'get_token',
+    'RemoteTerminal',
+    'start_broker',
+    'worker_address',
+    'attach',
+    'follow',
+    'main',
+)
+
+#: Environment variable with the address of the broker. (See `start_broker`.)
+ADDRESS_VARIABLE = 'PTPDB_REMOTE'
+
+#: Environment variable with the token of TCP connections.
+TOKEN_VARIABLE = 'PTPDB_TOKEN'
+
+
+def _get_private_directory():
+    runtime_directory = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_directory and os.path.isdir(runtime_directory):
+        return os.path.join(runtime_directory, 'ptpdb')
+    return os.path.join(tempfile.gettempdir(), 'ptpdb-%s' % getattr(os, 'getuid', lambda: 'user')())
+
+#: Directory of the default socket and of the token file. Only accessible by
+#: its owner.
+PRIVATE_DIRECTORY = _get_private_directory()
+
+#: Used for `set_trace(remote=True)` and by `ptpdb-attach` without address.
+DEFAULT_ADDRESS = os.path.join(PRIVATE_DIRECTORY, 'ptpdb.sock')
+
+# Frame types.
+HELLO = b'H'     # Session -> listener: JSON with information about the session.
+LIST = b'L'      # Client -> listener: ask for the sessions.
+SESSIONS = b'S'  # Listener -> client: JSON list of sessions.
+ATTACH = b'A'    # Client -> listener -> session: JSON with session ID and size.
+DETACH = b'D'    # Listener -> session: the client went away.
+INPUT = b'I'     # Client -> session: key presses.
+RESIZE = b'R'    # Client -> session: JSON with the terminal size.
+OUTPUT = b'O'    # Session -> client: compressed output.
+RESET = b'Z'     # Session -> client: a new compression stream starts.
+CLOSED = b'C'    # Listener -> client: the session ended. (Text.)
+WATCH = b'W'     # Client -> listener: send SESSIONS every time that they change.
+AUTH = b'T'      # Session or client -> listener: the token. (First frame, TCP only.)
+
+_header = struct.Struct('!cI')
+
+# Detaches `ptpdb-attach`. (Like telnet.)
+DETACH_KEY = b'\x1d'  # Control-]
+DETACHED = 'Detached.'
+
+
+def parse_address(address):
+    """
+    Return a (family, address) tuple for a Unix socket path, a 'host:port'
+    string or a port number. `True` means `DEFAULT_ADDRESS`.
+    """
+    if address is True or address is None:
+        address = DEFAULT_ADDRESS
+
+    if isinstance(address, int):
+        return socket.AF_INET, ('127.0.0.1', address)
+
+    if isinstance(address, tuple):
+        return socket.AF_INET, address
+
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+    return socket.AF_UNIX, address
+
+
+def _ensure_private_directory(directory):
+    """
+    Create the directory, only accessible by this user. When it exists,
+    check that it's ours and not accessible by others. (Another user could
+    have created it first.)
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise socket.error('%s is not a private directory of this user.' % directory)
+
+
+def get_token():
+    """
+    Return the token for TCP connections: the `PTPDB_TOKEN` environment
+    variable, or the token file in `PRIVATE_DIRECTORY`. (Created the first
+    time.)
+    """
+    token = os.environ.get(TOKEN_VARIABLE)
+    if token:
+        return token.encode('utf-8')
+
+    _ensure_private_directory(PRIVATE_DIRECTORY)
+    filename = os.path.join(PRIVATE_DIRECTORY, 'token')
+
+    if not os.path.exists(filename):
+        # Write a temporary file, and link it: other processes never read a
+        # token that's partially written.
+        temp_filename = '%s.%i' % (filename, os.getpid())
+        fd = os.open(temp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(binascii.hexlify(os.urandom(16)))
+        try:
+            os.link(temp_filename, filename)
+        except OSError as e:
+            if e.errno != errno.EEXIST:  # Another process was faster.
+                raise
+        finally:
+            os.remove(temp_filename)
+
+    with open(filename, 'rb') as f:
+        return f.read().strip()
+
+
+def _get_peer_uid(sock):
+    """
+    Return the user ID of the process at the other end of a Unix socket, or
+    `None` when the platform doesn't tell.
+    """
+    so_peercred = getattr(socket, 'SO_PEERCRED', None)  # Linux.
+    if so_peercred is None:
+        return None
+
+    credentials = sock.getsockopt(socket.SOL_SOCKET, so_peercred, struct.calcsize('3i'))
+    pid, uid, gid = struct.unpack('3i', credentials)
+    return uid
+
+
+def _is_same_user(sock):
+    uid = _get_peer_uid(sock)
+    return uid is None or uid == os.getuid()
+
+
+def connect(address):
+    """
+    Connect to a listener. Raise `socket.error` when a Unix socket doesn't
+    belong to this user.
+    """
+    family, address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        if family == socket.AF_UNIX:
+            # Don't send anything to a listener of another user.
+            if os.path.exists(address) and os.stat(address).st_uid != os.getuid():
+                raise socket.error('%s belongs to another user.' % address)
+            sock.connect(address)
+            if not _is_same_user(sock):
+                raise socket.error('The listener on %s runs as another user.' % address)
+        else:
+            sock.connect(address)
+            send_frame(sock, AUTH, get_token())
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+
+def send_frame(sock, type, payload=b''):
+    sock.sendall(_header.pack(type, len(payload)) + payload)
+
+
+def _send_json(sock, type, data):
+    send_frame(sock, type, json.dumps(data).encode('utf-8'))
+
+
+class FrameReader(object):
+    """
+    Split the data that's received from a socket into frames.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self._buffer = b''
+
+    def feed(self, data):
+        " Add received data. Return the list of complete (type, payload) frames. "
+        self._buffer += data
+        frames = []
+
+        while len(self._buffer) >= _header.size:
+            type, length = _header.unpack_from(self._buffer)
+            end = _header.size + length
+            if len(self._buffer) < end:
+                break
+            frames.append((type, self._buffer[_header.size:end]))
+            self._buffer = self._buffer[end:]
+
+        return frames
+
+    def read_frames(self):
+        """
+        Block until one or more frames are received. Return an empty list when
+        the connection is closed.
+        """
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except socket.error:
+                data = b''
+            if not data:
+                return []
+
+            frames = self.feed(data)
+            if frames:
+                return frames
+
+
+#
+# The listener.
+#
+
+class _Connection(object):
+    " A connection to the listener: a session or a client. "
+    def __init__(self, sock, authenticated):
+        self.sock = sock
+        self.reader = FrameReader(sock)
+        self.authenticated = authenticated  # False until TCP peers send the token.
+        self.session_id = None  # For sessions.
+        self.info = {}
+        self.peer = None  # The attached client or session.
+        self.watching = False  # For clients.
+        self.closed = False
+
+        # The frames that the socket didn't accept yet.
+        self.output = bytearray()
+
+        # For sessions that are stopped: the position in the queue of stop
+        # events. (Lower numbers stopped earlier.)
+        self.stop_number = None
+
+        # False for a session from the moment a client attaches, until it
+        # starts a new compression stream.
+        self.synced = False
+
+
+class Listener(object):
+    """
+    Accepts the sessions of the debugged processes and the `ptpdb-attach`
+    clients, and relays the frames between them.
+
+    The listener also acts as broker for worker processes (see
+    `start_broker`): it keeps the stop events of the sessions in a queue, and
+    tells the watching clients about every change, so that they can attach to
+    the worker that stopped first. Sessions only connect when they stop for the
+    first time, so there can be hundreds of workers.
+
+    All sockets are non-blocking: what a socket doesn't accept right away is
+    kept in the buffer of its connection, and written when it's writable. So,
+    a slow client only delays its own session. A connection that has more than
+    `max_buffer_size` bytes waiting is closed.
+    """
+    max_buffer_size = 16 * 1024 * 1024
+
+    def __init__(self, address):
+        if selectors is None:
+            raise RuntimeError('The listener of ptpdb requires Python 3.')
+
+        self.family, self.address = parse_address(address)
+        self.token = None
+
+        if self.family == socket.AF_UNIX:
+            if os.path.dirname(self.address) == PRIVATE_DIRECTORY:
+                _ensure_private_directory(PRIVATE_DIRECTORY)
+        else:
+            self.token = get_token()
+
+        self.sock = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_INET:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(self.address)
+        if self.family == socket.AF_UNIX:
+            os.chmod(self.address, 0o600)
+        self.sock.listen(socket.SOMAXCONN)
+        self.sock.setblocking(False)
+
+        self.sessions = {}  # Maps IDs to session `_Connection` objects.
+        self._connections = {}  # Maps sockets to `_Connection` objects.
+        self._next_id = 1
+        self._next_stop_number = 1
+        self._selector = selectors.DefaultSelector()
+
+    def start(self):
+        " Serve in a daemon thread. "
+        thread = threading.Thread(target=self.serve_forever, name='ptpdb-listener')
+        thread.daemon = True
+        thread.start()
+
+    def serve_forever(self):
+        # This thread is not debugged.
+        sys.settrace(None)
+
+        self._selector.register(self.sock, selectors.EVENT_READ)
+
+        while True:
+            for key, events in self._selector.select():
+                self._handle_event(key, events)
+
+    def _handle_event(self, key, events):
+        if key.fileobj is self.sock:
+            self._accept()
+            return
+
+        # (A connection can be closed by an earlier event of the same
+        # `select` call, when its buffer grew too large.)
+        conn = key.data
+        if events & selectors.EVENT_WRITE and not conn.closed:
+            self._flush(conn)
+        if events & selectors.EVENT_READ and not conn.closed:
+            self._read(conn)
+
+    def close(self):
+        " Stop accepting connections. (Used in forked children.) "
+        self.sock.close()
+
+    def _accept(self):
+        try:
+            sock, _ = self.sock.accept()
+        except socket.error:
+            return
+
+        if self.family == socket.AF_UNIX and not _is_same_user(sock):
+            sock.close()
+            return
+
+        sock.setblocking(False)
+        conn = self._connections[sock] = _Connection(sock, self.token is None)
+        self._selector.register(sock, selectors.EVENT_READ, conn)
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except socket.error:
+            data = b''
+
+        if not data:
+            self._close(conn)
+            return
+
+        for type, payload in conn.reader.feed(data):
+            if conn.closed:
+                return
+
+            if not conn.authenticated:
+                if type == AUTH and hmac.compare_digest(payload, self.token):
+                    conn.authenticated = True
+                    continue
+                self._close(conn)
+                return
+
+            try:
+                self._handle(conn, type, payload)
+            except ValueError:
+                pass
+
+    def _send(self, conn, type, payload=b''):
+        " Send a frame to a connection, without blocking. "
+        if conn.closed:
+            return
+
+        conn.output += _header.pack(type, len(payload)) + payload
+
+        if len(conn.output) > self.max_buffer_size:
+            self._close(conn)
+        else:
+            self._flush(conn)
+
+    def _send_json(self, conn, type, data):
+        self._send(conn, type, json.dumps(data).encode('utf-8'))
+
+    def _flush(self, conn):
+        " Write as much of the buffer as the socket accepts. "
+        if conn.output:
+            try:
+                del conn.output[:conn.sock.send(conn.output)]
+            except BlockingIOError:
+                pass
+            except socket.error:
+                # (The connection is closed when we read from it.)
+                del conn.output[:]
+
+        # Wait for the socket to become writable only while there's data left.
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.output else 0)
+        if self._selector.get_key(conn.sock).events != events:
+            self._selector.modify(conn.sock, events, conn)
+
+    def _handle(self, conn, type, payload):
+        peer = conn.peer
+
+        if type == HELLO:
+            if conn.session_id is None:
+                conn.session_id = self._next_id
+                self._next_id += 1
+                self.sessions[conn.session_id] = conn
+            conn.info = json.loads(payload.decode('utf-8'))
+
+            if not conn.info.get('location'):
+                conn.stop_number = None
+            elif conn.stop_number is None:
+                conn.stop_number = self._next_stop_number
+                self._next_stop_number += 1
+            self._sessions_changed()
+
+        elif type == LIST:
+            self._send_json(conn, SESSIONS, self._list_sessions())
+
+        elif type == WATCH:
+            conn.watching = True
+            self._send_json(conn, SESSIONS, self._list_sessions())
+
+        elif type == ATTACH:
+            data = json.loads(payload.decode('utf-8'))
+            session = self.sessions.get(data.get('session'))
+
+            if session is None:
+                self._send(conn, CLOSED, b'No such session.')
+            elif session.peer is not None:
+                self._send(conn, CLOSED, b'Another client is attached to this session.')
+            else:
+                conn.peer = session
+                session.peer = conn
+                session.synced = False
+                self._send(session, ATTACH, payload)
+                self._sessions_changed()
+
+        elif type in (INPUT, RESIZE):
+            if peer is not None:
+                self._send(peer, type, payload)
+
+        elif type == RESET:
+            if peer is not None:
+                conn.synced = True
+                self._send(peer, type, payload)
+
+        elif type == OUTPUT:
+            if peer is not None and conn.synced:
+                self._send(peer, type, payload)
+
+    def _list_sessions(self):
+        return [dict(s.info, id=id, attached=s.peer is not None, stop_number=s.stop_number)
+                for id, s in sorted(self.sessions.items())]
+
+    def _sessions_changed(self):
+        " Send the sessions to the clients that are watching. "
+        watching = [c for c in self._connections.values() if c.watching]
+        if watching:
+            payload = json.dumps(self._list_sessions()).encode('utf-8')
+            for c in watching:
+                self._send(c, SESSIONS, payload)
+
+    def _close(self, conn):
+        if conn.closed:
+            return
+        conn.closed = True
+        del conn.output[:]
+
+        del self._connections[conn.sock]
+        self._selector.unregister(conn.sock)
+        conn.sock.close()
+
+        if conn.session_id is not None:
+            del self.sessions[conn.session_id]
+
+        peer = conn.peer
+        if peer is not None:
+            peer.peer = None
+            if conn.session_id is not None:
+                self._send(peer, CLOSED, b'The session ended.')
+            else:
+                self._send(peer, DETACH)
+
+        if conn.session_id is not None or peer is not None:
+            self._sessions_changed()
+
+
+# The listener that runs in this process, if any.
+_listener = None
+
+# The process that called `start_broker`.
+_broker_pid = None
+
+
+def ensure_listener(address):
+    """
+    Start a listener at `address` in this process, unless there is one
+    already (in this process or another one).
+    """
+    global _listener
+
+    try:
+        connect(address).close()
+        return
+    except socket.error:
+        pass
+
+    family, path = parse_address(address)
+    try:
+        # A Unix socket that nobody accepts on is left by a process that
+        # exited. (Only remove our own.)
+        if family == socket.AF_UNIX and os.path.exists(path) and os.stat(path).st_uid == os.getuid():
+            os.remove(path)
+        _listener = Listener(address)
+        _listener.start()
+    except (socket.error, OSError):
+        # Another process was faster.
+        pass
+
+
+def connect_or_listen(address):
+    """
+    Connect to the listener at `address`. Start one in this process when
+    there is none.
+    """
+    try:
+        return connect(address)
+    except socket.error:
+        ensure_listener(address)
+        return connect(address)
+
+
+def start_broker(address=True, follow_in_terminal=False):
+    """
+    Start a listener for the worker processes that are started from now on
+    (forked, or started by `multiprocessing`). Their debuggers use the
+    listener, instead of the terminal of this process.
+
+    The address is passed on through the `PTPDB_REMOTE` environment variable.
+    (And for TCP, the token through `PTPDB_TOKEN`.)
+
+    :param follow_in_terminal: Show the stopped workers in this terminal, one
+        at a time, like `ptpdb-attach --follow`. (In a background thread.)
+    :raises RuntimeError: When processes can be forked, but there is no
+        `os.register_at_fork` (before Python 3.7). Forked workers would use
+        the listener, the locks and the debuggers of this process.
+    """
+    global _broker_pid
+
+    if hasattr(os, 'fork') and not hasattr(os, 'register_at_fork'):
+        raise RuntimeError('Debugging forked workers requires Python 3.7 or newer.')
+
+    family, parsed = parse_address(address)
+    ensure_listener(address)
+
+    if family == socket.AF_UNIX:
+        address = parsed
+    else:
+        address = '%s:%i' % parsed
+        os.environ[TOKEN_VARIABLE] = get_token().decode('utf-8')
+
+    os.environ[ADDRESS_VARIABLE] = address
+    _broker_pid = os.getpid()
+
+    if follow_in_terminal:
+        thread = threading.Thread(target=follow, args=(address,), name='ptpdb-follow')
+        thread.daemon = True
+        thread.start()
+
+
+def worker_address():
+    """
+    Return the address of the broker when this process is a worker, or
+    `None`.
+    """
+    if os.getpid() != _broker_pid:
+        return os.environ.get(ADDRESS_VARIABLE) or None
+
+
+def _after_fork_in_child():
+    """
+    A forked child doesn't serve the listener of its parent, and doesn't share
+    the connections of its parent's debuggers.
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.close()
+        _listener = None
+
+    for terminal in list(RemoteTerminal.instances):
+        terminal.close()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+#
+# The debugger side.
+#
+
+class _RemoteInput(PipeInput):
+    " Input of the `CommandLineInterface`: the key presses of the client. "
+    def send_bytes(self, data):
+        os.write(self._w, data)
+
+
+class _OutputStream(object):
+    """
+    Stream for `Vt100_Output`: sends everything that's flushed to the client,
+    compressed.
+    """
+    encoding = 'utf-8'
+
+    def __init__(self, terminal):
+        self.terminal = terminal
+        self._buffer = []
+
+    def write(self, data):
+        self._buffer.append(data)
+
+    def flush(self):
+        data = b''.join(self._buffer)
+        self._buffer = []
+        if data:
+            self.terminal.send_output(data)
+
+
+class _MessageStream(object):
+    """
+    Text stream for the messages of Pdb. (`Pdb.stdout`.)
+    """
+    encoding = 'utf-8'
+
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, text):
+        self.output.write(text)
+
+    def flush(self):
+        self.output.flush()
+
+
+class RemoteTerminal(object):
+    """
+    The terminal of a debugger that's used through `ptpdb-attach`.
+
+    Provides the `input` and `output` for the `CommandLineInterface`, and the
+    `stdout` for Pdb. While no client is attached, the output is dropped;
+    when one attaches, the screen is drawn again completely.
+    """
+    #: All the terminals of this process.
+    instances = weakref.WeakSet()
+
+    def __init__(self, address):
+        self.address = address
+        self.size = Size(rows=24, columns=80)
+        self.attached = False
+        self.closed = False
+        self.info = {}
+
+        #: The `CommandLineInterface`, for redrawing.
+        self.cli = None
+
+        self.input = _RemoteInput()
+        self.output = Vt100_Output(_OutputStream(self), lambda: self.size)
+        self.stdout = _MessageStream(self.output)
+
+        self._lock = threading.Lock()  # For sending.
+        self._compressor = zlib.compressobj()
+
+        self.sock = connect_or_listen(address)
+        self.update_info()
+
+        thread = threading.Thread(target=self._receive, name='ptpdb-remote')
+        thread.daemon = True
+        thread.start()
+
+        RemoteTerminal.instances.add(self)
+
+    def close(self):
+        self.closed = True
+        self.attached = False
+        self.sock.close()
+
+    def update_info(self, **info):
+        """
+        Send the information about this session that's shown by
+        `ptpdb-attach`.
+        """
+        self.info.update(info)
+        self.info.update(
+            pid=os.getpid(),
+            argv=' '.join(sys.argv),
+            thread=threading.current_thread().name)
+
+        with self._lock:
+            try:
+                _send_json(self.sock, HELLO, self.info)
+            except socket.error:
+                pass
+
+    def send_output(self, data):
+        with self._lock:
+            if self.attached:
+                data = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+                try:
+                    send_frame(self.sock, OUTPUT, data)
+                except socket.error:
+                    self.attached = False
+
+    def _receive(self):
+        " Receiving thread. "
+        sys.settrace(None)
+        reader = FrameReader(self.sock)
+
+        while not self.closed:
+            frames = reader.read_frames()
+
+            if self.closed:
+                break
+
+            if not frames:
+                # The listener went away. (The process that ran it exited.)
+                # Register with a new one.
+                self.attached = False
+                time.sleep(1)
+                try:
+                    self.sock = connect_or_listen(self.address)
+                except socket.error:
+                    continue
+                reader = FrameReader(self.sock)
+                self.update_info()
+                continue
+
+            for type, payload in frames:
+                self._handle(type, payload)
+
+    def _handle(self, type, payload):
+        if type == INPUT:
+            self.input.send_bytes(payload)
+
+        elif type == RESIZE:
+            self._set_size(payload)
+            if self.cli is not None:
+                self.cli.eventloop.received_winch()
+
+        elif type == ATTACH:
+            self._set_size(payload)
+            with self._lock:
+                self._compressor = zlib.compressobj()
+                send_frame(self.sock, RESET)
+                self.attached = True
+            self._redraw()
+
+        elif type == DETACH:
+            self.attached = False
+
+    def _set_size(self, payload):
+        data = json.loads(payload.decode('utf-8'))
+        self.size = Size(rows=data['rows'], columns=data['columns'])
+
+    def _redraw(self):
+        " Draw everything again, for a new client. "
+        cli = self.cli
+        if cli is None:
+            return
+
+        # (Runs when the prompt is shown: now, or at the next stop.)
+        def redraw():
+            cli.renderer.clear()
+            cli.invalidate()
+        cli.eventloop.call_from_executor(redraw)
+
+
+#
+# The client.
+#
+
+def _list_sessions(sock, reader):
+    send_frame(sock, LIST)
+    for type, payload in reader.read_frames():
+        if type == SESSIONS:
+            return json.loads(payload.decode('utf-8'))
+    raise socket.error('Connection closed.')
+
+
+def _choose_session(sock, reader, address):
+    """
+    Wait until there are sessions, and let the user choose one when there
+    are several.
+    """
+    waiting = False
+
+    while True:
+        sessions = [s for s in _list_sessions(sock, reader) if not s['attached']]
+
+        if len(sessions) == 1:
+            return sessions[0]['id']
+
+        if sessions:
+            for s in sessions:
+                print('%3i  pid %-7s %-25s %s' % (
+                    s['id'], s['pid'], s.get('location') or 'running', s['argv']))
+            try:
+                return int(input('Session: '))
+            except ValueError:
+                continue
+
+        if not waiting:
+            print('Waiting for a debugger on %s...' % address)
+            waiting = True
+        time.sleep(.5)
+
+
+class _SessionQueue(object):
+    """
+    The sessions of a listener, and their stop events. Updated by the listener
+    every time that something changes.
+    """
+    #: Seconds that the attached session has to run before we switch to
+    #: another stopped session. (So that we don't switch after every `next`.)
+    switch_delay = 1.
+
+    def __init__(self, address):
+        self.sock = connect(address)
+        self.reader = FrameReader(self.sock)
+        self.sessions = {}  # Maps IDs to session info.
+        self._running_since = None
+
+        send_frame(self.sock, WATCH)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self):
+        " Read updates. (Blocks when `fileno` is not readable.) "
+        frames = self.reader.read_frames()
+        if not frames:
+            raise socket.error('Connection closed.')
+
+        for type, payload in frames:
+            if type == SESSIONS:
+                self.sessions = dict((s['id'], s) for s in json.loads(payload.decode('utf-8')))
+
+    def next_stopped(self):
+        " Return the ID of the session that's waiting the longest, or `None`. "
+        stopped = [s for s in self.sessions.values()
+                   if s['stop_number'] is not None and not s['attached']]
+        if stopped:
+            return min(stopped, key=lambda s: s['stop_number'])['id']
+
+    def should_switch(self, session_id):
+        """
+        True when the attached session is running, and another one is
+        waiting.
+        """
+        session = self.sessions.get(session_id)
+        if session is None or session['stop_number'] is not None:
+            self._running_since = None
+            return False
+
+        if self._running_since is None:
+            self._running_since = time.time()
+
+        return (time.time() - self._running_since >= self.switch_delay and
+                self.next_stopped() is not None)
+
+
+def _run_session(sock, reader, session_id, queue=None):
+    """
+    Show the session in this terminal, until it ends or the user detaches.
+    Return the message. When a `_SessionQueue` is given, return `None` when
+    it's time to switch to another session.
+    """
+    stdin = sys.stdin.fileno()
+    stdout = sys.stdout.fileno()
+    get_size = Vt100_Output.from_pty(sys.stdout).get_size
+
+    def send_size(type):
+        size = get_size()
+        _send_json(sock, type, {'session': session_id, 'rows': size.rows, 'columns': size.columns})
+        return size
+
+    size = send_size(ATTACH)
+    decompressor = zlib.decompressobj()
+
+    while True:
+        # (With a timeout, for checking the terminal size. This works outside
+        # of the main thread, unlike SIGWINCH.)
+        readable, _, _ = select.select(
+            [stdin, sock] + ([queue] if queue else []), [], [], .2)
+
+        if get_size() != size:
+            size = send_size(RESIZE)
+
+        if stdin in readable:
+            data = os.read(stdin, 4096)
+            if DETACH_KEY in data:
+                return DETACHED
+            send_frame(sock, INPUT, data)
+
+        if sock in readable:
+            data = sock.recv(65536)
+            if not data:
+                return 'Connection closed.'
+
+            for type, payload in reader.feed(data):
+                if type == OUTPUT:
+                    os.write(stdout, decompressor.decompress(payload))
+                elif type == RESET:
+                    decompressor = zlib.decompressobj()
+                elif type == CLOSED:
+                    return payload.decode('utf-8')
+
+        if queue is not None:
+            if queue in readable:
+                queue.receive()
+            if queue.should_switch(session_id):
+                return
+
+
+def attach(address=None, session_id=None):
+    """
+    Attach to a debugger session, and run its user interface in this
+    terminal. Return the message with which it ended.
+    """
+    sock = connect(address)
+    reader = FrameReader(sock)
+
+    if session_id is None:
+        session_id = _choose_session(sock, reader, address)
+
+    with raw_mode(sys.stdin.fileno()):
+        return _run_session(sock, reader, session_id)
+
+
+def follow(address=None):
+    """
+    Attach to the sessions one after the other, in the order in which they
+    stopped. When the attached session resumes, and another one is waiting,
+    switch to that one. Return when the user detaches.
+    """
+    # This thread is not debugged. (When it runs in the broker.)
+    sys.settrace(None)
+
+    queue = _SessionQueue(address)
+    waiting = False
+
+    while True:
+        session_id = queue.next_stopped()
+
+        if session_id is None:
+            if not waiting:
+                print('Waiting for a debugger to stop, on %s...' % (address or DEFAULT_ADDRESS))
+                waiting = True
+            queue.receive()
+            continue
+
+        waiting = False
+        sock = connect(address)
+        try:
+            with raw_mode(sys.stdin.fileno()):
+                message = _run_session(sock, FrameReader(sock), session_id, queue)
+        finally:
+            sock.close()
+
+        if message == DETACHED:
+            return message
+        if message:
+            print('\n%s' % message)
+
+
+def main():
+    " Entry point of `ptpdb-attach`. "
+    parser = argparse.ArgumentParser(
+        prog='ptpdb-attach',
+        description='Attach to a debugger started with set_trace(remote=...). '
+                    'Press Control-] to detach. For TCP, set the PTPDB_TOKEN environment '
+                    'variable to the token of the debugged process (in %s).' % (
+                        os.path.join(PRIVATE_DIRECTORY, 'token')))
+    parser.add_argument('address', nargs='?', default=DEFAULT_ADDRESS,
+                        help='Unix socket path, or host:port. (Default: %(default)s)')
+    parser.add_argument('session', nargs='?', type=int,
+                        help='Session ID. (Default: ask when there are several.)')
+    parser.add_argument('--follow', action='store_true',
+                        help='Attach to the sessions one at a time, in the order in which they stop.')
+    args = parser.parse_args()
+
+    try:
+        if args.follow:
+            message = follow(args.address)
+        else:
+            message = attach(args.address, args.session)
+    except socket.error as e:
+        print('Could not connect to %s: %s' % (args.address, e), file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        return
+
+    print('\n%s' % message)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Profiler for the rendering of the debugger's layout.
+
+When it's enabled, the containers, controls and margins of the layout are
+instrumented: for every frame (every `Renderer.render` call), the time of
+every component is split between creating its content (generating tokens) and
+rendering it (laying it out and writing it to the screen). The time of the
+renderer itself (comparing the screens and writing the output) is counted
+for the "Renderer" component.
+
+The latency between a key press and the end of the next frame is measured
+too.
+
+Components are named after the classes of ptpdb and ptpython (like
+`SourceTitlebar`, `CallStack` or `SourceCodeMargin`), or after the buffer of
+a `BufferControl` (like "source_code"). Generic prompt_toolkit containers count
+for the component that contains them.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from prompt_toolkit.layout.containers import Container, Window
+from prompt_toolkit.layout.controls import BufferControl
+
+import collections
+import json
+import time
+
+__all__ = (
+    'ComponentStatistics',
+    'RenderProfiler',
+)
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def _get_own_name(container):
+    " Name of a container, or `None` for generic prompt_toolkit containers. "
+    if isinstance(container, Window):
+        control = container.content
+        if isinstance(control, BufferControl):
+            return control.buffer_name
+        container = control
+
+    if not type(container).__module__.startswith('prompt_toolkit.'):
+        return type(container).__name__
+
+
+def _get_children(container):
+    children = list(getattr(container, 'children', []))
+
+    content = getattr(container, 'content', None)
+    if isinstance(content, Container):
+        children.append(content)
+
+    children.extend(f.content for f in getattr(container, 'floats', []))
+    return children
+
+
+class ComponentStatistics(object):
+    " Times of one component, in seconds. "
+    def __init__(self):
+        self.content_time = 0.
+        self.render_time = 0.
+        self.max_time = 0.
+        self.frames = 0
+
+    @property
+    def total_time(self):
+        return self.content_time + self.render_time
+
+    def to_json(self):
+        return {
+            'content_ms': self.content_time * 1000,
+            'render_ms': self.render_time * 1000,
+            'max_frame_ms': self.max_time * 1000,
+            'frames': self.frames,
+        }
+
+
+class RenderProfiler(object):
+    """
+    Collects the render times of the last `max_frames` frames.
+    """
+    def __init__(self, max_frames=100):
+        self.max_frames = max_frames
+
+        #: List of (timestamp, duration, latency, components) tuples, with
+        #: `components` mapping names to (content_time, render_time) lists.
+        #: `latency` is `None` when the frame was not caused by a key press.
+        self.frames = collections.deque(maxlen=max_frames)
+
+        self._cli = None
+        self._patched = []  # (object, attribute name) tuples.
+        self._stack = []
+        self._components = None
+        self._key_time = None
+
+    @property
+    def enabled(self):
+        return self._cli is not None
+
+    def start(self, cli):
+        " Instrument the layout of `cli`. "
+        if self._cli is not None:
+            return
+
+        self._cli = cli
+        self.frames.clear()
+
+        self._patch(cli.renderer, 'render', 'Renderer', 'render', frame=True)
+        self._instrument(cli.layout, 'Layout')
+        cli.input_processor.beforeKeyPress += self._before_key_press
+
+    def stop(self):
+        " Remove the instrumentation. "
+        if self._cli is None:
+            return
+
+        self._cli.input_processor.beforeKeyPress -= self._before_key_press
+
+        for obj, name in self._patched:
+            del obj.__dict__[name]
+        del self._patched[:]
+
+        self._cli = None
+        self._key_time = None
+
+    def _instrument(self, container, parent_name):
+        name = _get_own_name(container)
+        if name is not None:
+            self._patch(container, 'write_to_screen', name, 'render')
+        name = name or parent_name
+
+        if isinstance(container, Window):
+            control = container.content
+            for method in ('create_content', 'preferred_width', 'preferred_height'):
+                self._patch(control, method, name, 'content')
+
+            for margin in container.left_margins + container.right_margins:
+                margin = getattr(margin, 'margin', margin)  # `ConditionalMargin`.
+                self._patch(margin, 'create_margin', type(margin).__name__, 'content')
+
+        for child in _get_children(container):
+            self._instrument(child, name)
+
+    def _patch(self, obj, method_name, name, kind, frame=False):
+        """
+        Replace a method of `obj` by a wrapper that times it. The time of the
+        patched methods that it calls is not counted.
+        """
+        if method_name in obj.__dict__:
+            return  # (An object that appears twice in the layout.)
+
+        method = getattr(obj, method_name)
+        index = 0 if kind == 'content' else 1
+
+        def wrapper(*a, **kw):
+            if frame:
+                self._stack = [0.]
+                self._components = {}
+            elif not self._stack:
+                # Not called by the renderer. (Like a mouse handler.)
+                return method(*a, **kw)
+
+            self._stack.append(0.)
+            start = _timer()
+            try:
+                return method(*a, **kw)
+            finally:
+                end = _timer()
+                duration = end - start
+                own_time = duration - self._stack.pop()
+                self._stack[-1] += duration
+
+                times = self._components.setdefault(name, [0., 0.])
+                times[index] += own_time
+
+                if frame:
+                    self._end_frame(end, duration)
+
+        setattr(obj, method_name, wrapper)
+        self._patched.append((obj, method_name))
+
+    def _before_key_press(self, sender):
+        if self._key_time is None:
+            self._key_time = _timer()
+
+    def _end_frame(self, end, duration):
+        latency = None
+        if self._key_time is not None:
+            latency = end - self._key_time
+            self._key_time = None
+
+        self.frames.append((time.time(), duration, latency, self._components))
+        self._stack = []
+        self._components = None
+
+    #
+    # Reporting.
+    #
+
+    def get_statistics(self):
+        """
+        Return a list of (name, `ComponentStatistics`) tuples, slowest
+        component first.
+        """
+        result = collections.defaultdict(ComponentStatistics)
+
+        for timestamp, duration, latency, components in self.frames:
+            for name, (content_time, render_time) in components.items():
+                statistics = result[name]
+                statistics.content_time += content_time
+                statistics.render_time += render_time
+                statistics.max_time = max(statistics.max_time, content_time + render_time)
+                statistics.frames += 1
+
+        return sorted(result.items(), key=lambda item: -item[1].total_time)
+
+    def get_frame_times(self):
+        " Return the durations and the latencies of the frames. "
+        durations = [f[1] for f in self.frames]
+        latencies = [f[2] for f in self.frames if f[2] is not None]
+        return durations, latencies
+
+    def dump(self, filename):
+        " Write the frames and the statistics to a JSON file. "
+        durations, latencies = self.get_frame_times()
+
+        data = {
+            'frames': [{
+                'time': timestamp,
+                'duration_ms': duration * 1000,
+                'latency_ms': latency * 1000 if latency is not None else None,
+                'components': dict(
+                    (name, {'content_ms': c * 1000, 'render_ms': r * 1000})
+                    for name, (c, r) in components.items()),
+            } for timestamp, duration, latency, components in self.frames],
+            'components': dict(
+                (name, statistics.to_json()) for name, statistics in self.get_statistics()),
+            'max_frame_ms': max(durations) * 1000 if durations else None,
+            'max_latency_ms': max(latencies) * 1000 if latencies else None,
+        }
+
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
@@ -0,0 +1,440 @@
+"""
+Crash snapshots: the call stack of a process, saved to a file, for post-mortem
+debugging when attaching a debugger is not an option.
+
+For every frame, a snapshot contains the code location, and for every local
+variable a bounded repr, and a pickle when the value can be pickled (and the
+pickle is small). The source files of the frames are included, so that the
+snapshot can be opened on another machine.
+
+File format::
+
+    header:  magic (8 bytes), index offset (8 bytes), index length (4 bytes)
+    blocks:  zlib-compressed blocks: the sources, and the locals of every frame
+    index:   zlib-compressed JSON: process information, the exception, and
+             for every frame its location, the names of its locals and the
+             offset and length of the block with their values
+
+The file is memory-mapped when it's opened. Only the index is read; the
+locals of a frame are read when they are needed (when the frame is selected).
+
+Note that opening a snapshot unpickles the values in it: only open snapshots
+that you trust.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from six.moves import reprlib
+
+import itertools
+import json
+import linecache
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+import traceback
+import zlib
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # Python 2.
+    from collections import MutableMapping
+
+__all__ = (
+    'snapshot',
+    'install_excepthook',
+    'Snapshot',
+)
+
+MAGIC = b'PTPDBSS1'
+_header = struct.Struct('!8sQI')
+
+#: Limits for the data of a snapshot.
+MAX_FRAMES = 200
+MAX_LOCALS = 200  # Per frame.
+MAX_PICKLE_SIZE = 16 * 1024  # Per value.
+MAX_SOURCE_SIZE = 1024 * 1024  # Per file.
+
+# Values of which the estimated size (see `_is_small`) is larger are not
+# pickled. (The estimate is larger than the size of the pickle.)
+_MAX_ESTIMATED_SIZE = 4 * MAX_PICKLE_SIZE
+
+_CONTAINER_TYPES = (list, tuple, set, frozenset)
+
+_repr = reprlib.Repr()
+_repr.maxstring = 200
+_repr.maxother = 200
+_repr.maxlevel = 3
+
+
+def _safe_repr(value):
+    try:
+        return _repr.repr(value)
+    except Exception as e:
+        return '<repr failed: %s>' % type(e).__name__
+
+
+def _is_small(value):
+    """
+    Estimate the memory size of the value (with the items of containers and
+    the attributes of instances). Stop as soon as it's too large to be
+    pickled: a crashing process can have huge arrays and containers.
+    """
+    size = 0
+    seen = set()
+    todo = [value]
+
+    while todo:
+        value = todo.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+
+        try:
+            size += sys.getsizeof(value)
+        except Exception:
+            return False
+        if size > _MAX_ESTIMATED_SIZE:
+            return False
+
+        if isinstance(value, _CONTAINER_TYPES):
+            todo.extend(value)
+        elif isinstance(value, dict):
+            todo.extend(value.keys())
+            todo.extend(value.values())
+        elif isinstance(getattr(value, '__dict__', None), dict):
+            todo.append(value.__dict__)
+
+    return True
+
+
+def _try_pickle(value):
+    " Return a small pickle of the value, or `None`. "
+    if not _is_small(value):
+        return
+
+    try:
+        data = pickle.dumps(value, protocol=2)
+    except Exception:
+        return
+    if len(data) <= MAX_PICKLE_SIZE:
+        return data
+
+
+def _get_stack(exc_or_frame):
+    """
+    Return a list of (frame, lineno) tuples, outermost first, and the
+    exception or `None`.
+    """
+    if exc_or_frame is None:
+        exc_or_frame = sys.exc_info()[1] or sys._getframe(2)
+
+    if isinstance(exc_or_frame, BaseException):
+        exception = exc_or_frame
+        tb = exception.__traceback__
+        if tb is None:
+            return [], exception
+
+        # The frames of the traceback, with the line numbers where the
+        # exception passed, and the callers of the outermost one.
+        stack = []
+        while tb is not None:
+            stack.append((tb.tb_frame, tb.tb_lineno))
+            tb = tb.tb_next
+
+        frame = stack[0][0].f_back
+        while frame is not None:
+            stack.insert(0, (frame, frame.f_lineno))
+            frame = frame.f_back
+    else:
+        exception = None
+        stack = []
+        frame = exc_or_frame
+        while frame is not None:
+            stack.insert(0, (frame, frame.f_lineno))
+            frame = frame.f_back
+
+    return stack[-MAX_FRAMES:], exception
+
+
+# Numbers the snapshots of a process. (Threads can crash at the same time.)
+_counter = itertools.count(1)
+
+
+def _default_path(directory='.'):
+    return os.path.join(directory, 'ptpdb-%s-%i-%i.snapshot' % (
+        time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(_counter)))
+
+
+def _create_private_file(path):
+    """
+    Open a new file that only its owner can read. (The reprs and pickles of
+    the locals can contain secrets.)
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o600)
+    if hasattr(os, 'fchmod'):
+        os.fchmod(fd, 0o600)  # (When the file existed.)
+    return os.fdopen(fd, 'wb')
+
+
+class _Writer(object):
+    def __init__(self, f):
+        self.f = f
+        f.write(_header.pack(MAGIC, 0, 0))
+
+    def write_block(self, data):
+        " Write a compressed block, return its [offset, length]. "
+        data = zlib.compress(data)
+        offset = self.f.tell()
+        self.f.write(data)
+        return [offset, len(data)]
+
+    def finish(self, index):
+        offset, length = self.write_block(json.dumps(index).encode('utf-8'))
+        self.f.seek(0)
+        self.f.write(_header.pack(MAGIC, offset, length))
+
+
+def snapshot(exc_or_frame=None, path=None):
+    """
+    Write a snapshot of the call stack, and return its filename.
+
+    :param exc_or_frame: An exception (its traceback is saved, with the
+        callers of the outermost frame), or a frame. By default, the exception
+        that's being handled, or the calling frame.
+    :param path: The filename. By default a new file in the current directory.
+        (Only readable by its owner.)
+    """
+    stack, exception = _get_stack(exc_or_frame)
+    path = path or _default_path()
+
+    index = {
+        'time': time.time(),
+        'pid': os.getpid(),
+        'argv': sys.argv,
+        'python': sys.version,
+        'exception': None,
+        'frames': [],
+        'sources': {},
+    }
+
+    if exception is not None:
+        index['exception'] = {
+            'type': type(exception).__name__,
+            'message': _safe_repr(exception),
+            'traceback': ''.join(traceback.format_exception(
+                type(exception), exception, exception.__traceback__)),
+        }
+
+    # Write to a temporary file first, so that there are never incomplete
+    # snapshots.
+    with _create_private_file(path + '.tmp') as f:
+        writer = _Writer(f)
+
+        for frame, lineno in stack:
+            code = frame.f_code
+            filename = code.co_filename
+
+            values = {}
+            for name, value in list(frame.f_locals.items())[:MAX_LOCALS]:
+                values[name] = (_safe_repr(value), _try_pickle(value))
+
+            index['frames'].append({
+                'filename': filename,
+                'name': code.co_name,
+                'firstlineno': code.co_firstlineno,
+                'lineno': lineno,
+                'varnames': list(code.co_varnames + code.co_cellvars + code.co_freevars),
+                'module': frame.f_globals.get('__name__'),
+                'names': sorted(values),
+                'locals': writer.write_block(pickle.dumps(values, protocol=2)),
+            })
+
+            if filename not in index['sources']:
+                lines = linecache.getlines(filename, frame.f_globals)
+                source = ''.join(lines).encode('utf-8')
+                if lines and len(source) <= MAX_SOURCE_SIZE:
+                    index['sources'][filename] = writer.write_block(source)
+
+        writer.finish(index)
+
+    os.rename(path + '.tmp', path)
+    return path
+
+
+def install_excepthook(directory='.'):
+    """
+    Write a snapshot for every uncaught exception (also in threads), before
+    the previous excepthook runs.
+    """
+    previous_hook = sys.excepthook
+
+    def excepthook(type, value, tb):
+        _write_crash_snapshot(value, directory)
+        previous_hook(type, value, tb)
+
+    sys.excepthook = excepthook
+
+    if hasattr(threading, 'excepthook'):
+        previous_thread_hook = threading.excepthook
+
+        def thread_excepthook(args):
+            if args.exc_value is not None:
+                _write_crash_snapshot(args.exc_value, directory)
+            previous_thread_hook(args)
+
+        threading.excepthook = thread_excepthook
+
+
+def _write_crash_snapshot(exception, directory):
+    try:
+        path = snapshot(exception, _default_path(directory))
+    except Exception as e:
+        sys.stderr.write('ptpdb: Writing the snapshot failed: %r\n' % e)
+    else:
+        sys.stderr.write('ptpdb: Snapshot written to %s\n' % path)
+
+
+#
+# Reading.
+#
+
+class SnapshotValue(object):
+    " A value that could not be pickled: only its repr is known. "
+    def __init__(self, repr):
+        self._repr = repr
+
+    def __repr__(self):
+        return self._repr
+
+
+class SnapshotLocals(MutableMapping):
+    """
+    The locals of a snapshot frame. The names are known from the index; the
+    values are read from the file the first time that one is needed.
+    """
+    def __init__(self, names, load):
+        self._names = names
+        self._load = load
+        self._values = None
+
+    @property
+    def loaded(self):
+        return self._values is not None
+
+    def _get_values(self):
+        if self._values is None:
+            self._values = self._load()
+        return self._values
+
+    def __getitem__(self, name):
+        return self._get_values()[name]
+
+    def __setitem__(self, name, value):
+        self._get_values()[name] = value
+
+    def __delitem__(self, name):
+        del self._get_values()[name]
+
+    def __contains__(self, name):
+        if self._values is None:
+            return name in self._names
+        return name in self._values
+
+    def __iter__(self):
+        return iter(self._names if self._values is None else list(self._values))
+
+    def __len__(self):
+        return len(self._names if self._values is None else self._values)
+
+
+class SnapshotCode(object):
+    " Stands in for the code object of a snapshot frame. "
+    def __init__(self, filename, name, firstlineno, varnames):
+        self.co_filename = filename
+        self.co_name = name
+        self.co_firstlineno = firstlineno
+        self.co_varnames = tuple(varnames)
+        self.co_cellvars = ()
+        self.co_freevars = ()
+
+
+class SnapshotFrame(object):
+    """
+    Stands in for a frame object, so that the debugger can show a snapshot.
+    """
+    def __init__(self, code, lineno, back, globals, locals):
+        self.f_code = code
+        self.f_lineno = lineno
+        self.f_back = back
+        self.f_globals = globals
+        self.f_locals = locals
+        self.f_trace = None
+        self.f_trace_lines = True
+
+
+class Snapshot(object):
+    """
+    A snapshot file, memory-mapped.
+    """
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, offset, length = _header.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('%s is not a ptpdb snapshot.' % path)
+
+        self.index = json.loads(self._read_block([offset, length]).decode('utf-8'))
+        self.exception = self.index['exception']
+        self.frames = self._create_frames()
+
+        # Show the source code as it was, also when the files changed or
+        # don't exist here.
+        for filename, block in self.index['sources'].items():
+            lines = self._read_block(block).decode('utf-8').splitlines(True)
+            entry = (sum(len(l) for l in lines), None, lines, filename)
+            linecache.cache[filename] = entry
+            linecache.cache[os.path.abspath(filename)] = entry
+
+    def _read_block(self, block):
+        offset, length = block
+        return zlib.decompress(self._mmap[offset:offset + length])
+
+    def _load_locals(self, block):
+        values = pickle.loads(self._read_block(block))
+        result = {}
+
+        for name, (value_repr, data) in values.items():
+            value = SnapshotValue(value_repr)
+            if data is not None:
+                try:
+                    value = pickle.loads(data)
+                except Exception:
+                    # For instance, the class is not importable here.
+                    pass
+            result[name] = value
+        return result
+
+    def _create_frames(self):
+        " Create the `SnapshotFrame` objects, outermost first. "
+        frames = []
+        back = None
+
+        for info in self.index['frames']:
+            code = SnapshotCode(info['filename'], info['name'], info['firstlineno'], info['varnames'])
+            globals = {
+                '__name__': info['module'],
+                '__builtins__': __builtins__,
+            }
+            locals = SnapshotLocals(
+                info['names'], lambda block=info['locals']: self._load_locals(block))
+
+            back = SnapshotFrame(code, info['lineno'], back, globals, locals)
+            frames.append(back)
+        return frames
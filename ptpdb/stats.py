@@ -0,0 +1,86 @@
+"""
+Timing of the program between two stops, and of the overhead of the debugger.
+
+`PtPdb.trace_dispatch` counts every trace event and measures the time spent
+in the debugger's own callbacks. The time that the user spends at the prompt
+is not counted: that's between `stopped` and `resumed`.
+"""
+from __future__ import unicode_literals, absolute_import
+
+import time
+
+__all__ = (
+    'StepStatistics',
+    'format_duration',
+)
+
+_timer = getattr(time, 'perf_counter', time.time)
+_cpu_timer = getattr(time, 'process_time', None) or time.clock
+
+
+class StepStatistics(object):
+    """
+    Statistics about the last step: the time between resuming the program and
+    the current stop.
+
+    All times are in seconds. They are `None` before the first step.
+    """
+    def __init__(self):
+        #: Wall and CPU time between resuming and stopping.
+        self.wall_time = None
+        self.cpu_time = None
+
+        #: Number of trace events, and the time spent handling them.
+        self.trace_events = 0
+        self.trace_time = 0.
+
+        self._resume_time = 0.
+        self._resume_cpu_time = None
+
+        # Start time of the trace event that is being handled.
+        self.dispatch_start = None
+
+    @property
+    def overhead(self):
+        " Fraction of the wall time spent in the debugger. (Or `None`.) "
+        if self.wall_time:
+            return min(1., self.trace_time / self.wall_time)
+
+    def resumed(self):
+        """
+        Called when the program resumes.
+        """
+        self.trace_events = 0
+        self.trace_time = 0.
+        self._resume_time = _timer()
+        self._resume_cpu_time = _cpu_timer()
+
+    def stopped(self):
+        """
+        Called when the debugger stops.
+        """
+        now = _timer()
+
+        if self._resume_cpu_time is not None:
+            self.wall_time = now - self._resume_time
+            self.cpu_time = _cpu_timer() - self._resume_cpu_time
+
+        # We are stopping in the middle of a trace event. Count the part of
+        # it until now; the rest is counted for the next step.
+        if self.dispatch_start is not None:
+            self.trace_time += now - max(self.dispatch_start, self._resume_time)
+
+    def add_dispatch_time(self, start):
+        """
+        Count a trace event that started at `start`. (When we stopped during
+        this event, only the part after resuming is counted.)
+        """
+        self.trace_time += _timer() - max(start, self._resume_time)
+        self.dispatch_start = None
+
+
+def format_duration(seconds):
+    " Format a duration for the toolbar. "
+    if seconds < 1:
+        return '%.2fms' % (seconds * 1000)
+    return '%.3fs' % seconds
@@ -22,19 +22,47 @@ ptpdb_style_extensions = {
     Token.Toolbar.Shortcuts.Key:          'bg:#444444 #ffffff',
     Token.Toolbar.Shortcuts.Description:  'bg:#888888 #ffffff',
 
+    Token.Toolbar.Changes:         'bg:#222222 #aaaaaa',
+    Token.Toolbar.Changes.Added:   'bg:#222222 #44ff44',
+    Token.Toolbar.Changes.Removed: 'bg:#222222 #ff4444',
+    Token.Toolbar.Changes.Rebound: 'bg:#222222 #ffff44',
+    Token.Toolbar.Changes.Mutated: 'bg:#222222 #44ffff',
+
+    Token.Toolbar.Stats:           'bg:#222222 #888888',
+    Token.Toolbar.Stats.Value:     'bg:#222222 #ffffff',
+
+    Token.Toolbar.RenderProfile:         'bg:#222222 #aaaaaa',
+    Token.Toolbar.RenderProfile.Title:   'bg:#222222 #ffffff bold',
+    Token.Toolbar.RenderProfile.Value:   'bg:#222222 #ffffff',
+    Token.Toolbar.RenderProfile.Slow:    'bg:#222222 #ff4444',
+
     Token.Toolbar.Title:             '#888888',
     Token.Toolbar.Title.Text:    'bg:#444444 #ffffff',
+    Token.Toolbar.Title.Replay:  'bg:#884400 #ffffff',
 
     Token.Menu.Completions.MultiColumnMeta: 'bg:#ffffff #000000 bold',
 
     Token.Break: 'bg:#ff4444 #ffffff',
     Token.Break.Condition: 'bg:#880000 #ffffff',
     Token.CurrentLine: 'bg:#4444ff #ffffff',
+    Token.Replay: 'bg:#884400 #ffffff',
+
+    Token.Heatmap.Unexecuted: '#666666',
+    Token.Heatmap.Cold: '#4488ff',
+    Token.Heatmap.Warm: '#ffaa00',
+    Token.Heatmap.Hot: '#ff4444 bold',
     Token.Separator: '#888888',
 
     Token.Name.Selected: 'bold underline',
+    Token.SelectedRow: 'bg:#444444',
+    Token.SelectedRow.Marker: 'bold',
 
     Token.Pdb.Error: '#aa0000 bold',
+    Token.Pdb.Elapsed: '#888888',
+
+    Token.Watch.Expression: 'bold',
+    Token.Watch.Changed: 'bg:#444400 #ffffff',
+    Token.Watch.Suspended: '#888888 italic',
 
     Token.PdbCommand: 'bg:#444444 #ffffff bold',
 }
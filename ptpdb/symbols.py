@@ -0,0 +1,395 @@
+"""
+Index of the definitions (classes, functions, methods, module-level names)
+in the project and in the loaded modules.
+
+The files are parsed with `ast` in a background thread. The definitions of
+every file are cached on disk, with the modification time and the size of
+the file, so that the next session only parses the files that changed. Every
+refresh (at most once every few seconds, when the debugger stops) only stats
+the files, and parses the ones that changed. Cached files that were not indexed
+in the last `max_cache_sessions` sessions that saved the cache are dropped.
+
+The project is the directory in the `PTPDB_PROJECT_ROOT` environment
+variable, or else the current directory when it looks like a project (it has a
+`setup.py`, a `pyproject.toml`, a `.git` directory, ...). Walking it stops
+after `max_project_files` files or `max_project_directories` directories. The
+loaded modules are the `__file__` of the modules in `sys.modules`.
+"""
+from __future__ import unicode_literals, absolute_import
+
+import ast
+import collections
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+__all__ = (
+    'Definition',
+    'SymbolIndex',
+    'extract_definitions',
+    'find_project_root',
+    'get_dotted_name',
+)
+
+# Increase when the format of the cache changes.
+_CACHE_VERSION = 2
+
+# Directories that are not part of the project.
+_SKIPPED_DIRECTORIES = {'__pycache__', 'node_modules', 'site-packages', 'build', 'dist'}
+
+#: Environment variable with the project directory.
+PROJECT_ROOT_VARIABLE = 'PTPDB_PROJECT_ROOT'
+
+# Files that mark the directory of a project.
+_PROJECT_MARKERS = ('setup.py', 'setup.cfg', 'pyproject.toml', '.git', '.hg')
+
+# Statements at module or class level in which definitions are searched too.
+_BLOCK_TYPES = tuple(
+    getattr(ast, name) for name in ('If', 'Try', 'TryStar', 'TryExcept', 'TryFinally')
+    if hasattr(ast, name))
+
+
+class Definition(collections.namedtuple('Definition', 'module qualname kind filename lineno body_lineno')):
+    """
+    A definition in the index.
+
+    :param kind: 'class', 'function' or 'variable'.
+    :param body_lineno: For functions, the line of the first statement of
+        the body. (Where a breakpoint for the function goes.)
+    """
+    @property
+    def name(self):
+        return self.qualname.rpartition('.')[2]
+
+    @property
+    def dotted_name(self):
+        return '%s.%s' % (self.module, self.qualname) if self.module else self.qualname
+
+
+def extract_definitions(source):
+    """
+    Return a list of (qualname, kind, lineno, body_lineno) tuples for the
+    definitions in this Python source code.
+    """
+    result = []
+
+    def body_lineno(node):
+        body = node.body
+        # Skip the docstring, it doesn't generate a line event.
+        if len(body) > 1 and ast.get_docstring(node, clean=False) is not None:
+            body = body[1:]
+        return body[0].lineno
+
+    def visit(body, prefix, in_function):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                qualname = prefix + node.name
+                result.append((qualname, 'class', node.lineno, node.lineno))
+                visit(node.body, qualname + '.', False)
+
+            elif isinstance(node, (ast.FunctionDef, getattr(ast, 'AsyncFunctionDef', ast.FunctionDef))):
+                qualname = prefix + node.name
+                result.append((qualname, 'function', node.lineno, body_lineno(node)))
+                visit(node.body, qualname + '.<locals>.', True)
+
+            elif isinstance(node, ast.Assign) and not in_function:
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        result.append((prefix + target.id, 'variable', node.lineno, node.lineno))
+
+            elif isinstance(node, _BLOCK_TYPES) and not in_function:
+                # Definitions in `if` and `try` blocks at module or class
+                # level (like the fallbacks for older versions).
+                visit(node.body, prefix, in_function)
+                visit(getattr(node, 'orelse', []), prefix, in_function)
+                for handler in getattr(node, 'handlers', []):
+                    visit(handler.body, prefix, in_function)
+
+    visit(ast.parse(source).body, '', False)
+    return result
+
+
+def get_dotted_name(line, column):
+    """
+    Return the (dotted) name at this column of a line of code, up to the end
+    of the identifier under the cursor, or `None`. ("os.pa|th.join" gives
+    "os.path".)
+    """
+    for match in re.finditer(r'[^\W\d][\w.]*', line):
+        if match.start() <= column <= match.end():
+            end = column + len(re.match(r'\w*', line[column:]).group())
+            return match.group()[:end - match.start()].strip('.') or None
+        if match.start() > column:
+            return
+
+
+def _module_name(filename, root):
+    " Guess the module name of a file in the project. "
+    path = os.path.splitext(os.path.relpath(filename, root))[0]
+    parts = path.split(os.sep)
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+def find_project_root():
+    """
+    Return the project directory: `PTPDB_PROJECT_ROOT`, or the current
+    directory when it contains a project file. Otherwise `None`. (Walking a
+    home directory or `/` would take forever.)
+    """
+    root = os.environ.get(PROJECT_ROOT_VARIABLE)
+    if root:
+        return os.path.abspath(root)
+
+    cwd = os.getcwd()
+    if any(os.path.exists(os.path.join(cwd, name)) for name in _PROJECT_MARKERS):
+        return cwd
+
+
+class SymbolIndex(object):
+    """
+    The index. Lookups read immutable snapshots of it, so they never wait
+    for the background thread.
+
+    :param cache_filename: Where the definitions are cached, or `None`.
+    :param root: The project directory. (By default, see `find_project_root`.
+        `False` for only the loaded modules.)
+    :param max_cache_sessions: Number of sessions after which the cache entry
+        of a file that was not indexed anymore is dropped.
+    """
+    def __init__(self, cache_filename=None, root=None, max_project_files=10000,
+                 max_project_directories=2000, refresh_interval=5,
+                 max_cache_sessions=20):
+        if root is None:
+            root = find_project_root()
+
+        self.cache_filename = cache_filename
+        self.root = os.path.abspath(root) if root else None
+        self.max_project_files = max_project_files
+        self.max_project_directories = max_project_directories
+        self.refresh_interval = refresh_interval
+        self.max_cache_sessions = max_cache_sessions
+
+        # Maps filenames to (mtime, size, definitions) tuples, with the
+        # definitions as returned by `extract_definitions`.
+        self._files = {}
+
+        # Maps filenames to their module names.
+        self._modules = {}
+
+        # Maps names (the last part of the qualname) to `Definition` lists.
+        self._by_name = {}
+
+        self._cache_loaded = False
+        self._session = None  # Number of this session in the cache.
+        self._refreshing = False
+        self._last_refresh = 0
+        self._lock = threading.Lock()
+
+        #: Set after every refresh.
+        self.ready = threading.Event()
+
+        #: True once the index was built. (While it's refreshed, the lookups
+        #: use the previous index.)
+        self.built = False
+
+    #
+    # Lookups.
+    #
+
+    def find(self, name):
+        """
+        Return the definitions for a name, which can be dotted:
+        "function", "Class.method", "package.module.function".
+        """
+        parts = name.split('.')
+        definitions = self._by_name.get(parts[-1], [])
+
+        if len(parts) == 1:
+            return list(definitions)
+
+        exact = [d for d in definitions if d.dotted_name == name]
+        if exact:
+            return exact
+
+        # A suffix of the dotted name: "Class.method", "module.function".
+        return [d for d in definitions if d.dotted_name.endswith('.' + name)]
+
+    def find_in_file(self, filename, name):
+        " Return the definitions of `name` in this file. "
+        return [d for d in self._by_name.get(name, []) if d.filename == filename]
+
+    #
+    # Updating.
+    #
+
+    def refresh(self, wait=False):
+        """
+        Update the index for the files that changed, in a background thread.
+        (Not more often than every `refresh_interval` seconds.)
+        """
+        with self._lock:
+            if self._refreshing or time.time() - self._last_refresh < self.refresh_interval:
+                return
+            self._refreshing = True
+            self.ready.clear()
+
+        thread = threading.Thread(target=self._refresh, name='ptpdb-symbols')
+        thread.daemon = True
+        thread.start()
+
+        if wait:
+            self.ready.wait()
+
+    def _refresh(self):
+        sys.settrace(None)
+
+        try:
+            if not self._cache_loaded:
+                self._cache_loaded = True
+                self._files = self._load_cache()
+
+            modules = self._get_module_files()
+            modules.update((f, m) for f, m in self._get_project_files().items() if f not in modules)
+
+            files = {}
+            parsed = 0
+
+            for filename in modules:
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue
+
+                entry = self._files.get(filename)
+                if entry is None or entry[0] != st.st_mtime or entry[1] != st.st_size:
+                    entry = (st.st_mtime, st.st_size, self._parse(filename))
+                    parsed += 1
+                files[filename] = entry
+
+            if parsed or modules != self._modules:
+                self._files = files
+                self._modules = modules
+                self._by_name = self._build(files, modules)
+
+            if parsed:
+                self._save_cache(files)
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._last_refresh = time.time()
+            self.built = True
+            self.ready.set()
+
+    def _get_module_files(self):
+        " Map the source files of the loaded modules to the module names. "
+        result = {}
+        for name, module in list(sys.modules.items()):
+            filename = getattr(module, '__file__', None)
+            if filename and name != '__main__':
+                filename = os.path.abspath(filename)
+                if filename.endswith(('.pyc', '.pyo')):
+                    filename = filename[:-1]
+                if filename.endswith('.py'):
+                    result[filename] = name
+        return result
+
+    def _get_project_files(self):
+        " Map the Python files of the project to their module names. "
+        result = {}
+        if self.root is None:
+            return result
+
+        for i, (directory, dirnames, filenames) in enumerate(os.walk(self.root)):
+            if i >= self.max_project_directories:
+                break
+
+            dirnames[:] = sorted(
+                d for d in dirnames
+                if not d.startswith('.') and d not in _SKIPPED_DIRECTORIES)
+
+            for f in filenames:
+                if f.endswith('.py'):
+                    filename = os.path.join(directory, f)
+                    result[filename] = _module_name(filename, self.root)
+                    if len(result) >= self.max_project_files:
+                        return result
+        return result
+
+    def _parse(self, filename):
+        try:
+            with io.open(filename, 'rb') as f:
+                return extract_definitions(f.read())
+        except (SyntaxError, ValueError, IOError, OSError, RuntimeError):
+            return []
+
+    def _build(self, files, modules):
+        by_name = {}
+        for filename, (mtime, size, definitions) in files.items():
+            module = modules.get(filename)
+            for qualname, kind, lineno, body_lineno in definitions:
+                by_name.setdefault(qualname.rpartition('.')[2], []).append(
+                    Definition(module, qualname, kind, filename, lineno, body_lineno))
+        return by_name
+
+    def _load_cache(self):
+        " Map the filenames in the cache to (mtime, size, definitions) tuples. "
+        return dict((f, e[:3]) for f, e in self._read_cache()[1].items())
+
+    def _read_cache(self):
+        """
+        Return the number of the last session that saved the cache, and a
+        dictionary that maps filenames to (mtime, size, definitions, session)
+        tuples.
+        """
+        if not self.cache_filename:
+            return 0, {}
+
+        try:
+            with open(self.cache_filename, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except (IOError, OSError, ValueError, zlib.error):
+            return 0, {}
+
+        if data.get('version') != _CACHE_VERSION:
+            return 0, {}
+
+        return data['session'], dict(
+            (filename, (mtime, size, [tuple(d) for d in definitions], session))
+            for filename, (mtime, size, definitions, session) in data['files'].items())
+
+    def _save_cache(self, files):
+        if not self.cache_filename:
+            return
+
+        last_session, cached = self._read_cache()
+        if self._session is None:
+            self._session = last_session + 1
+
+        # Keep the entries of files that are not indexed in this session
+        # (other projects), unless they were not indexed in the last
+        # `max_cache_sessions` sessions.
+        cached = dict(
+            (f, e) for f, e in cached.items()
+            if self._session - e[3] < self.max_cache_sessions)
+        cached.update((f, e + (self._session, )) for f, e in files.items())
+
+        data = json.dumps({
+            'version': _CACHE_VERSION,
+            'session': max(last_session, self._session),
+            'files': cached,
+        })
+        tmp_filename = '%s.%i.tmp' % (self.cache_filename, os.getpid())
+
+        try:
+            with open(tmp_filename, 'wb') as f:
+                f.write(zlib.compress(data.encode('utf-8')))
+            os.rename(tmp_filename, self.cache_filename)
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,341 @@
+"""
+Text search in the source files of the loaded modules. (The `grep` command.)
+
+The files are indexed by trigram: for every sequence of three characters in a
+word (in lower case), the index has the list of files in which it occurs. A
+search extracts the literal parts of the regular expression, and only reads
+the files that contain all the trigrams of their words. Regular expressions
+without literal words of three characters or more read all the files.
+
+The index is built in a background thread at the first search. Every search
+after that only stats the files, to index the ones that were loaded or that
+changed since.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from array import array
+from six import unichr
+
+import collections
+import io
+import linecache
+import os
+import re
+import sys
+import threading
+
+__all__ = (
+    'TextMatch',
+    'TrigramIndex',
+    'get_required_literals',
+    'get_source_files',
+)
+
+#: A line that matches: `start` and `end` are the columns of the match.
+TextMatch = collections.namedtuple('TextMatch', 'filename lineno line start end')
+
+_SPECIAL_CHARACTERS = '.^$[]()|\\'
+_QUANTIFIERS = '*?{'
+
+# Escapes of a character code, and the number of hexadecimal digits.
+_HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+
+
+def get_source_files():
+    """
+    Return the source files of the loaded modules, and the sources that
+    `linecache` has in memory (which have no file, like the sources of a
+    snapshot).
+    """
+    result = set()
+
+    for module in list(sys.modules.values()):
+        filename = getattr(module, '__file__', None)
+        if filename:
+            if filename.endswith(('.pyc', '.pyo')):
+                filename = filename[:-1]
+            if filename.endswith('.py'):
+                result.add(os.path.abspath(filename))
+
+    for filename, entry in list(linecache.cache.items()):
+        if len(entry) == 4 and entry[1] is None and not filename.startswith('<'):
+            result.add(filename)
+
+    return result
+
+
+def get_required_literals(pattern):
+    """
+    Return strings that every match of this regular expression contains.
+    (Only the literal parts that are not optional. An empty list when this
+    isn't known.)
+    """
+    # (Alternatives, and the lookarounds, named groups and flags of `(?...)`
+    # groups are not parsed.)
+    if '|' in pattern or '(?' in pattern:
+        return []
+
+    literals = []
+    current = []
+    groups = []  # For every open group, the number of literals before it.
+
+    def end_literal():
+        if current:
+            literals.append(''.join(current))
+            del current[:]
+
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+
+        if c in _QUANTIFIERS:
+            # The previous character was optional.
+            if current:
+                current.pop()
+            end_literal()
+
+            if c == '{':
+                # Skip the repeat count.
+                i = pattern.find('}', i)
+                if i < 0:
+                    return []
+        elif c == '+':
+            end_literal()
+        elif c == '\\' and i + 1 < len(pattern):
+            i += 1
+            c = pattern[i]
+
+            if c in _SPECIAL_CHARACTERS + _QUANTIFIERS + '+':
+                current.append(c)
+            elif c in _HEX_ESCAPES:
+                length = _HEX_ESCAPES[c]
+                try:
+                    current.append(unichr(int(pattern[i + 1:i + 1 + length], 16)))
+                except ValueError:  # (Not on narrow Python 2 builds.)
+                    end_literal()
+                i += length
+            else:
+                end_literal()  # \w, \d, \n, ...
+
+                # Skip the name of \N{...}, and the digits of octal escapes
+                # and backreferences.
+                if c == 'N' and pattern[i + 1:i + 2] == '{':
+                    i = pattern.find('}', i)
+                    if i < 0:
+                        return []
+                elif c.isdigit():
+                    while pattern[i + 1:i + 2].isdigit():
+                        i += 1
+        elif c == '[':
+            end_literal()
+
+            # Skip the set. (A ']' right after the '[' or '[^' is a member.)
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            if i >= len(pattern):
+                return []
+        elif c == '(':
+            end_literal()
+            groups.append(len(literals))
+        elif c == ')':
+            end_literal()
+            if not groups:
+                return []
+            start = groups.pop()
+
+            # The group was optional.
+            if pattern[i + 1:i + 2] in ('*', '?', '{'):
+                del literals[start:]
+        elif c in _SPECIAL_CHARACTERS:
+            end_literal()
+        else:
+            current.append(c)
+        i += 1
+
+    end_literal()
+    return [l for l in literals if len(l) >= 3]
+
+
+def _read(filename):
+    " Return the text of a file, or its source in `linecache`. "
+    entry = linecache.cache.get(filename)
+    if entry is not None and len(entry) == 4 and entry[1] is None:
+        return ''.join(entry[2])
+
+    try:
+        with io.open(filename, encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except (IOError, OSError):
+        return ''
+
+
+_WORD_RE = re.compile(r'\w{3,}')
+
+
+def _get_trigrams(text, cache):
+    """
+    Return the trigrams in the words of `text`, in lower case. (Trigrams
+    across words, like "f.r", are not indexed: they are too common to help.)
+
+    :param cache: Dictionary that maps words to their trigrams.
+    """
+    result = set()
+    for word in set(_WORD_RE.findall(text.lower())):
+        trigrams = cache.get(word)
+        if trigrams is None:
+            trigrams = cache[word] = [word[i:i + 3] for i in range(len(word) - 2)]
+        result.update(trigrams)
+    return result
+
+
+class TrigramIndex(object):
+    """
+    Trigram index of the source files of the loaded modules.
+
+    :param max_file_size: Larger files (generated code) are not indexed.
+    """
+    def __init__(self, max_file_size=10 * 1024 * 1024):
+        self.max_file_size = max_file_size
+
+        # List of (filename, mtime, size) tuples. A file that's indexed again
+        # gets a new id; the old one is set to `None`.
+        self._files = []
+        self._ids = {}  # Maps filenames to their id.
+        self._postings = {}  # Maps trigrams to arrays of file ids.
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        #: Set when the index has been built.
+        self.ready = threading.Event()
+
+    @property
+    def file_count(self):
+        return len(self._ids)
+
+    def build(self):
+        " Start building the index in a background thread. "
+        with self._lock:
+            # (Again in a forked child, when the thread didn't finish.)
+            if self._thread is None or (self._pid != os.getpid() and not self.ready.is_set()):
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._build, name='ptpdb-grep-index')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _build(self):
+        sys.settrace(None)
+        try:
+            self.update()
+        finally:
+            self.ready.set()
+
+    def update(self):
+        """
+        Index the files that were loaded or that changed, and forget the files
+        that are gone. (In the thread that builds the index, or in the thread
+        that searches, once it's built.)
+        """
+        filenames = get_source_files()
+        cache = {}
+
+        for filename in list(self._ids):
+            if filename not in filenames:
+                self._files[self._ids.pop(filename)] = None
+
+        for filename in filenames:
+            try:
+                st = os.stat(filename)
+                mtime, size = st.st_mtime, st.st_size
+            except OSError:
+                mtime, size = None, None  # Only in `linecache`.
+
+            file_id = self._ids.get(filename)
+            if file_id is not None:
+                if self._files[file_id][1:] == (mtime, size):
+                    continue
+                self._files[file_id] = None
+
+            if size is not None and size > self.max_file_size:
+                continue
+
+            file_id = self._ids[filename] = len(self._files)
+            self._files.append((filename, mtime, size))
+
+            for trigram in _get_trigrams(_read(filename), cache):
+                postings = self._postings.get(trigram)
+                if postings is None:
+                    postings = self._postings[trigram] = array(str('i'))
+                postings.append(file_id)
+
+    def get_candidates(self, literals):
+        " Return the filenames that contain all trigrams of these strings. "
+        trigrams = set()
+        for literal in literals:
+            trigrams.update(_get_trigrams(literal, {}))
+
+        if trigrams:
+            # Start with the rarest trigram.
+            postings = sorted((self._postings.get(t, ()) for t in trigrams), key=len)
+            file_ids = set(postings[0])
+            for p in postings[1:]:
+                if not file_ids:
+                    break
+                file_ids.intersection_update(p)
+        else:
+            file_ids = self._ids.values()
+
+        files = self._files
+        return sorted(files[i][0] for i in file_ids if files[i] is not None)
+
+    def search(self, pattern, ignore_case=False, limit=1000):
+        """
+        Return a list of `TextMatch` tuples, one for every matching line.
+
+        :param pattern: A regular expression. (Or a string, when it's not a
+            valid regular expression.)
+        """
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        try:
+            regex = re.compile(pattern, flags)
+        except re.error:
+            regex = re.compile(re.escape(pattern), flags)
+            pattern = re.escape(pattern)
+
+        self.update()
+        result = []
+
+        for filename in self.get_candidates(get_required_literals(pattern)):
+            text = _read(filename)
+            lineno = 1
+            position = 0
+            previous_line_start = -1
+
+            for match in regex.finditer(text):
+                lineno += text.count('\n', position, match.start())
+                position = match.start()
+                line_start = text.rfind('\n', 0, position) + 1
+
+                # One result per line.
+                if line_start == previous_line_start:
+                    continue
+                previous_line_start = line_start
+
+                line_end = text.find('\n', position)
+                if line_end < 0:
+                    line_end = len(text)
+
+                result.append(TextMatch(
+                    filename, lineno, text[line_start:line_end],
+                    position - line_start, min(match.end(), line_end) - line_start))
+
+                if len(result) >= limit:
+                    return result
+
+        return result
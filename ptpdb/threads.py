@@ -0,0 +1,445 @@
+"""
+Debugging multi-threaded programs.
+
+Every thread gets its own `PtPdb` instance, because the stepping state of Bdb
+(`stopframe`, `botframe`, ...) is per thread. What they share is kept in one
+`ThreadSession` per process:
+
+- The terminal. Only one thread at a time shows the prompt; the other threads
+  that stop wait in a queue, until the user switches to them, or until the
+  thread at the prompt resumes.
+- The breakpoints, catchpoints and watchpoints.
+
+The tables are read on every trace event, by all threads. They are never
+locked for reading: they are only modified by the thread that owns the
+terminal (so writers are serialized), and the modifications replace the
+containers that readers iterate over instead of changing them in place. This
+is also safe on free-threaded builds of CPython. (A saved breakpoint of a
+module that's imported while a thread owns the terminal is set by that
+thread, before its next command. When no thread owns the terminal, the
+importing thread sets it, holding the lock that's required for taking the
+terminal.)
+
+After `os.fork`, the child gets a fresh session: the locks, the stopped
+threads and the debuggers of the parent are not valid there. The breakpoints
+are kept, so that workers stop at the breakpoints of their parent. (Their
+debuggers are created with the address of the broker, when there is one. See
+`ptpdb.remote.start_broker`.) This needs `os.register_at_fork` (Python 3.7+).
+Before that, forked children keep the state of their parent, which is why
+`debug_workers` refuses to run there.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from six.moves import _thread
+
+import bdb
+import collections
+import os
+import sys
+import threading
+
+from .catchpoints import CatchpointTable
+from .pending import SavedBreakpoints
+from .remote import worker_address
+from .symbols import find_project_root
+from .watchpoints import WatchpointTable
+
+__all__ = (
+    'StoppedThread',
+    'ThreadSession',
+)
+
+
+def _get_breakpoints_file(filename):
+    """
+    Path of the breakpoint file in the project directory, or `None` outside
+    of a project.
+    """
+    if filename and not os.path.isabs(filename):
+        root = find_project_root()
+        return os.path.join(root, filename) if root else None
+    return filename
+
+
+class StoppedThread(object):
+    """
+    A thread that stopped in the debugger, and shows the prompt or waits for
+    the terminal.
+    """
+    def __init__(self, ident, number, name, debugger, frame):
+        self.ident = ident
+        self.number = number
+        self.name = name
+        self.debugger = debugger
+        self.frame = frame
+
+
+class ThreadSession(object):
+    """
+    State that's shared by the debuggers of all threads.
+
+    :param create_debugger: Callable that creates a debugger for a thread
+        that doesn't have one yet.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, create_debugger):
+        self.create_debugger = create_debugger
+
+        #: Keyword arguments for `create_debugger`. (The options of the
+        #: debugger that was started first.)
+        self.debugger_options = {}
+        self._local = threading.local()
+
+        # Writers (and threads waiting for the terminal) use this condition.
+        # Readers of the tables below don't.
+        self._condition = threading.Condition()
+
+        #: Bdb's `breaks` dictionary, shared by all debuggers.
+        self.breaks = {}
+        self.catchpoints = CatchpointTable()
+        self.watchpoints = WatchpointTable(self._watchpoint_changed)
+
+        self.saved_breakpoints = SavedBreakpoints(
+            _get_breakpoints_file(getattr(create_debugger, 'breakpoints_filename', None)),
+            self._resolve_saved_breakpoint)
+
+        #: Maps thread idents to `StoppedThread`, in the order in which they
+        #: stopped. (Replaced, never modified in place.)
+        self.stopped = collections.OrderedDict()
+
+        #: The ident of the thread that shows the prompt, and of the thread to
+        #: which the user wants to switch.
+        self.owner = None
+        self.requested = None
+
+        #: When `freeze_threads` is set, the other traced threads are paused
+        #: while a thread is at the prompt.
+        self.freeze_threads = False
+        self.frozen = False
+
+        # Small numbers for the threads, for the `thread` command.
+        self._numbers = {}
+        self._next_number = 1
+
+        # Locks for updating the hit counts of the breakpoints of a line.
+        self._line_locks = {}
+
+        self._canonic_filenames = {}
+
+        # (saved_breakpoint, filename) tuples, for the thread at the prompt.
+        self._pending_resolutions = []
+
+        #: True when the other threads are traced for breakpoints (when
+        #: following is on, and there are breakpoints or catchpoints).
+        self.following_threads = False
+        self.tracing_threads = False
+
+    @classmethod
+    def get(cls, create_debugger):
+        """
+        Return the session of this process.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(create_debugger)
+            return cls._instance
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        cls._instance_lock = threading.Lock()
+        if cls._instance is not None:
+            cls._instance.reset_after_fork()
+
+    def reset_after_fork(self):
+        """
+        Forget the threads and the debuggers of the parent process. (Called in
+        the child, after `os.fork`.)
+        """
+        self._local = threading.local()
+        self._condition = threading.Condition()
+        self._line_locks = {}
+
+        self.stopped = collections.OrderedDict()
+        self.owner = None
+        self.requested = None
+        self.frozen = False
+        self._pending_resolutions = []
+        self._numbers = {}
+        self._next_number = 1
+
+        remote = worker_address() or self.debugger_options.get('remote')
+        self.debugger_options = dict(self.debugger_options, remote=remote)
+
+        # When the parent was being debugged, the trace function and the
+        # frames that are running refer to its debugger. From now on, a new
+        # debugger is created when a breakpoint is hit.
+        if isinstance(getattr(sys.gettrace(), '__self__', None), bdb.Bdb):
+            frame = sys._getframe()
+            while frame is not None:
+                frame.f_trace = None
+                frame = frame.f_back
+
+            # This thread keeps stopping at the breakpoints, also when the
+            # other threads are not followed.
+            self._local.forked = True
+            sys.settrace(self.trace_thread if self.breaks or self.catchpoints else None)
+
+    def get_number(self, ident):
+        " Return the number of the thread with this ident. "
+        try:
+            return self._numbers[ident]
+        except KeyError:
+            with self._condition:
+                number = self._numbers.setdefault(ident, self._next_number)
+                if number == self._next_number:
+                    self._next_number += 1
+                return number
+
+    def get_thread(self, number):
+        " Return the `StoppedThread` with this number, or `None`. "
+        for stopped in self.stopped.values():
+            if stopped.number == number:
+                return stopped
+
+    def get_line_lock(self, filename, lineno):
+        " Return the lock for the breakpoints at this line. "
+        key = (filename, lineno)
+        lock = self._line_locks.get(key)
+        if lock is None:
+            lock = self._line_locks.setdefault(key, threading.Lock())
+        return lock
+
+    #
+    # Debuggers.
+    #
+
+    def set_debugger(self, debugger):
+        " Make `debugger` the debugger of the current thread. "
+        self._local.debugger = debugger
+
+    def get_debugger(self, frame=None):
+        """
+        Return the debugger of the current thread. A new debugger is not
+        stepping: it only stops at breakpoints.
+        """
+        try:
+            return self._local.debugger
+        except AttributeError:
+            debugger = self._local.debugger = self.create_debugger(**self.debugger_options)
+
+            bottom = frame or sys._getframe(1)
+            while bottom.f_back is not None:
+                bottom = bottom.f_back
+            debugger.botframe = bottom
+            debugger._set_stopinfo(bottom, None, -1)
+            return debugger
+
+    def _watchpoint_changed(self, watchpoint, frame):
+        self.get_debugger(frame)._watchpoint_changed(watchpoint, frame)
+
+    def _resolve_saved_breakpoint(self, saved, filename):
+        """
+        Set a saved breakpoint of a module that was imported. Only the thread
+        at the prompt changes the tables, the other threads leave it to that
+        thread.
+        """
+        with self._condition:
+            if self.owner is None or self.owner == _thread.get_ident():
+                self.get_debugger()._resolve_saved_breakpoint(saved, filename)
+            else:
+                self._pending_resolutions.append((saved, filename))
+
+    def resolve_pending_breakpoints(self, debugger):
+        """
+        Set the saved breakpoints of the modules that other threads imported.
+        (Called by the thread at the prompt.)
+        """
+        if self._pending_resolutions:
+            with self._condition:
+                pending, self._pending_resolutions = self._pending_resolutions, []
+
+            for saved, filename in pending:
+                debugger._resolve_saved_breakpoint(saved, filename)
+
+    #
+    # Tracing of other threads.
+    #
+
+    def follow_threads(self):
+        """
+        Trace the threads that are started from now on (and on Python 3.12+,
+        the threads that are running), so that they stop at breakpoints too.
+        Only while there are breakpoints or catchpoints: tracing makes every
+        function call slower.
+        """
+        self.following_threads = True
+        self.update_thread_tracing()
+
+    def stop_following_threads(self):
+        """
+        Stop tracing the other threads. (When the debugger quits.)
+        """
+        self.following_threads = False
+        self.update_thread_tracing()
+
+    def update_thread_tracing(self):
+        """
+        Start or stop tracing the other threads, after the breakpoints or
+        catchpoints changed. (The threads that are traced remove
+        `trace_thread` themselves, at their next call.)
+        """
+        tracing = self.following_threads and bool(self.breaks or self.catchpoints)
+        if tracing == self.tracing_threads:
+            return
+
+        self.tracing_threads = tracing
+        threading.settrace(self.trace_thread if tracing else None)
+
+        settrace_all_threads = getattr(threading, 'settrace_all_threads', None)
+        if tracing and settrace_all_threads is not None:
+            trace = sys.gettrace()
+            settrace_all_threads(self.trace_thread)
+            sys.settrace(trace)
+
+    def _canonic(self, filename):
+        " Like `Bdb.canonic`, with the cache shared by all threads. "
+        try:
+            return self._canonic_filenames[filename]
+        except KeyError:
+            if filename.startswith('<') and filename.endswith('>'):
+                result = filename
+            else:
+                result = os.path.normcase(os.path.abspath(filename))
+            self._canonic_filenames[filename] = result
+            return result
+
+    def trace_thread(self, frame, event, arg):
+        """
+        Trace function of the threads that don't have a debugger yet. Only
+        when a function of a file with breakpoints is called (or when there
+        are catchpoints), the thread gets a debugger.
+        """
+        if self.frozen:
+            self.wait_while_frozen()
+
+        if not self.tracing_threads and not getattr(self._local, 'forked', False):
+            sys.settrace(None)
+            return
+
+        if self._canonic(frame.f_code.co_filename) not in self.breaks and not self.catchpoints:
+            return
+
+        debugger = self.get_debugger(frame)
+        sys.settrace(debugger.trace_dispatch)
+        return debugger.trace_dispatch(frame, event, arg)
+
+    #
+    # The terminal.
+    #
+
+    def acquire_terminal(self, debugger, frame):
+        """
+        Called by a thread that stops. Wait until it can show the prompt.
+        """
+        ident = _thread.get_ident()
+
+        # A debugger that's started from the prompt. (This thread already
+        # owns the terminal.)
+        depth = getattr(self._local, 'terminal_depth', 0)
+        self._local.terminal_depth = depth + 1
+        if depth:
+            return
+
+        with self._condition:
+            stopped = collections.OrderedDict(self.stopped)
+            stopped[ident] = StoppedThread(
+                ident, self.get_number(ident), threading.current_thread().name,
+                debugger, frame)
+            self.stopped = stopped
+
+            if self.owner is not None:
+                self.stopped[self.owner].debugger.thread_stopped()
+
+            self._wait_for_terminal(ident)
+
+    def release_terminal(self):
+        """
+        Called by the thread at the prompt when it resumes.
+        """
+        ident = _thread.get_ident()
+
+        self._local.terminal_depth -= 1
+        if self._local.terminal_depth:
+            return
+
+        with self._condition:
+            if self.owner == ident:
+                self.resolve_pending_breakpoints(self.stopped[ident].debugger)
+
+            stopped = collections.OrderedDict(self.stopped)
+            stopped.pop(ident, None)
+            self.stopped = stopped
+
+            if self.owner == ident:
+                self.owner = None
+            if not stopped:
+                self.frozen = False
+            self._condition.notify_all()
+
+    def switch_to(self, number):
+        """
+        Give the terminal to another stopped thread, and wait until we get it
+        back. Return `False` when there's no stopped thread with this number.
+        """
+        ident = _thread.get_ident()
+        target = self.get_thread(number)
+
+        if target is None or target.ident == ident:
+            return False
+
+        with self._condition:
+            self.requested = target.ident
+            self.owner = None
+            self._condition.notify_all()
+            self._wait_for_terminal(ident)
+        return True
+
+    def _wait_for_terminal(self, ident):
+        " Wait until `ident` can take the terminal. (Holding the condition.) "
+        while not self._can_take_terminal(ident):
+            self._condition.wait()
+
+        self.owner = ident
+        if self.requested == ident:
+            self.requested = None
+        if self.freeze_threads:
+            self.frozen = True
+
+    def _can_take_terminal(self, ident):
+        if self.owner is not None:
+            return False
+        if self.requested in self.stopped:
+            return ident == self.requested
+        return ident == next(iter(self.stopped))
+
+    def set_freeze_threads(self, value):
+        with self._condition:
+            self.freeze_threads = value
+            self.frozen = value and self.owner is not None
+            self._condition.notify_all()
+
+    def wait_while_frozen(self):
+        """
+        Called by traced threads while the other threads are frozen.
+        """
+        ident = _thread.get_ident()
+
+        with self._condition:
+            while self.frozen and ident != self.owner and ident not in self.stopped:
+                self._condition.wait()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ThreadSession._after_fork_in_child)
@@ -1,6 +1,8 @@
 from __future__ import unicode_literals, absolute_import
 from pygments.token import Token
 
+from prompt_toolkit.layout.containers import ConditionalContainer, Window
+from prompt_toolkit.layout.controls import TokenListControl
 from prompt_toolkit.layout.toolbars import TokenListToolbar
 from prompt_toolkit.layout.screen import Char
 
@@ -8,11 +10,19 @@ from prompt_toolkit.filters import IsDone, Condition
 
 from bdb import Breakpoint
 
+from .stats import format_duration
+
 __all__ = (
     'PdbShortcutsToolbar',
     'SourceTitlebar',
     'StackTitlebar',
+    'WatchTitlebar',
+    'ResultListTitlebar',
     'BreakPointInfoToolbar',
+    'LocalsChangesToolbar',
+    'StepStatisticsToolbar',
+    'EventLoopToolbar',
+    'RenderProfileOverlay',
 )
 
 
@@ -24,7 +34,29 @@ class PdbShortcutsToolbar(TokenListToolbar):
         token = Token.Toolbar.Shortcuts
 
         def get_tokens(cli):
-            if pdb_ref().callstack_focussed:
+            pdb = pdb_ref()
+
+            if pdb.result_list_focussed:
+                result = [
+                    (token.Description, ' '),
+                    (token.Key, '[Ctrl-X]'),
+                    (token.Description, ' Focus CLI '),
+                    (token.Key, '[Enter]'),
+                    (token.Description, ' Open '),
+                    (token.Key, '[b]'),
+                    (token.Description, 'reak '),
+                ]
+                if len(pdb.result_list.sort_orders) > 1:
+                    result.extend([
+                        (token.Key, '[s]'),
+                        (token.Description, 'ort '),
+                    ])
+                result.extend([
+                    (token.Key, '[Escape]'),
+                    (token.Description, ' Close '),
+                ])
+                return result
+            elif pdb.callstack_focussed:
                 return [
                     (token.Description, ' '),
                     (token.Key, '[Ctrl-X]'),
@@ -35,7 +67,7 @@ class PdbShortcutsToolbar(TokenListToolbar):
                     (token.Description, ' Navigate '),
                 ]
             elif cli.current_buffer_name == 'source_code':
-                return [
+                result = [
                     (token.Description, ' '),
                     (token.Key, '[Ctrl-X]'),
                     (token.Description, ' Focus CLI '),
@@ -49,9 +81,17 @@ class PdbShortcutsToolbar(TokenListToolbar):
                     (token.Description, 'uit '),
                     (token.Key, '[b]'),
                     (token.Description, 'reak '),
+                    (token.Key, '[d]'),
+                    (token.Description, 'efinition '),
                     (token.Key, '[Arrows]'),
                     (token.Description, ' Navigate '),
                 ]
+                if pdb.source_has_long_lines:
+                    result.extend([
+                        (token.Key, '[<>]'),
+                        (token.Description, ' Scroll long lines '),
+                    ])
+                return result
             else:
                 return [
                     (token.Description, ' '),
@@ -73,14 +113,25 @@ class SourceTitlebar(TokenListToolbar):
 
         def get_tokens(cli):
             pdb = pdb_ref()
+            filename, lineno = pdb.get_source_location()
 
-            return [
+            result = [
                 (token, '\u2500\u2500'),
                 (token.Text, ' '),
-                (token.Text, pdb.curframe.f_code.co_filename or 'None'),
-                (token.Text, ' : %s ' % pdb.curframe.f_lineno),
+                (token.Text, filename or 'None'),
+                (token.Text, ' : %s ' % lineno),
             ]
 
+            if pdb.source_has_long_lines:
+                result.append((token.Text, ' [long lines: columns %i-%i] ' % (
+                    pdb.source_hscroll + 1, pdb.source_hscroll + pdb.long_line_width)))
+
+            if pdb.replay_index is not None:
+                result.append((token.Replay, ' [replay: %i events back] ' % (
+                    pdb.recorder.count - 1 - pdb.replay_index)))
+
+            return result
+
         super(SourceTitlebar, self).__init__(
             get_tokens, default_char=Char(token=token, char='\u2500'))
 
@@ -103,12 +154,73 @@ class StackTitlebar(TokenListToolbar):
                 text = '(frame %i/%i) ' % (pdb.callstack_selected_frame + 1, len(pdb.stack))
                 result.append((token.Text, text))
 
+            # With several stopped threads: show which one this is.
+            stopped = pdb.session.stopped
+            if len(stopped) > 1 and pdb.session.owner in stopped:
+                text = '(thread %i, %i waiting) ' % (
+                    stopped[pdb.session.owner].number, len(stopped) - 1)
+                result.append((token.Text, text))
+
             return result
 
         super(StackTitlebar, self).__init__(
             get_tokens, default_char=Char(token=token, char='\u2500'))
 
 
+class WatchTitlebar(TokenListToolbar):
+    """
+    Title above the `display` expressions.
+    """
+    def __init__(self, pdb_ref):
+        token = Token.Toolbar.Title
+
+        def get_tokens(cli):
+            watches = pdb_ref().get_watches()
+            changed = sum(1 for w in watches if w.changed)
+
+            result = [
+                (token, '\u2500\u2500'),
+                (token.Text, ' Display '),
+            ]
+
+            if changed:
+                result.append((token.Text, '(%i changed) ' % changed))
+
+            return result
+
+        super(WatchTitlebar, self).__init__(
+            get_tokens, default_char=Char(token=token, char='\u2500'))
+
+
+class ResultListTitlebar(TokenListToolbar):
+    """
+    Title above the results pane.
+    """
+    def __init__(self, pdb_ref):
+        token = Token.Toolbar.Title
+
+        def get_tokens(cli):
+            pdb = pdb_ref()
+            result_list = pdb.result_list
+
+            result = [
+                (token, '\u2500\u2500'),
+                (token.Text, ' %s ' % result_list.title),
+            ]
+
+            if result_list.sort_order:
+                result.append((token.Text, '(sorted by %s) ' % result_list.sort_order))
+
+            if pdb.result_list_focussed:
+                result.append((token.Text, '(%i/%i) ' % (
+                    result_list.selected_index + 1, len(result_list.rows))))
+
+            return result
+
+        super(ResultListTitlebar, self).__init__(
+            get_tokens, default_char=Char(token=token, char='\u2500'))
+
+
 class BreakPointInfoToolbar(TokenListToolbar):
     """
     Show info about the current breakpoint.
@@ -119,7 +231,7 @@ class BreakPointInfoToolbar(TokenListToolbar):
         def get_break(cli):
             """ Get Breakpoints. """
             pdb = pdb_ref()
-            filename = pdb.canonic(pdb.curframe.f_code.co_filename)
+            filename = pdb.canonic(pdb.get_source_location()[0])
             lineno = cli.buffers['source_code'].document.cursor_position_row + 1
             if (filename, lineno) in Breakpoint.bplist:
                 return Breakpoint.bplist[filename, lineno]
@@ -130,6 +242,14 @@ class BreakPointInfoToolbar(TokenListToolbar):
             breaks = get_break(cli)
             result = []
 
+            watchpoint = pdb_ref().watchpoint_hit
+            if watchpoint is not None:
+                result.append((token, ' WP %i %s: %s -> %s' % (
+                    watchpoint.number, watchpoint.expression,
+                    watchpoint.old_value_repr, watchpoint.value_repr)))
+                text = 'hit' if watchpoint.hits == 1 else 'hits'
+                result.append((token, ', %i %s ' % (watchpoint.hits, text)))
+
             for b in breaks:
                 if not b.enabled:
                     result.append((token, ' [disabled]'))
@@ -151,4 +271,136 @@ class BreakPointInfoToolbar(TokenListToolbar):
             return result
 
         super(BreakPointInfoToolbar, self).__init__(get_tokens,
-                filter=Condition(lambda cli: bool(get_break(cli))))
+                filter=Condition(lambda cli: bool(get_break(cli)) or
+                                 pdb_ref().watchpoint_hit is not None))
+
+
+class LocalsChangesToolbar(TokenListToolbar):
+    """
+    Show which locals changed since the previous stop in the same frame.
+    """
+    def __init__(self, pdb_ref):
+        token = Token.Toolbar.Changes
+
+        def get_tokens(cli):
+            diff = pdb_ref().locals_diff
+            result = [(token, ' Changed:')]
+
+            for prefix, names, name_token in [
+                    ('+', diff.added, token.Added),
+                    ('-', diff.removed, token.Removed),
+                    ('=', diff.rebound, token.Rebound),
+                    ('~', diff.mutated, token.Mutated)]:
+                for name in names:
+                    result.append((token, ' '))
+                    result.append((name_token, prefix + name))
+
+            return result
+
+        super(LocalsChangesToolbar, self).__init__(
+            get_tokens,
+            default_char=Char(token=token),
+            filter=Condition(lambda cli: bool(pdb_ref().locals_diff)))
+
+
+class StepStatisticsToolbar(TokenListToolbar):
+    """
+    Show how long the program ran since it was resumed, and the overhead of
+    the debugger.
+    """
+    def __init__(self, pdb_ref):
+        token = Token.Toolbar.Stats
+
+        def get_tokens(cli):
+            stats = pdb_ref().step_stats
+
+            return [
+                (token, ' Ran '),
+                (token.Value, format_duration(stats.wall_time)),
+                (token, ' (CPU '),
+                (token.Value, format_duration(stats.cpu_time)),
+                (token, ')  Trace events: '),
+                (token.Value, '%i' % stats.trace_events),
+                (token, '  Debugger: '),
+                (token.Value, format_duration(stats.trace_time)),
+                (token, ' (%.0f%%) ' % (100. * (stats.overhead or 0))),
+            ]
+
+        super(StepStatisticsToolbar, self).__init__(
+            get_tokens,
+            default_char=Char(token=token),
+            filter=Condition(lambda cli: pdb_ref().step_stats.wall_time is not None))
+
+
+class EventLoopToolbar(TokenListToolbar):
+    """
+    Show how many other asyncio tasks keep running while the prompt is shown.
+    """
+    def __init__(self, pdb_ref):
+        token = Token.Toolbar.Stats
+
+        def get_tokens(cli):
+            pump = pdb_ref().event_loop_pump
+
+            return [
+                (token, ' Event loop: '),
+                (token.Value, '%i' % pump.running_tasks),
+                (token, ' other task%s running ' % ('' if pump.running_tasks == 1 else 's')),
+            ]
+
+        super(EventLoopToolbar, self).__init__(
+            get_tokens,
+            default_char=Char(token=token),
+            filter=Condition(lambda cli: pdb_ref().event_loop_pump is not None))
+
+
+class RenderProfileOverlay(ConditionalContainer):
+    """
+    Show the slowest components of the layout, and the frame times, while
+    the render profiler is enabled.
+    """
+    def __init__(self, pdb_ref, max_components=8):
+        token = Token.Toolbar.RenderProfile
+
+        def format_ms(seconds):
+            # Red when slower than a frame at 60Hz.
+            value_token = token.Slow if seconds > 1. / 60 else token.Value
+            return (value_token, '%6.2f' % (seconds * 1000))
+
+        def get_tokens(cli):
+            profiler = pdb_ref().render_profiler
+            durations, latencies = profiler.get_frame_times()
+
+            result = [
+                (token.Title, ' Render profile '),
+                (token, '%i frames [F5] \n' % len(durations)),
+            ]
+
+            for title, times in [('Frame    ', durations), ('Key-paint', latencies)]:
+                result.append((token, ' %s last ' % title))
+                if times:
+                    result.extend([format_ms(times[-1]), (token, '  max '), format_ms(max(times))])
+                else:
+                    result.append((token, '     -'))
+                result.append((token, ' ms \n'))
+
+            result.append((token, ' %-16s %6s %6s %6s \n' % ('ms/frame', 'total', 'tokens', 'max')))
+
+            count = max(len(durations), 1)
+            for name, statistics in profiler.get_statistics()[:max_components]:
+                result.extend([
+                    (token, ' %-16s ' % name[:16]),
+                    format_ms(statistics.total_time / count),
+                    (token, ' '),
+                    format_ms(statistics.content_time / count),
+                    (token, ' '),
+                    format_ms(statistics.max_time),
+                    (token, ' \n'),
+                ])
+
+            # (Without the newline of the last line.)
+            return result[:-1] + [(token, ' ')]
+
+        super(RenderProfileOverlay, self).__init__(
+            content=Window(TokenListControl(get_tokens, default_char=Char(token=token))),
+            filter=Condition(lambda cli: pdb_ref().render_profiler.enabled))
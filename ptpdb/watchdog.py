@@ -0,0 +1,188 @@
+"""
+Time-bounded evaluation of user expressions.
+
+A single watchdog thread keeps track of the deadline of the evaluation that
+is currently running. When the deadline passes, it raises `KeyboardInterrupt`
+asynchronously in the evaluating thread, which turns it into an
+:class:`.EvaluationTimeout` error.
+
+Note that asynchronous exceptions are only delivered while the evaluating
+thread is executing Python bytecode. A call that blocks inside C code (like
+`socket.recv`) is only interrupted once it returns to Python.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from six.moves import _thread
+
+import sys
+import threading
+import time
+
+try:
+    import ctypes
+    _set_async_exc = ctypes.pythonapi.PyThreadState_SetAsyncExc
+except (ImportError, AttributeError):  # Not CPython.
+    _set_async_exc = None
+
+__all__ = (
+    'EvaluationTimeout',
+    'Watchdog',
+)
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class EvaluationTimeout(Exception):
+    """
+    Raised when an evaluation exceeded its time budget.
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        super(EvaluationTimeout, self).__init__(
+            'Evaluation took longer than %ss and was interrupted.' % budget)
+
+
+class _Evaluation(object):
+    " One evaluation that's being watched. "
+    def __init__(self, thread_id, deadline):
+        self.thread_id = thread_id
+        self.deadline = deadline
+
+        #: Set by the watchdog thread, before it raises the exception.
+        self.fired = False
+
+        #: Set in the evaluating thread, when the exception is raised.
+        self.raised = False
+
+
+# Maps thread IDs to the `_Evaluation` for which an `_Interrupt` is on its
+# way to that thread.
+_firing = {}
+
+
+class _Interrupt(KeyboardInterrupt):
+    """
+    The exception that the watchdog raises. It's instantiated in the
+    evaluating thread when it's raised there, which tells `_disarm` that it
+    doesn't have to wait for it anymore.
+    """
+    def __init__(self, *a):
+        KeyboardInterrupt.__init__(self, *a)
+
+        evaluation = _firing.pop(_thread.get_ident(), None)
+        if evaluation is not None:
+            evaluation.raised = True
+
+
+def _thread_id_arg(thread_id):
+    if sys.version_info >= (3, 7):
+        return ctypes.c_ulong(thread_id)
+    else:
+        return ctypes.c_long(thread_id)
+
+
+class Watchdog(object):
+    """
+    Run callables under a time budget.
+
+    The watchdog thread is started lazily, the first time an evaluation with
+    a budget is done.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._current = None  # The `_Evaluation` being watched.
+        self._thread = None
+
+        #: True when the last call was interrupted. (Also when the
+        #: `KeyboardInterrupt` was caught by the callable itself.)
+        self.interrupted = False
+
+    @property
+    def can_interrupt(self):
+        " True when this Python implementation supports interrupting. "
+        return _set_async_exc is not None
+
+    def call(self, budget, func, *a, **kw):
+        """
+        Call `func(*a, **kw)`. Return a (result, elapsed_time) tuple.
+
+        Raise :class:`.EvaluationTimeout` when it takes longer than `budget`
+        seconds. When `budget` is `None` (or zero), the call is only timed.
+        """
+        start = _timer()
+        self.interrupted = False
+
+        if not budget or not self.can_interrupt:
+            result = func(*a, **kw)
+            return result, _timer() - start
+
+        evaluation = _Evaluation(_thread.get_ident(), start + budget)
+
+        try:
+            try:
+                self._arm(evaluation)
+                result = func(*a, **kw)
+            except KeyboardInterrupt:
+                # (Python 2 only instantiates an `_Interrupt` that passes
+                # through a `finally` clause in an `except` clause.)
+                raise
+            finally:
+                self._disarm(evaluation)
+        except KeyboardInterrupt:
+            self.interrupted = evaluation.fired
+            if evaluation.fired:
+                raise EvaluationTimeout(budget)
+            raise
+
+        self.interrupted = evaluation.fired
+        return result, _timer() - start
+
+    def _arm(self, evaluation):
+        with self._condition:
+            self._current = evaluation
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ptpdb-watchdog')
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._condition.notify()
+
+    def _disarm(self, evaluation):
+        # The watchdog fires while holding the same lock, so after this, it
+        # either fired already, or it won't fire anymore.
+        with self._condition:
+            if self._current is evaluation:
+                self._current = None
+
+            # When the watchdog fired, but the exception was not raised yet,
+            # wait until it's raised here. (Cancelling it with
+            # `PyThreadState_SetAsyncExc(id, NULL)` leaves the interpreter's
+            # "pending exception" flag set, after which threads that are
+            # started with a trace function never run.)
+            try:
+                while evaluation.fired and not evaluation.raised:
+                    pass
+            except KeyboardInterrupt:
+                pass
+
+    def _run(self):
+        " Watchdog thread. "
+        with self._condition:
+            while True:
+                evaluation = self._current
+
+                if evaluation is None:
+                    self._condition.wait()
+                    continue
+
+                remaining = evaluation.deadline - _timer()
+
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                elif not evaluation.fired:
+                    evaluation.fired = True
+                    self._current = None
+                    _firing[evaluation.thread_id] = evaluation
+                    _set_async_exc(_thread_id_arg(evaluation.thread_id),
+                                   ctypes.py_object(_Interrupt))
@@ -0,0 +1,163 @@
+"""
+Watch expressions for the `display` command.
+
+Pdb re-evaluates every `display` expression at every stop and compares the
+old and new value with `==`, which can be very expensive for big objects.
+Here, every expression is compiled only once, and change detection is done
+using a cheap fingerprint: the identity and the length of the value, and
+optionally the hash of a bounded sample of its items.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from six.moves import reprlib
+
+import six
+
+import itertools
+import sys
+import time
+import traceback
+
+__all__ = (
+    'Watch',
+    'fingerprint',
+)
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+# Bounded repr, used for displaying the values.
+_repr = reprlib.Repr()
+_repr.maxstring = 80
+_repr.maxother = 80
+
+_number_types = six.integer_types + (float, complex, bool, type(None))
+
+
+def fingerprint(value, sample_size=0):
+    """
+    Return a cheap fingerprint of `value`. When the fingerprint of a value
+    didn't change between two stops, we consider it unchanged.
+
+    :param sample_size: When non-zero, also take the identity of the first
+        and last `sample_size` items of sequences and mappings into account.
+        (This detects most in-place mutations that don't change the length.)
+    """
+    # Numbers and strings are immutable and cheap to compare. (The hash of a
+    # string is cached.) Identity is not enough here, because new objects can
+    # reuse the id of a freed object.
+    if isinstance(value, _number_types):
+        # (NaN is not equal to itself. Tuples compare their items by identity
+        # first, so only the same NaN object would be equal.)
+        if value != value:
+            return (type(value), 'nan', None)
+        return (type(value), value, None)
+
+    if isinstance(value, (six.text_type, six.binary_type)):
+        return (type(value), len(value), hash(value))
+
+    # Only call `len` on builtin containers. User defined `__len__`
+    # implementations could be arbitrarily slow.
+    if isinstance(value, (list, tuple, dict, set, frozenset, bytearray)):
+        length = len(value)
+    else:
+        return (id(value), None, None)
+
+    if not sample_size or isinstance(value, (set, frozenset)):
+        return (id(value), length, None)
+
+    if isinstance(value, dict):
+        items = itertools.islice(six.iteritems(value), sample_size)
+        sample = tuple((id(k), id(v)) for k, v in items)
+    elif isinstance(value, bytearray):
+        sample = bytes(value[:sample_size] + value[-sample_size:])
+    else:
+        sample = tuple(id(v) for v in value[:sample_size]) + \
+            tuple(id(v) for v in value[-sample_size:])
+
+    return (id(value), length, hash(sample))
+
+
+class Watch(object):
+    """
+    A single (precompiled) `display` expression.
+
+    :param expression: Python expression, as typed by the user.
+    :param budget: Time budget (in seconds) for one evaluation. When an
+        evaluation takes longer, the watch is suspended and it won't be
+        evaluated automatically anymore until it's added again.
+    :param sample_size: See :func:`.fingerprint`.
+    """
+    def __init__(self, expression, budget=.1, sample_size=0):
+        self.expression = expression
+        self.budget = budget
+        self.sample_size = sample_size
+
+        # Raises `SyntaxError` for invalid expressions.
+        self.code = compile(expression, '<display>', 'eval')
+
+        self.value_repr = ''
+        self.error = None
+        self.elapsed = 0
+        self.suspended = False
+
+        #: True when the value changed during the last `update` call.
+        self.changed = False
+
+        #: Incremented every time the displayed text changes. (The panel uses
+        #: this to see which entries have to be redrawn.)
+        self.generation = 0
+
+        self._fingerprint = None
+
+    def update(self, globals, locals, watchdog=None):
+        """
+        Evaluate the expression in the given namespace. Return `True` when
+        the value changed.
+
+        :param watchdog: :class:`~ptpdb.watchdog.Watchdog` instance. When
+            given, the evaluation is interrupted when it exceeds the budget.
+        """
+        if self.suspended:
+            self.changed = False
+            return False
+
+        start = _timer()
+        try:
+            if watchdog is None:
+                value = eval(self.code, globals, locals)
+            else:
+                value, _ = watchdog.call(self.budget, eval, self.code, globals, locals)
+        except Exception:
+            exc_info = sys.exc_info()[:2]
+            new_fingerprint = None
+            error = traceback.format_exception_only(*exc_info)[-1].strip()
+        else:
+            new_fingerprint = fingerprint(value, self.sample_size)
+            error = None
+        self.elapsed = _timer() - start
+
+        changed = (error != self.error or
+                   (error is None and new_fingerprint != self._fingerprint))
+
+        # Only compute the repr for changed values.
+        if changed:
+            self._fingerprint = new_fingerprint
+            self.error = error
+            if error is None:
+                try:
+                    self.value_repr = _repr.repr(value)
+                except Exception:
+                    self.value_repr = '** repr failed **'
+            else:
+                self.value_repr = '** raised %s **' % error
+            self.generation += 1
+
+        if self.elapsed > self.budget:
+            self.suspended = True
+            self.generation += 1
+
+        # Keep no reference to the value itself.
+        value = None
+
+        self.changed = changed
+        return changed
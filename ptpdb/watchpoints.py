@@ -0,0 +1,252 @@
+"""
+Data watchpoints on attributes, for the `watch` command.
+
+For `watch obj.attr`, the class of `obj` gets a `__setattr__` hook, so that
+only actual writes to attributes of instances of this class pay a cost. The
+original `__setattr__` is restored when the last watchpoint on that class is
+removed.
+
+Objects of which the class can't be modified (built-in and extension types,
+modules, ...) are watched by comparing the value after every line that runs in
+one frame.
+
+The hooks run in all threads, without locking. That's why adding and removing
+watchpoints replaces the lists instead of modifying them.
+"""
+from __future__ import unicode_literals, absolute_import
+
+from six.moves import reprlib
+
+import sys
+
+from .counter import Counter
+
+__all__ = (
+    'Watchpoint',
+    'WatchpointTable',
+    'hook_code',
+)
+
+_repr = reprlib.Repr()
+_repr.maxstring = 40
+_repr.maxother = 40
+
+_missing = object()
+
+
+def _values_differ(a, b):
+    if a is b:
+        return False
+    try:
+        return bool(a != b)
+    except Exception:  # E.g. arrays with an ambiguous truth value.
+        return True
+
+
+def _safe_repr(value):
+    if value is _missing:
+        return '<undefined>'
+    try:
+        return _repr.repr(value)
+    except Exception:
+        return '<repr failed>'
+
+
+class Watchpoint(object):
+    """
+    Watch one attribute of one object.
+
+    :param frame: For watchpoints that can't hook into the class: the frame
+        in which we compare the value after every line. `None` otherwise.
+    """
+    def __init__(self, number, expression, obj, attr, frame=None):
+        self.number = number
+        self.expression = expression
+        self.obj = obj
+        self.attr = attr
+        self.frame = frame
+
+        #: Number of times the debugger stopped for this watchpoint.
+        self.hit_counter = Counter()
+
+        self.value = getattr(obj, attr, _missing)
+        self.old_value = _missing
+
+    @property
+    def hits(self):
+        return self.hit_counter.value
+
+    @property
+    def old_value_repr(self):
+        return _safe_repr(self.old_value)
+
+    @property
+    def value_repr(self):
+        return _safe_repr(self.value)
+
+    def update(self, value):
+        """
+        Set the new value. Return `True` when it changed.
+        """
+        if _values_differ(self.value, value):
+            self.old_value = self.value
+            self.value = value
+            return True
+        return False
+
+    def check(self):
+        " Compare the current value with the previous one. (For frame watchpoints.) "
+        return self.update(getattr(self.obj, self.attr, _missing))
+
+
+def _create_hook(class_hook):
+    """
+    Create the `__setattr__` function for a `_ClassHook`.
+    """
+    def __setattr__(obj, name, value):
+        class_hook.original_setattr(obj, name, value)
+
+        watchpoints = class_hook.watchpoints.get((id(obj), name))
+        if watchpoints:
+            frame = sys._getframe(1)
+            for watchpoint in watchpoints:
+                if watchpoint.update(value):
+                    class_hook.on_change(watchpoint, frame)
+
+    return __setattr__
+
+#: The code object of all `__setattr__` hooks. (The debugger doesn't trace
+#: frames running this code.)
+hook_code = _create_hook(None).__code__
+
+
+class _ClassHook(object):
+    """
+    The `__setattr__` hook of one class.
+
+    :raises TypeError: When the class can't be modified.
+    """
+    def __init__(self, cls, on_change):
+        self.cls = cls
+        self.on_change = on_change
+
+        # Maps (id(obj), attr) tuples to lists of `Watchpoint` objects.
+        self.watchpoints = {}
+
+        self._own_setattr = cls.__dict__.get('__setattr__')
+
+        if self._own_setattr is not None:
+            self.original_setattr = self._own_setattr
+        else:
+            def original_setattr(obj, name, value):
+                super(cls, obj).__setattr__(name, value)
+            self.original_setattr = original_setattr
+
+        cls.__setattr__ = _create_hook(self)
+
+    def remove(self):
+        " Restore the original `__setattr__`. "
+        if self._own_setattr is not None:
+            self.cls.__setattr__ = self._own_setattr
+        else:
+            del self.cls.__setattr__
+
+
+class WatchpointTable(object):
+    """
+    All the watchpoints.
+
+    :param on_change: Callable that's called with a `Watchpoint` and the
+        frame that changed the attribute, every time a hooked attribute
+        changes.
+    """
+    def __init__(self, on_change):
+        self.on_change = on_change
+
+        self._watchpoints = {}  # Number -> `Watchpoint`.
+        self._next_number = 1
+        self._class_hooks = {}  # Class -> `_ClassHook`.
+
+        #: Watchpoints that are checked after every line in their frame.
+        self.frame_watchpoints = []
+
+    def __len__(self):
+        return len(self._watchpoints)
+
+    def __iter__(self):
+        return iter(sorted(self._watchpoints.values(), key=lambda w: w.number))
+
+    def add(self, expression, obj, attr, frame):
+        """
+        Watch `obj.attr`. When the class of `obj` can't be hooked, the value
+        is compared after every line in `frame`.
+        """
+        cls = type(obj)
+        hook = self._class_hooks.get(cls)
+
+        if hook is None:
+            try:
+                hook = _ClassHook(cls, self.on_change)
+            except (TypeError, AttributeError):
+                hook = None
+            else:
+                self._class_hooks[cls] = hook
+
+        if hook is None:
+            watchpoint = Watchpoint(self._next_number, expression, obj, attr, frame)
+            self.frame_watchpoints = self.frame_watchpoints + [watchpoint]
+        else:
+            watchpoint = Watchpoint(self._next_number, expression, obj, attr)
+            key = (id(obj), attr)
+            hook.watchpoints[key] = hook.watchpoints.get(key, []) + [watchpoint]
+
+        self._watchpoints[watchpoint.number] = watchpoint
+        self._next_number += 1
+        return watchpoint
+
+    def remove(self, number):
+        " Remove a watchpoint. Raise `KeyError` when it doesn't exist. "
+        watchpoint = self._watchpoints.pop(number)
+
+        if watchpoint.frame is not None:
+            self.frame_watchpoints = [w for w in self.frame_watchpoints if w is not watchpoint]
+            return
+
+        cls = type(watchpoint.obj)
+        hook = self._class_hooks[cls]
+        key = (id(watchpoint.obj), watchpoint.attr)
+
+        remaining = [w for w in hook.watchpoints[key] if w is not watchpoint]
+        if remaining:
+            hook.watchpoints[key] = remaining
+        else:
+            del hook.watchpoints[key]
+
+        if not hook.watchpoints:
+            hook.remove()
+            del self._class_hooks[cls]
+
+    def clear(self):
+        for number in list(self._watchpoints):
+            self.remove(number)
+
+    def remove_frame(self, frame):
+        """
+        Remove the frame watchpoints of a frame that returned, and return
+        them. (Otherwise, they would keep the frame alive.)
+        """
+        removed = [w for w in self.frame_watchpoints if w.frame is frame]
+        for watchpoint in removed:
+            self.remove(watchpoint.number)
+        return removed
+
+    def check_frame(self, frame):
+        """
+        Compare the frame watchpoints of this frame. Return the first one
+        that changed, or `None`.
+        """
+        result = None
+        for watchpoint in self.frame_watchpoints:
+            if watchpoint.frame is frame and watchpoint.check() and result is None:
+                result = watchpoint
+        return result
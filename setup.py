@@ -14,4 +14,9 @@ setup(
         'ptpython==0.33',
         'prompt-toolkit>=1.0.0,<2.0.0',
     ],
+    entry_points={
+        'console_scripts': [
+            'ptpdb-attach = ptpdb.remote:main',
+        ]
+    },
 )
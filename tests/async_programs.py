@@ -0,0 +1,91 @@
+"""
+Coroutines for the tests. (Python 3.5+ syntax: only imported there.)
+"""
+from __future__ import unicode_literals
+
+from ptpdb.coroutines import EventLoopPump, get_task_state
+
+import asyncio
+import os
+
+
+async def sleep():
+    await asyncio.sleep(0)
+
+
+async def failing():
+    await asyncio.sleep(0)
+    raise ValueError
+
+
+async def awaiting():
+    await sleep()
+    try:
+        await failing()
+    except ValueError:
+        return 1
+
+
+async def program(pdb):
+    pdb.set_trace()
+    await sleep()
+    await asyncio.sleep(0)
+    return 1
+
+
+async def task_states():
+    """
+    Return the states of a finished, a cancelled and a pending task.
+    """
+    finished = asyncio.ensure_future(sleep())
+    cancelled = asyncio.ensure_future(sleep())
+    pending = asyncio.ensure_future(asyncio.sleep(10))
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    states = [get_task_state(t) for t in (finished, cancelled, pending)]
+    pending.cancel()
+    return states
+
+
+class PipeContext(object):
+    " Stands in for the context of the prompt_toolkit input hook. "
+    def __init__(self, fd):
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+
+async def serve_other_task():
+    """
+    Run an `EventLoopPump`, like the prompt does, until another task writes
+    input. Return the task that was current in the other task, the other
+    task, and the current task after the pump returned. (Or `None` when the
+    pump is not supported.)
+    """
+    pump = EventLoopPump.for_running_loop()
+    if pump is None:
+        return
+
+    read_fd, write_fd = os.pipe()
+    seen = []
+
+    async def other():
+        await asyncio.sleep(0)
+        seen.append(asyncio.current_task())
+        os.write(write_fd, b'x')
+
+    other_task = asyncio.ensure_future(other())
+    try:
+        pump(PipeContext(read_fd))
+        current = asyncio.current_task()
+
+        # The iteration of the event loop that runs this task goes on.
+        await asyncio.sleep(0)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+    return seen[0], other_task, current
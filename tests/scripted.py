@@ -0,0 +1,82 @@
+"""
+A `PtPdb` that reads its commands from a list instead of the prompt, for
+the tests.
+
+prompt_toolkit requires a terminal, so the debugger is created on a
+pseudo-terminal. The output is drained in a thread (and discarded).
+"""
+from __future__ import unicode_literals
+
+import os
+import pty
+import sys
+import threading
+
+from ptpdb import PtPdb
+
+__all__ = (
+    'ScriptedPdb',
+    'create_debugger',
+    'stop_tracing',
+)
+
+
+class ScriptedPdb(PtPdb):
+    """
+    Debugger that records where it stops and its messages, and runs
+    `commands`.
+    """
+    def message(self, msg):
+        self.output.append(str(msg))
+        PtPdb.message(self, msg)
+
+    def error(self, msg):
+        self.output.append(str(msg))
+        PtPdb.error(self, msg)
+
+    def _get_input(self):
+        frame = self.curframe
+        self.stops.append((frame.f_code.co_name, frame.f_lineno))
+
+        if not self.commands:
+            return 'continue'
+        return self.commands.pop(0)
+
+
+def _drain(fd):
+    try:
+        while os.read(fd, 65536):
+            pass
+    except OSError:
+        pass
+
+
+def create_debugger(commands, cls=ScriptedPdb, **kw):
+    """
+    Create a debugger on a pseudo-terminal that runs `commands`, and stops
+    tracing after the last one.
+    """
+    master, slave = pty.openpty()
+
+    thread = threading.Thread(target=_drain, args=(master, ))
+    thread.daemon = True
+    thread.start()
+
+    saved = sys.stdin, sys.stdout, sys.__stdout__
+    sys.stdin = os.fdopen(slave, 'r')
+    sys.stdout = sys.__stdout__ = os.fdopen(os.dup(slave), 'w')
+    try:
+        pdb = cls(**kw)
+    finally:
+        sys.stdin, sys.stdout, sys.__stdout__ = saved
+
+    pdb.stops = []
+    pdb.output = []
+    pdb.commands = list(commands)
+    return pdb
+
+
+def stop_tracing():
+    " Stop tracing this thread, and the threads that are started. "
+    sys.settrace(None)
+    threading.settrace(None)
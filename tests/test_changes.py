@@ -0,0 +1,88 @@
+from __future__ import unicode_literals
+
+from ptpdb.changes import take_snapshot, diff_snapshots
+from scripted import create_debugger, stop_tracing
+
+import bdb
+import gc
+import unittest
+import weakref
+
+
+class Sentinel(object):
+    pass
+
+
+#: Weak references to the `sentinel` locals of `inner`.
+sentinels = []
+
+
+def inner(pdb, items):
+    sentinel = Sentinel()
+    sentinels.append(weakref.ref(sentinel))
+    pdb.set_trace()
+    items.append(1)
+    count = len(items)
+    return count
+
+
+def program(pdb):
+    inner(pdb, [])
+    inner(pdb, [])
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_diff(self):
+        items = []
+        old = take_snapshot({'items': items, 'x': 1, 'y': 'a', 'removed': None})
+        items.append(1)
+        new = take_snapshot({'items': items, 'x': 2, 'y': 'a', 'added': None})
+
+        diff = diff_snapshots(old, new)
+        self.assertEqual(diff.added, ['added'])
+        self.assertEqual(diff.removed, ['removed'])
+        self.assertEqual(diff.rebound, ['x'])
+        self.assertEqual(diff.mutated, ['items'])
+
+    def test_equal_values_are_unchanged(self):
+        old = take_snapshot({'x': 1000, 'y': 'a' * 10})
+        new = take_snapshot({'x': int('1000'), 'y': 'a' * int('10')})
+        self.assertFalse(diff_snapshots(old, new))
+
+
+class ChangesCommandTest(unittest.TestCase):
+    def run_program(self, commands):
+        del sentinels[:]
+        pdb = create_debugger(commands)
+        try:
+            program(pdb)
+        except bdb.BdbQuit:
+            pass
+        finally:
+            stop_tracing()
+        return pdb
+
+    def assertFramesFreed(self):
+        gc.collect()
+        self.assertTrue(sentinels)
+        self.assertEqual([ref() for ref in sentinels], [None] * len(sentinels))
+
+    def test_changes(self):
+        pdb = self.run_program(['next', 'changes', 'next', 'changes', 'continue', 'changes'])
+        self.assertEqual([o for o in pdb.output if o.startswith(('mutated', 'added', 'No'))], [
+            'mutated  items = [1]',
+            'added    count = 1',
+            'No changes.',  # Another call of `inner`.
+        ])
+
+    def test_frame_is_not_kept_alive_after_continue(self):
+        self.run_program(['next', 'continue', 'next'])
+        self.assertFramesFreed()
+
+    def test_frame_is_not_kept_alive_after_quit(self):
+        self.run_program(['next', 'quit'])
+        self.assertFramesFreed()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+from __future__ import unicode_literals
+
+from scripted import create_debugger, stop_tracing
+
+import unittest
+
+
+def program(pdb):
+    stats = 1
+    pdb.set_trace()
+    return stats
+
+
+class ShadowingTest(unittest.TestCase):
+    def test_command_shadows_variable(self):
+        pdb = create_debugger(['stats', '!stats', 'stats 1', 'continue'])
+        try:
+            program(pdb)
+        finally:
+            stop_tracing()
+
+        hint = '("stats" is a debugger command. Type "!stats" for the variable.)'
+        self.assertEqual(pdb.output.count(hint), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
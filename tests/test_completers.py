@@ -0,0 +1,50 @@
+from __future__ import unicode_literals
+
+from prompt_toolkit.document import Document
+from ptpdb.completers import ExceptionClassCompleter
+
+import sys
+import unittest
+
+
+class Errors(object):
+    " Namespace with an exception class, and a property that must not run. "
+    calls = []
+
+    class CustomError(ValueError):
+        pass
+
+    @property
+    def CustomProperty(self):
+        self.calls.append('CustomProperty')
+        return ValueError
+
+
+class FakePdb(object):
+    def __init__(self, frame, locals):
+        self.curframe = frame
+        self.curframe_locals = locals
+
+
+class ExceptionClassCompleterTest(unittest.TestCase):
+    def get_completions(self, text, **locals):
+        completer = ExceptionClassCompleter(FakePdb(sys._getframe(), locals))
+        return [c.text for c in completer.get_completions(Document(text), None)]
+
+    def test_names(self):
+        self.assertEqual(self.get_completions('KeyboardInt'), ['KeyboardInterrupt'])
+        self.assertEqual(self.get_completions('unit'), ['unittest'])
+
+    def test_dotted_names(self):
+        errors = Errors()
+        self.assertEqual(self.get_completions('errors.Cust', errors=errors), ['CustomError'])
+        self.assertEqual(self.get_completions('unittest.case.SkipT'), ['SkipTest'])
+        self.assertEqual(Errors.calls, [])
+
+    def test_no_evaluation(self):
+        self.assertEqual(self.get_completions('(1/0).x'), [])
+        self.assertEqual(self.get_completions('missing.x'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
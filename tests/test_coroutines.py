@@ -0,0 +1,102 @@
+from __future__ import unicode_literals
+
+from ptpdb.coroutines import is_coroutine, is_suspended
+from scripted import create_debugger, stop_tracing
+
+import sys
+import unittest
+
+try:
+    import asyncio
+except ImportError:  # Python 2.
+    asyncio = None
+
+
+if sys.version_info >= (3, 7):
+    from async_programs import awaiting, program, serve_other_task, sleep, task_states
+
+
+def line_of(function, offset):
+    return function.__code__.co_firstlineno + offset
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Requires asyncio.run.')
+class IsSuspendedTest(unittest.TestCase):
+    def test_return_events(self):
+        events = []
+
+        def trace(frame, event, arg):
+            if is_coroutine(frame):
+                if event == 'return':
+                    events.append((frame.f_code.co_name, is_suspended(frame)))
+                return trace
+
+        sys.settrace(trace)
+        try:
+            asyncio.run(awaiting())
+        finally:
+            sys.settrace(None)
+
+        self.assertEqual([e for e in events if e[0] in ('awaiting', 'failing')], [
+            ('awaiting', True),  # At `await sleep()`.
+            ('failing', True),
+            ('awaiting', True),  # At `await failing()`.
+            ('failing', False),  # Raises.
+            ('awaiting', False),
+        ])
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Requires asyncio.run.')
+class CoroutineSteppingTest(unittest.TestCase):
+    def run_program(self, commands):
+        pdb = create_debugger(commands)
+        try:
+            asyncio.run(program(pdb))
+        finally:
+            stop_tracing()
+        return pdb
+
+    def test_next_over_await(self):
+        # (A stop is recorded for every command.)
+        pdb = self.run_program(['next', 'next'])
+        self.assertEqual(pdb.stops, [
+            ('program', line_of(program, 2)),
+            ('program', line_of(program, 3)),
+            ('program', line_of(program, 4)),
+        ])
+
+    def test_step_into_await(self):
+        pdb = self.run_program(['step', 'step', 'step'])
+        self.assertEqual(pdb.stops, [
+            ('program', line_of(program, 2)),
+            ('sleep', line_of(sleep, 0)),
+            ('sleep', line_of(sleep, 1)),
+            ('program', line_of(program, 3)),
+        ])
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Requires asyncio.run.')
+class TaskStateTest(unittest.TestCase):
+    def test_states(self):
+        self.assertEqual(asyncio.run(task_states()), ['done', 'cancelled', 'pending'])
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Requires asyncio.run.')
+class EventLoopPumpTest(unittest.TestCase):
+    def test_other_task_runs(self):
+        async def main():
+            result = await serve_other_task()
+            return result, asyncio.current_task()
+
+        result, main_task = asyncio.run(main())
+        if result is None:
+            self.skipTest('Not supported on this Python version.')
+
+        seen, other_task, current = result
+        self.assertIs(seen, other_task)
+        self.assertTrue(other_task.done())
+        self.assertIs(current, main_task)
+
+
+if __name__ == '__main__':
+    unittest.main()
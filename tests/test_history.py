@@ -0,0 +1,46 @@
+from __future__ import unicode_literals
+
+from prompt_toolkit.enums import DEFAULT_BUFFER
+from ptpdb.history import PdbHistory
+from scripted import create_debugger
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class HistorySearchTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        self.history = PdbHistory(os.path.join(directory, 'history'), recent_count=5)
+        self.history._loader.join()
+
+        self.history.append('p needle_old')
+        for i in range(20):
+            self.history.append('p %i' % i)
+        self.history.append('p needle_new\nmore')
+
+    def test_search(self):
+        self.assertEqual(list(self.history.search('needle')), ['p needle_new\nmore', 'p needle_old'])
+        self.assertNotIn('p needle_old', self.history.strings)
+
+    def test_search_in_results_pane(self):
+        pdb = create_debugger([])
+        pdb.python_input.history = self.history
+
+        pdb.search_history('needle')
+        result_list = pdb.result_list
+        self.assertEqual([row.data for row in result_list.rows], ['p needle_new\nmore', 'p needle_old'])
+        self.assertTrue(pdb.result_list_focussed)
+
+        # Selecting an entry copies it to the prompt.
+        result_list.on_select(result_list.rows[1])
+        self.assertEqual(pdb.cli.buffers[DEFAULT_BUFFER].text, 'p needle_old')
+        self.assertIsNone(pdb.result_list)
+
+
+if __name__ == '__main__':
+    unittest.main()
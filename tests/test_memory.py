@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+
+from ptpdb import memory
+from ptpdb.memory import AllocationTracker
+
+import unittest
+
+
+def allocate():
+    return [bytearray(1000) for i in range(100)]
+
+
+@unittest.skipIf(memory.tracemalloc is None, 'tracemalloc is not available.')
+class AllocationTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshots = 0
+        take_snapshot = memory.tracemalloc.take_snapshot
+
+        def counting_take_snapshot():
+            self.snapshots += 1
+            return take_snapshot()
+
+        memory.tracemalloc.take_snapshot = counting_take_snapshot
+        self.addCleanup(setattr, memory.tracemalloc, 'take_snapshot', take_snapshot)
+
+        self.tracker = AllocationTracker()
+        self.tracker.start()
+        self.addCleanup(self.tracker.stop)
+
+    def test_one_snapshot_per_step(self):
+        tracker = self.tracker
+        kept = []
+
+        tracker.mark()
+        for i in range(3):
+            kept.append(allocate())
+            tracker.update()
+            tracker.mark()
+
+            site = tracker.get_top_sites(limit=1)[0]
+            self.assertEqual(site.lineno, allocate.__code__.co_firstlineno + 1)
+            self.assertTrue(site.size_diff >= 100 * 1000)
+            self.assertTrue(site.size >= (i + 1) * 100 * 1000)
+
+        self.assertEqual(self.snapshots, 4)
+
+    def test_released(self):
+        tracker = self.tracker
+
+        tracker.mark()
+        kept = allocate()
+        tracker.update()
+
+        del kept
+        tracker.mark()
+        tracker.update()
+
+        site = tracker.get_top_sites('growth', limit=None)[-1]
+        self.assertEqual(site.lineno, allocate.__code__.co_firstlineno + 1)
+        self.assertTrue(site.size_diff <= -100 * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
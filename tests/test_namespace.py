@@ -0,0 +1,41 @@
+from __future__ import unicode_literals
+
+from ptpdb.namespace import FrameNamespace
+
+import sys
+import unittest
+
+GLOBAL = 10
+
+
+class FrameNamespaceTest(unittest.TestCase):
+    def create(self):
+        threshold = 2
+        frame = sys._getframe()
+        return threshold, FrameNamespace(frame, frame.f_locals)
+
+    def test_lookups(self):
+        threshold, namespace = self.create()
+        self.assertEqual(eval('threshold + GLOBAL', namespace, namespace), 12)
+        self.assertIn('threshold', namespace)
+        self.assertIn('GLOBAL', namespace)
+        self.assertEqual(namespace.get('missing', 3), 3)
+
+    @unittest.skipIf(sys.version_info[0] == 2, 'Nested scopes only see the globals.')
+    def test_nested_scopes(self):
+        threshold, namespace = self.create()
+        self.assertEqual(eval('[y for y in range(5) if y > threshold]', namespace, namespace), [3, 4])
+        self.assertEqual(eval('(lambda: threshold + GLOBAL)()', namespace, namespace), 12)
+
+    def test_assignments(self):
+        threshold, namespace = self.create()
+        exec('threshold = 7\nnew = threshold + 1', namespace, namespace)
+
+        self.assertEqual(namespace.locals['threshold'], 7)
+        self.assertEqual(namespace.scratch['new'], 8)
+        self.assertNotIn('new', namespace.locals)
+        self.assertNotIn('new', namespace.globals)
+
+
+if __name__ == '__main__':
+    unittest.main()
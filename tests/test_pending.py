@@ -0,0 +1,67 @@
+from __future__ import unicode_literals
+
+from ptpdb.symbols import PROJECT_ROOT_VARIABLE
+from ptpdb.threads import _get_breakpoints_file
+from scripted import create_debugger, stop_tracing
+
+import os
+import runpy
+import shutil
+import tempfile
+import unittest
+
+SCRIPT = '''
+value = 1
+value += 1
+'''
+
+
+def program(pdb, path):
+    pdb.set_trace()
+    runpy.run_path(path)
+
+
+class BreakpointFileTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = os.path.realpath(tempfile.mkdtemp())
+        self.variable = os.environ.pop(PROJECT_ROOT_VARIABLE, None)
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+        if self.variable is not None:
+            os.environ[PROJECT_ROOT_VARIABLE] = self.variable
+
+    def test_not_saved_outside_of_a_project(self):
+        self.assertIsNone(_get_breakpoints_file('.ptpdb_breakpoints'))
+        self.assertIsNone(_get_breakpoints_file(None))
+
+    def test_saved_in_the_project(self):
+        os.mkdir('.git')
+        self.assertEqual(_get_breakpoints_file('.ptpdb_breakpoints'),
+                         os.path.join(self.directory, '.ptpdb_breakpoints'))
+
+
+class FileBreakpointTest(unittest.TestCase):
+    def test_file_that_is_not_imported(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'script.py')
+        with open(path, 'w') as f:
+            f.write(SCRIPT)
+
+        pdb = create_debugger(['break %s:3' % path, 'continue', 'continue'])
+        try:
+            program(pdb, path)
+        finally:
+            stop_tracing()
+            pdb.clear_all_breaks()
+            shutil.rmtree(directory)
+
+        self.assertEqual(pdb.stops[-1], ('<module>', 3))
+        self.assertFalse(pdb.saved_breakpoints.pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+
+from ptpdb.recorder import ExecutionRecorder, get_frame_depth
+from scripted import create_debugger, stop_tracing
+
+import sys
+import unittest
+
+depths = {}
+
+
+def leaf():
+    depths['leaf'] = get_frame_depth(sys._getframe())
+    return 1
+
+
+def start(pdb):
+    pdb.set_trace()
+    depths['start'] = get_frame_depth(sys._getframe())
+
+
+def program(pdb):
+    start(pdb)
+    depths['program'] = get_frame_depth(sys._getframe())
+    for i in range(3):
+        leaf()
+    depths['program'] = get_frame_depth(sys._getframe())
+
+
+class RecorderTest(unittest.TestCase):
+    def test_ring_buffer(self):
+        recorder = ExecutionRecorder(capacity=4)
+        frame = sys._getframe()
+        for i in range(10):
+            recorder.record(frame, i)
+
+        self.assertEqual(recorder.count, 10)
+        self.assertEqual(recorder.first_index, 6)
+        self.assertEqual([recorder[i].depth for i in range(6, 10)], [6, 7, 8, 9])
+
+    def test_recorded_depths(self):
+        # Tracing starts in `start`: its return event (and the one of
+        # `program`) has no call event.
+        pdb = create_debugger(['record on', 'continue'])
+        try:
+            program(pdb)
+        finally:
+            stop_tracing()
+
+        recorder = pdb.recorder
+        recorded = dict(
+            (event.code.co_name, event.depth)
+            for event in (recorder[i] for i in range(recorder.first_index, recorder.count))
+            if event.code.co_name in depths)
+
+        # (The line of `start` was reached before "record on".)
+        self.assertEqual(recorded['program'], depths['program'])
+        self.assertEqual(recorded['leaf'], depths['leaf'])
+        self.assertEqual(depths['leaf'], depths['program'] + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,406 @@
+from __future__ import unicode_literals
+
+from ptpdb import debug_workers, remote
+from scripted import create_debugger, stop_tracing
+from ptpdb.remote import FrameReader, Listener, connect, send_frame
+
+import json
+import os
+import selectors
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+import time
+import traceback
+import unittest
+import warnings
+
+
+def read_frame(sock, reader):
+    frames = reader.read_frames()
+    return frames[0] if frames else (None, None)
+
+
+class DebugWorkersTest(unittest.TestCase):
+    def test_refuse_following_in_debugged_process(self):
+        create_debugger([])
+        self.assertRaises(RuntimeError, debug_workers, follow_in_terminal=True)
+        self.assertNotIn(remote.ADDRESS_VARIABLE, os.environ)
+
+    @unittest.skipUnless(hasattr(os, 'register_at_fork'), 'Requires os.register_at_fork.')
+    def test_refuse_without_register_at_fork(self):
+        register_at_fork = os.register_at_fork
+        del os.register_at_fork
+        try:
+            self.assertRaises(RuntimeError, debug_workers)
+        finally:
+            os.register_at_fork = register_at_fork
+        self.assertNotIn(remote.ADDRESS_VARIABLE, os.environ)
+
+
+def forking_program(pdb, fork):
+    pdb.set_trace()
+    return fork()
+
+
+class FakeEnd(object):
+    " A session or a client, connected to a listener. "
+    def __init__(self, address):
+        self.sock = connect(address)
+        self.sock.settimeout(5)
+        self.reader = FrameReader(self.sock)
+        self._frames = []
+
+    def close(self):
+        self.sock.close()
+
+    def send(self, type, payload=b''):
+        send_frame(self.sock, type, payload)
+
+    def send_json(self, type, data):
+        self.send(type, json.dumps(data).encode('utf-8'))
+
+    def receive(self):
+        " Return the next (type, payload) frame. "
+        while not self._frames:
+            frames = self.reader.read_frames()
+            if not frames:
+                return None, None
+            self._frames.extend(frames)
+        return self._frames.pop(0)
+
+    def receive_json(self, expected_type):
+        type, payload = self.receive()
+        assert type == expected_type, (type, expected_type)
+        return json.loads(payload.decode('utf-8'))
+
+
+class ListenerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.address = os.path.join(self.directory, 'listener.sock')
+        self.listener = Listener(self.address)
+        self.listener.start()
+
+    def connect(self):
+        end = FakeEnd(self.address)
+        self.addCleanup(end.close)
+        return end
+
+    def start_session(self, **info):
+        " Register a session. Return it, and its ID. "
+        session = self.connect()
+        session.send_json(remote.HELLO, dict(info, pid=os.getpid()))
+
+        client = self.connect()
+        client.send(remote.LIST)
+        session_id = max(s['id'] for s in client.receive_json(remote.SESSIONS))
+        client.close()
+        return session, session_id
+
+    def attach(self, session, session_id):
+        " Attach a new client. "
+        client = self.connect()
+        client.send_json(remote.ATTACH, {'session': session_id, 'rows': 24, 'columns': 80})
+        self.assertEqual(session.receive()[0], remote.ATTACH)
+        session.send(remote.RESET)
+        self.assertEqual(client.receive()[0], remote.RESET)
+        return client
+
+
+class RelayTest(ListenerTestCase):
+    def test_relay(self):
+        session, session_id = self.start_session(location='program.py:10', argv='program.py')
+
+        client = self.connect()
+        client.send(remote.LIST)
+        self.assertEqual(client.receive_json(remote.SESSIONS), [{
+            'id': session_id, 'pid': os.getpid(), 'location': 'program.py:10',
+            'argv': 'program.py', 'attached': False, 'stop_number': 1,
+        }])
+
+        # Attach.
+        client.send_json(remote.ATTACH, {'session': session_id, 'rows': 24, 'columns': 80})
+        self.assertEqual(session.receive_json(remote.ATTACH),
+                         {'session': session_id, 'rows': 24, 'columns': 80})
+
+        # Output before the new compression stream starts is dropped.
+        session.send(remote.OUTPUT, b'stale')
+        session.send(remote.RESET)
+        session.send(remote.OUTPUT, b'screen')
+        self.assertEqual(client.receive(), (remote.RESET, b''))
+        self.assertEqual(client.receive(), (remote.OUTPUT, b'screen'))
+
+        # Input and resizes go to the session.
+        client.send(remote.INPUT, b'next\r')
+        client.send_json(remote.RESIZE, {'session': session_id, 'rows': 50, 'columns': 100})
+        self.assertEqual(session.receive(), (remote.INPUT, b'next\r'))
+        self.assertEqual(session.receive_json(remote.RESIZE)['rows'], 50)
+
+        # A second client can't attach.
+        other = self.connect()
+        other.send_json(remote.ATTACH, {'session': session_id, 'rows': 24, 'columns': 80})
+        self.assertEqual(other.receive(), (remote.CLOSED, b'Another client is attached to this session.'))
+
+        other.send(remote.LIST)
+        self.assertTrue(other.receive_json(remote.SESSIONS)[0]['attached'])
+
+        # Detach.
+        client.close()
+        self.assertEqual(session.receive(), (remote.DETACH, b''))
+
+        other.send(remote.LIST)
+        self.assertFalse(other.receive_json(remote.SESSIONS)[0]['attached'])
+
+    def test_session_ends(self):
+        session, session_id = self.start_session()
+        client = self.attach(session, session_id)
+
+        session.close()
+        self.assertEqual(client.receive(), (remote.CLOSED, b'The session ended.'))
+
+        client.send(remote.LIST)
+        self.assertEqual(client.receive_json(remote.SESSIONS), [])
+
+    def test_watch(self):
+        watcher = self.connect()
+        watcher.send(remote.WATCH)
+        self.assertEqual(watcher.receive_json(remote.SESSIONS), [])
+
+        session, session_id = self.start_session()
+        self.assertEqual([s['stop_number'] for s in watcher.receive_json(remote.SESSIONS)], [None])
+
+        session.send_json(remote.HELLO, {'location': 'program.py:10'})
+        self.assertEqual([s['stop_number'] for s in watcher.receive_json(remote.SESSIONS)], [1])
+
+
+class NonBlockingListenerTest(ListenerTestCase):
+    def test_slow_client(self):
+        # A client that doesn't read, while its session writes more than the
+        # socket buffers can hold.
+        slow_session, slow_id = self.start_session()
+        self.attach(slow_session, slow_id)
+        for i in range(64):
+            slow_session.send(remote.OUTPUT, b'x' * 65536)
+
+        # The other sessions are not blocked.
+        session, session_id = self.start_session()
+        client = self.attach(session, session_id)
+        session.send(remote.OUTPUT, b'hello')
+        self.assertEqual(client.receive(), (remote.OUTPUT, b'hello'))
+
+    def test_buffer_limit(self):
+        self.listener.max_buffer_size = 1024 * 1024
+
+        session, session_id = self.start_session()
+        self.attach(session, session_id)
+        for i in range(64):
+            session.send(remote.OUTPUT, b'x' * 65536)
+
+        # The client is dropped.
+        self.assertEqual(session.receive(), (remote.DETACH, b''))
+
+    def test_closed_before_writable_event(self):
+        # A connection that's closed by an earlier event of the same `select`
+        # call, while its buffer was not empty.
+        listener = Listener(os.path.join(self.directory, 'other.sock'))
+        self.addCleanup(listener.close)
+        a, b = socket.socketpair()
+        self.addCleanup(b.close)
+        a.setblocking(False)
+
+        conn = listener._connections[a] = remote._Connection(a, True)
+        key = listener._selector.register(a, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+        conn.output += b'x' * 1024
+
+        listener._close(conn)
+        self.assertEqual(conn.output, bytearray())
+
+        listener._handle_event(key, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+
+class RemoteAccessTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_private_directory(self):
+        directory = os.path.join(self.directory, 'private')
+        remote._ensure_private_directory(directory)
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+
+        # Existing directories that others can access are refused.
+        os.chmod(directory, 0o755)
+        self.assertRaises(socket.error, remote._ensure_private_directory, directory)
+
+    def test_token_file(self):
+        saved = remote.PRIVATE_DIRECTORY, os.environ.pop(remote.TOKEN_VARIABLE, None)
+        remote.PRIVATE_DIRECTORY = os.path.join(self.directory, 'private')
+        try:
+            token = remote.get_token()
+            self.assertEqual(len(token), 32)
+            self.assertEqual(remote.get_token(), token)
+            self.assertEqual(os.listdir(remote.PRIVATE_DIRECTORY), ['token'])
+        finally:
+            remote.PRIVATE_DIRECTORY = saved[0]
+            if saved[1] is not None:
+                os.environ[remote.TOKEN_VARIABLE] = saved[1]
+
+    def test_peer_credentials(self):
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        self.assertIn(remote._get_peer_uid(a), (os.getuid(), None))
+
+    @unittest.skipIf(not hasattr(os, 'geteuid') or os.geteuid() != 0, 'Requires root.')
+    def test_socket_of_other_user(self):
+        path = os.path.join(self.directory, 'other.sock')
+        Listener(path).start()
+        os.chown(path, 12345, -1)
+
+        self.assertRaises(socket.error, connect, path)
+
+    def test_tcp_token(self):
+        os.environ[remote.TOKEN_VARIABLE] = 'secret'
+        self.addCleanup(os.environ.pop, remote.TOKEN_VARIABLE)
+
+        listener = Listener(0)
+        listener.start()
+        address = '127.0.0.1:%i' % listener.sock.getsockname()[1]
+
+        # Wrong token: the connection is closed.
+        sock = socket.create_connection(('127.0.0.1', listener.sock.getsockname()[1]))
+        self.addCleanup(sock.close)
+        send_frame(sock, remote.AUTH, b'guess')
+        send_frame(sock, remote.LIST)
+        self.assertEqual(FrameReader(sock).read_frames(), [])
+
+        # `connect` sends the token.
+        sock = connect(address)
+        self.addCleanup(sock.close)
+        send_frame(sock, remote.LIST)
+        type, payload = read_frame(sock, FrameReader(sock))
+        self.assertEqual(type, remote.SESSIONS)
+        self.assertEqual(json.loads(payload.decode('utf-8')), [])
+
+
+@unittest.skipUnless(hasattr(os, 'register_at_fork'), 'Requires os.register_at_fork.')
+class ForkTest(ListenerTestCase):
+    def setUp(self):
+        ListenerTestCase.setUp(self)
+
+        variable = os.environ.get(remote.ADDRESS_VARIABLE)
+        self.addCleanup(os.environ.pop, remote.ADDRESS_VARIABLE, None)
+        if variable is not None:
+            self.addCleanup(os.environ.__setitem__, remote.ADDRESS_VARIABLE, variable)
+        self.addCleanup(setattr, remote, '_broker_pid', remote._broker_pid)
+
+        self.pdb = create_debugger(['continue'])
+        self.addCleanup(self.pdb.clear_all_breaks)
+
+    def fork(self, function):
+        """
+        Call `function` in a forked child. Return the child's pid, and a pipe
+        from which the result can be read, as JSON.
+        """
+        read_fd, write_fd = os.pipe()
+
+        with warnings.catch_warnings():
+            # (Python 3.12+ warns about forking with threads.)
+            warnings.simplefilter('ignore', DeprecationWarning)
+            pid = os.fork()
+
+        if pid == 0:
+            status = 1
+            try:
+                os.close(read_fd)
+                os.write(write_fd, json.dumps(function()).encode('utf-8'))
+                status = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(status)
+
+        os.close(write_fd)
+        self.addCleanup(os.waitpid, pid, 0)
+        return pid, os.fdopen(read_fd, 'rb')
+
+    def test_session_is_reset(self):
+        session = self.pdb.session
+        condition = session._condition
+
+        # (A breakpoint in another file: this one runs in the child.)
+        filename = os.path.join(self.directory, 'worker.py')
+        with open(filename, 'w') as f:
+            f.write('def work():\n    return 1\n')
+        self.pdb.set_break(filename, 2)
+
+        def child():
+            frames = []
+            frame = sys._getframe(1)
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+
+            return {
+                'new_lock': session._condition is not condition,
+                'traced_frames': [f.f_code.co_name for f in frames if f.f_trace is not None],
+                'trace': sys.gettrace() == session.trace_thread,
+                'breaks': sum(len(lines) for lines in session.breaks.values()),
+                'stopped': len(session.stopped),
+            }
+
+        def fork():
+            with self.fork(child)[1] as f:
+                return json.loads(f.read().decode('utf-8'))
+
+        try:
+            result = forking_program(self.pdb, fork)
+        finally:
+            stop_tracing()
+
+        self.assertEqual(result, {
+            'new_lock': True,
+            'traced_frames': [],  # The parent's debugger doesn't trace them.
+            'trace': True,  # New calls are still traced for the breakpoint.
+            'breaks': 1,
+            'stopped': 0,
+        })
+
+    def test_worker_registers_with_broker(self):
+        remote.start_broker(self.address)
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, write_fd)
+
+        def child():
+            address = self.pdb.session.debugger_options['remote']
+            terminal = remote.RemoteTerminal(address)
+
+            # Stay registered until the parent has seen this session.
+            os.read(read_fd, 1)
+            terminal.close()
+            return address
+
+        pid, result = self.fork(child)
+
+        client = self.connect()
+        deadline = time.time() + 5
+        while True:
+            client.send(remote.LIST)
+            pids = [s['pid'] for s in client.receive_json(remote.SESSIONS)]
+            if pid in pids or time.time() > deadline:
+                break
+            time.sleep(.05)
+
+        os.write(write_fd, b'x')
+        with result:
+            self.assertEqual(json.loads(result.read().decode('utf-8')), self.address)
+        self.assertIn(pid, pids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+
+from ptpdb import SnapshotPdb
+from ptpdb.snapshots import Snapshot, _default_path, _try_pickle, snapshot
+from scripted import ScriptedPdb, create_debugger
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+
+class ScriptedSnapshotPdb(ScriptedPdb, SnapshotPdb):
+    pass
+
+
+class Secret(object):
+    def __init__(self, data):
+        self.data = data
+
+
+def crash(value):
+    total = value * 2
+    raise ValueError('boom %i' % total)
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_round_trip(self):
+        try:
+            crash(21)
+        except ValueError as e:
+            path = snapshot(e, os.path.join(self.directory, 'crash.snapshot'))
+
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+        pdb = create_debugger(['p total', 'next', 'up', 'p str(e)', 'quit'],
+                              cls=ScriptedSnapshotPdb, snapshot=Snapshot(path))
+        pdb.run()
+
+        self.assertEqual(pdb.stops[0], ('crash', crash.__code__.co_firstlineno + 2))
+        self.assertEqual(pdb.stops[-1][0], 'test_round_trip')
+        self.assertIn('42', pdb.output)
+        self.assertIn('This is a snapshot: nothing can be executed. (Use "quit" to leave.)',
+                      pdb.output)
+        self.assertIn("'boom 42'", pdb.output)
+
+    def test_default_paths_are_unique(self):
+        self.assertNotEqual(_default_path(), _default_path())
+
+    def test_large_values_are_not_pickled(self):
+        self.assertIsNone(_try_pickle(bytearray(50 * 1024 * 1024)))
+        self.assertIsNone(_try_pickle(list(range(1000000))))
+        self.assertIsNone(_try_pickle([bytearray(10000) for i in range(100)]))
+        self.assertIsNone(_try_pickle(Secret(bytearray(1024 * 1024))))
+        self.assertIsNotNone(_try_pickle(Secret(list(range(100)))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+from ptpdb.layout import PREVIEW_WIDTH, get_preview_line
+from ptpdb.prefetch import SourceView
+from scripted import create_debugger
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# A minified line of 10MB.
+LONG_LINE = 'x = [%s]\n' % ', '.join(['1'] * (5 * 1024 * 1024))
+
+LINES = ['import os\n', LONG_LINE, 'y = 2\n']
+
+
+class SourceViewTest(unittest.TestCase):
+    def test_long_line(self):
+        start = time.time()
+        view = SourceView(LINES, 1000, 500)
+        self.assertTrue(view.highlight(lambda: False))
+        self.assertLess(time.time() - start, 2)
+
+        self.assertTrue(view.has_long_lines)
+        self.assertEqual(view.text.split('\n')[:3], ['import os', LONG_LINE[500:1500], 'y = 2'])
+        self.assertEqual(view.get_cursor_position(3), len('import os\n') + 1001)
+        self.assertEqual(''.join(t[1] for t in view.token_lines[1]), LONG_LINE[500:1500])
+
+    def test_preview_line(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'minified.py')
+        with open(filename, 'w') as f:
+            f.writelines(LINES)
+
+        line = get_preview_line(filename, 2)
+        self.assertEqual(line, LONG_LINE[:PREVIEW_WIDTH] + '…')
+        self.assertEqual(get_preview_line(filename, 3), 'y = 2')
+
+
+class ListTest(unittest.TestCase):
+    def setUp(self):
+        self.pdb = create_debugger([])
+        self.printed = []
+        self.pdb.cli.print_tokens = self.printed.append
+
+    def get_printed_lines(self):
+        return [''.join(t[1] for t in tokens) for tokens in self.printed]
+
+    def test_list(self):
+        start = time.time()
+        self.pdb._print_lines_2(LINES, 1, 3)
+        self.assertLess(time.time() - start, 2)
+
+        lines = self.get_printed_lines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith('  2 ' + LONG_LINE[:self.pdb.long_line_width] + '\n'))
+
+    def test_longlist(self):
+        # (Pdb passes the lines of the function, and its first line number.)
+        self.pdb._print_lines(LINES[1:], 2)
+
+        lines = self.get_printed_lines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith('  2 ' + LONG_LINE[:self.pdb.long_line_width] + '\n'))
+        self.assertTrue(lines[1].endswith('  3 y = 2\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
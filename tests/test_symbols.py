@@ -0,0 +1,126 @@
+from __future__ import unicode_literals
+
+from ptpdb.symbols import SymbolIndex, find_project_root, PROJECT_ROOT_VARIABLE
+from scripted import create_debugger, stop_tracing
+
+import bdb
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def target():
+    return 1
+
+
+class Counter(object):
+    " Counts the evaluations of `counter.function`. "
+    evaluations = 0
+
+    @property
+    def function(self):
+        Counter.evaluations += 1
+        return target
+
+
+def program(pdb):
+    counter = Counter()
+    pdb.set_trace()
+    return counter
+
+
+class ProjectRootTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = os.path.realpath(tempfile.mkdtemp())
+        self.variable = os.environ.pop(PROJECT_ROOT_VARIABLE, None)
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+        if self.variable is not None:
+            os.environ[PROJECT_ROOT_VARIABLE] = self.variable
+
+    def test_not_a_project(self):
+        self.assertIsNone(find_project_root())
+        self.assertIsNone(SymbolIndex().root)
+
+    def test_project_file(self):
+        open('setup.py', 'w').close()
+        self.assertEqual(find_project_root(), self.directory)
+
+    def test_variable(self):
+        os.environ[PROJECT_ROOT_VARIABLE] = self.cwd
+        try:
+            self.assertEqual(find_project_root(), self.cwd)
+        finally:
+            del os.environ[PROJECT_ROOT_VARIABLE]
+
+    def test_walk_is_bounded(self):
+        path = self.directory
+        for i in range(5):
+            path = os.path.join(path, 'package%i' % i)
+            os.mkdir(path)
+            open(os.path.join(path, 'module.py'), 'w').close()
+
+        files = SymbolIndex(root=self.directory, max_project_directories=3)._get_project_files()
+        self.assertEqual(len(files), 2)
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_filename = os.path.join(self.directory, 'symbols')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def save_session(self, *filenames):
+        " Save the cache like a session that indexed these files. "
+        index = SymbolIndex(self.cache_filename, root=False, max_cache_sessions=2)
+        index._save_cache(dict(
+            (f, (1.0, 2, [('function', 'function', 3, 4)])) for f in filenames))
+        return index
+
+    def test_round_trip(self):
+        self.save_session('/a.py')
+        self.assertEqual(SymbolIndex(self.cache_filename)._load_cache(), {
+            '/a.py': (1.0, 2, [('function', 'function', 3, 4)]),
+        })
+
+    def test_old_entries_are_dropped(self):
+        self.save_session('/a.py', '/b.py')
+        self.save_session('/a.py')
+        self.assertEqual(sorted(SymbolIndex(self.cache_filename)._load_cache()), ['/a.py', '/b.py'])
+
+        self.save_session('/a.py', '/c.py')
+        self.assertEqual(sorted(SymbolIndex(self.cache_filename)._load_cache()), ['/a.py', '/c.py'])
+
+    def test_one_session_saves_repeatedly(self):
+        index = self.save_session('/a.py')
+        for i in range(3):
+            index._save_cache({'/b.py': (1.0, 2, [])})
+        self.assertEqual(sorted(index._load_cache()), ['/a.py', '/b.py'])
+
+
+class BreakTest(unittest.TestCase):
+    def test_function_name_is_evaluated_once(self):
+        Counter.evaluations = 0
+        pdb = create_debugger(['tbreak counter.function', 'continue'])
+        try:
+            program(pdb)
+        finally:
+            stop_tracing()
+
+        code = target.__code__
+        breakpoints = list(bdb.Breakpoint.bplist.get((code.co_filename, code.co_firstlineno), []))
+        pdb.clear_all_breaks()
+
+        self.assertEqual(Counter.evaluations, 1)
+        self.assertEqual([bp.funcname for bp in breakpoints], ['target'])
+
+
+if __name__ == '__main__':
+    unittest.main()
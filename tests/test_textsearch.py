@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+
+from ptpdb.textsearch import TrigramIndex, get_required_literals
+
+import linecache
+import re
+import sys
+import unittest
+
+# Sources that are only in `linecache`.
+SOURCES = {
+    '/nonexistent/ptpdb-test/a.py': 'foobar = 1\nfoobaz = 2\nbaz = foo\nfoobafoo\n',
+    '/nonexistent/ptpdb-test/b.py': 'x = "%s"\nname = "foo" + "baz"\n' % ('x' * 100),
+    '/nonexistent/ptpdb-test/c.py': 'def\nabcdef\n]yzw = xyzw\n',
+}
+
+
+def brute_force(pattern):
+    " Return the (filename, lineno) tuples of the matching lines. "
+    regex = re.compile(pattern, re.MULTILINE)
+    return sorted(set(
+        (filename, text.count('\n', 0, match.start()) + 1)
+        for filename, text in SOURCES.items()
+        for match in regex.finditer(text)))
+
+
+class RequiredLiteralsTest(unittest.TestCase):
+    def test_literals(self):
+        self.assertEqual(get_required_literals(r'foo\.bar+ baz'), ['foo.bar', ' baz'])
+        self.assertEqual(get_required_literals(r'[\]abc]defg'), ['defg'])
+
+    def test_not_parsed(self):
+        self.assertEqual(get_required_literals('foo(?!bar)'), [])
+        self.assertEqual(get_required_literals('(?P<name>foo)'), [])
+        self.assertEqual(get_required_literals('foo|bar'), [])
+
+    def test_escapes(self):
+        self.assertEqual(get_required_literals(r'\x41bcdef'), ['Abcdef'])
+        self.assertEqual(get_required_literals(r'def\x20__init__'), ['def __init__'])
+        self.assertEqual(get_required_literals(r'caf\u00e9s'), ['caf\u00e9s'])
+        self.assertEqual(get_required_literals(r'\U00000041bc'), ['Abc'])
+        self.assertEqual(get_required_literals(r'abc\101def'), ['abc', 'def'])
+        self.assertEqual(get_required_literals(r'(abc)\1def'), ['abc', 'def'])
+        self.assertEqual(get_required_literals(r'abc\N{SPACE}def'), ['abc', 'def'])
+
+    def test_repeats(self):
+        self.assertEqual(get_required_literals('x{100}'), [])
+        self.assertEqual(get_required_literals('abcd{2,3}efg'), ['abc', 'efg'])
+        self.assertEqual(get_required_literals('(abc)?(def)+'), ['def'])
+
+
+class SearchTest(unittest.TestCase):
+    index = TrigramIndex()  # (Indexing the loaded modules takes a while.)
+
+    def setUp(self):
+        for filename, text in SOURCES.items():
+            linecache.cache[filename] = (len(text), None, text.splitlines(True), filename)
+
+    def tearDown(self):
+        for filename in SOURCES:
+            linecache.cache.pop(filename, None)
+
+    def assertSameResults(self, pattern):
+        matches = self.index.search(pattern)
+        found = sorted((m[0], m[1]) for m in matches if m[0] in SOURCES)
+        self.assertEqual(found, brute_force(pattern))
+        self.assertTrue(found)
+
+    def test_lookarounds(self):
+        self.assertSameResults('foo(?!bar)')
+        self.assertSameResults('(?<=foo)baz')
+        self.assertSameResults('(?<!foo)baz')
+
+    def test_named_groups(self):
+        self.assertSameResults('(?P<quote>["])foo(?P=quote)')
+
+    def test_escapes(self):
+        self.assertSameResults(r'foo\x62az')
+        self.assertSameResults(r'\x66oo\u0062a')
+        self.assertSameResults(r'\U00000066oobar')
+        self.assertSameResults(r'foo\142az')
+        self.assertSameResults(r'(foo)ba\1')
+        if sys.version_info >= (3, 8):
+            self.assertSameResults(r'foo\N{LATIN SMALL LETTER B}az')
+
+    def test_repeats(self):
+        self.assertSameResults('x{100}')
+        self.assertSameResults('(abc)?def')
+        self.assertSameResults('[\\]x]yzw')
+
+
+if __name__ == '__main__':
+    unittest.main()
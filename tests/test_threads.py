@@ -0,0 +1,307 @@
+from __future__ import unicode_literals
+
+from ptpdb.threads import ThreadSession
+from scripted import ScriptedPdb, create_debugger, stop_tracing
+from six.moves import _thread
+
+import sys
+import threading
+import time
+import unittest
+
+
+def get_thread_trace():
+    " The trace function of the threads that are started. "
+    return getattr(threading, '_trace_hook', None)
+
+
+def work():
+    return 1
+
+
+def program(pdb):
+    pdb.set_trace()
+    return work()
+
+
+def line_of(function, offset):
+    return function.__code__.co_firstlineno + offset
+
+
+class FakeDebugger(object):
+    " Debugger for a `ThreadSession` without terminal. "
+    def __init__(self, **options):
+        self.resolved = []
+
+    def thread_stopped(self):
+        pass
+
+    def _set_stopinfo(self, stopframe, returnframe, stoplineno=0):
+        pass
+
+    def _resolve_saved_breakpoint(self, saved, filename):
+        self.resolved.append((saved, filename, _thread.get_ident()))
+
+
+def start_thread(target, *a):
+    thread = threading.Thread(target=target, args=a)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+class LoggingPdb(ScriptedPdb):
+    " Logs which thread reads a command, and whether it owns the terminal. "
+    log = []
+
+    def _get_input(self):
+        ident = _thread.get_ident()
+        self.log.append((ident, self.session.owner == ident))
+        return ScriptedPdb._get_input(self)
+
+
+class ThreadTracingTest(unittest.TestCase):
+    def run_program(self, commands, **kw):
+        pdb = create_debugger(commands, **kw)
+        try:
+            program(pdb)
+            return pdb, sys.gettrace(), get_thread_trace()
+        finally:
+            stop_tracing()
+            pdb.clear_all_breaks()
+
+    def test_not_following_by_default(self):
+        pdb, trace, thread_trace = self.run_program([
+            'break %s:%i' % (__file__, work.__code__.co_firstlineno + 1), 'continue'])
+
+        self.assertIsNone(thread_trace)
+        self.assertFalse(pdb.session.tracing_threads)
+
+    def test_continue_without_breakpoints(self):
+        pdb, trace, thread_trace = self.run_program(['continue'], follow_threads=True)
+
+        self.assertIsNone(trace)
+        self.assertIsNone(thread_trace)
+
+    def test_traced_while_there_are_breakpoints(self):
+        location = '%s:%i' % (__file__, work.__code__.co_firstlineno + 1)
+        pdb, trace, thread_trace = self.run_program(
+            ['break ' + location, 'continue', 'clear ' + location, 'continue'],
+            follow_threads=True)
+
+        self.assertEqual(pdb.stops[2][0], 'work')
+        self.assertIsNone(trace)
+        self.assertIsNone(thread_trace)
+
+        pdb.set_break(__file__, work.__code__.co_firstlineno + 1)
+        self.assertEqual(get_thread_trace(), pdb.session.trace_thread)
+        pdb.clear_all_breaks()
+        self.assertIsNone(get_thread_trace())
+
+
+
+class ThreadSessionTest(unittest.TestCase):
+    def test_one_prompt_at_a_time(self):
+        session = ThreadSession(FakeDebugger)
+        events = []
+
+        def stop(name):
+            session.acquire_terminal(FakeDebugger(), sys._getframe())
+            events.append(('prompt', session.owner == _thread.get_ident()))
+            time.sleep(.02)
+            events.append(('resume', None))
+            session.release_terminal()
+
+        for thread in [start_thread(stop, i) for i in range(3)]:
+            thread.join()
+
+        self.assertEqual(events, [('prompt', True), ('resume', None)] * 3)
+        self.assertIsNone(session.owner)
+        self.assertFalse(session.stopped)
+
+    def test_freeze(self):
+        session = ThreadSession(FakeDebugger)
+        session.set_freeze_threads(True)
+        session.acquire_terminal(FakeDebugger(), sys._getframe())
+        ran = threading.Event()
+
+        def run():
+            session.wait_while_frozen()
+            ran.set()
+
+        thread = start_thread(run)
+        self.assertFalse(ran.wait(.1))
+
+        session.release_terminal()
+        thread.join()
+        self.assertTrue(ran.is_set())
+        self.assertFalse(session.frozen)
+
+    def test_switch_to(self):
+        session = ThreadSession(FakeDebugger)
+        session.acquire_terminal(FakeDebugger(), sys._getframe())
+        owners = []
+
+        def stop():
+            session.acquire_terminal(FakeDebugger(), sys._getframe())
+            owners.append(session.owner)
+            session.release_terminal()
+
+        thread = start_thread(stop)
+        while len(session.stopped) < 2:
+            time.sleep(.01)
+
+        number = session.get_number(thread.ident)
+        self.assertFalse(session.switch_to(session.get_number(_thread.get_ident())))
+        self.assertTrue(session.switch_to(number))
+        thread.join()
+
+        self.assertEqual(owners, [thread.ident])
+        self.assertEqual(session.owner, _thread.get_ident())
+        session.release_terminal()
+
+    def test_resolution_by_the_thread_at_the_prompt(self):
+        session = ThreadSession(FakeDebugger)
+        debugger = FakeDebugger()
+        owned = threading.Event()
+        resume = threading.Event()
+
+        def prompt():
+            session.set_debugger(debugger)
+            session.acquire_terminal(debugger, sys._getframe())
+            owned.set()
+            resume.wait()
+            session.release_terminal()
+
+        thread = start_thread(prompt)
+        owned.wait()
+
+        # Imported by this thread, while the other one is at the prompt.
+        session._resolve_saved_breakpoint('saved', 'module.py')
+        self.assertEqual(debugger.resolved, [])
+
+        resume.set()
+        thread.join()
+        self.assertEqual(debugger.resolved, [('saved', 'module.py', thread.ident)])
+
+        # Nobody at the prompt: resolved by the importing thread.
+        session._resolve_saved_breakpoint('saved', 'module.py')
+        self.assertEqual(session.get_debugger().resolved,
+                         [('saved', 'module.py', _thread.get_ident())])
+
+    def test_reset_after_fork(self):
+        session = ThreadSession(FakeDebugger)
+        session.breaks['module.py'] = [1]
+        session.acquire_terminal(FakeDebugger(), sys._getframe())
+        condition = session._condition
+
+        session.reset_after_fork()
+
+        self.assertIsNot(session._condition, condition)
+        self.assertIsNone(session.owner)
+        self.assertFalse(session.stopped)
+        self.assertEqual(session.breaks, {'module.py': [1]})
+
+
+class SharedBreakpointsTest(unittest.TestCase):
+    def test_copy_on_write(self):
+        pdb = create_debugger([])
+        filename = pdb.canonic(__file__)
+        first, second = line_of(work, 1), line_of(program, 1)
+        try:
+            pdb.set_break(filename, first)
+            lines = pdb.breaks[filename]
+            pdb.set_break(filename, second)
+
+            self.assertEqual(lines, [first])
+            self.assertEqual(pdb.breaks[filename], [first, second])
+
+            lines = pdb.breaks[filename]
+            pdb.clear_break(filename, first)
+            self.assertEqual(lines, [first, second])
+            self.assertEqual(pdb.breaks[filename], [second])
+        finally:
+            pdb.clear_all_breaks()
+
+    def test_new_debugger_while_breakpoints_exist(self):
+        # (Like the debugger of a thread that hits a breakpoint.)
+        pdb = create_debugger([])
+        filename = pdb.canonic(__file__)
+        try:
+            pdb.set_break(filename, line_of(work, 1))
+            other = create_debugger([])
+            self.assertEqual(other.breaks[filename], [line_of(work, 1)])
+        finally:
+            pdb.clear_all_breaks()
+
+    def test_concurrent_readers(self):
+        pdb = create_debugger([])
+        filename = pdb.canonic(__file__)
+        done = threading.Event()
+        errors = []
+
+        def read():
+            try:
+                while not done.is_set():
+                    for lineno in pdb.breaks.get(filename, ()):
+                        assert lineno in (line_of(work, 1), line_of(program, 1))
+            except Exception as e:
+                errors.append(e)
+
+        thread = start_thread(read)
+        try:
+            for i in range(200):
+                pdb.set_break(filename, line_of(work, 1))
+                pdb.set_break(filename, line_of(program, 1))
+                pdb.clear_break(filename, line_of(work, 1))
+                pdb.clear_break(filename, line_of(program, 1))
+        finally:
+            done.set()
+            thread.join()
+            pdb.clear_all_breaks()
+
+        self.assertEqual(errors, [])
+
+
+class ThreadCommandTest(unittest.TestCase):
+    def test_switch_to_stopped_thread(self):
+        del LoggingPdb.log[:]
+        pdb = create_debugger(['!start_worker()', 'continue'], cls=LoggingPdb)
+        worker_pdb = create_debugger(['continue'], cls=LoggingPdb)
+
+        def worker():
+            try:
+                worker_pdb.set_trace()
+                work()
+            finally:
+                stop_tracing()
+
+        def start_worker():
+            thread = start_thread(worker)
+            while thread.ident not in pdb.session.stopped:
+                time.sleep(.01)
+            pdb.commands.insert(0, 'thread %i' % pdb.session.get_number(thread.ident))
+            threads.append(thread)
+
+        threads = []
+        globals()['start_worker'] = start_worker
+        try:
+            program(pdb)
+        finally:
+            stop_tracing()
+            del globals()['start_worker']
+        threads[0].join()
+
+        main, other = _thread.get_ident(), threads[0].ident
+        self.assertEqual(LoggingPdb.log, [
+            (main, True),  # !start_worker()
+            (main, True),  # thread <number>
+            (other, True),  # continue
+            (main, True),  # continue
+        ])
+        self.assertIn('Back in thread %i (%s).' % (
+            pdb.session.get_number(main), threading.current_thread().name), pdb.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
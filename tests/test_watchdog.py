@@ -0,0 +1,115 @@
+from __future__ import unicode_literals
+
+from ptpdb.watchdog import Watchdog, EvaluationTimeout
+
+import threading
+import time
+import unittest
+
+
+def busy_loop():
+    while True:
+        pass
+
+
+class WatchdogTest(unittest.TestCase):
+    def setUp(self):
+        self.watchdog = Watchdog()
+        if not self.watchdog.can_interrupt:
+            self.skipTest('This Python implementation cannot interrupt threads.')
+
+    def test_result_and_elapsed_time(self):
+        result, elapsed = self.watchdog.call(1, lambda a, b: a + b, 1, b=2)
+        self.assertEqual(result, 3)
+        self.assertGreaterEqual(elapsed, 0)
+        self.assertFalse(self.watchdog.interrupted)
+
+    def test_timeout(self):
+        start = time.time()
+        with self.assertRaises(EvaluationTimeout) as cm:
+            self.watchdog.call(.2, busy_loop)
+
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(cm.exception.budget, .2)
+        self.assertTrue(self.watchdog.interrupted)
+
+    def test_state_after_timeout(self):
+        with self.assertRaises(EvaluationTimeout):
+            self.watchdog.call(.1, busy_loop)
+
+        # No pending asynchronous exception leaks into the next calls.
+        result, elapsed = self.watchdog.call(1, lambda: sum(range(100000)))
+        self.assertEqual(result, sum(range(100000)))
+        self.assertFalse(self.watchdog.interrupted)
+
+        deadline = time.time() + .5
+        while time.time() < deadline:
+            pass
+
+        self.assertEqual(self.watchdog.call(None, lambda: 'ok')[0], 'ok')
+
+    def test_timeout_in_blocking_call(self):
+        # The exception is only raised when `time.sleep` returns, after the
+        # deadline. It's raised before `call` returns, and not later.
+        try:
+            self.watchdog.call(.05, time.sleep, .2)
+        except EvaluationTimeout:
+            pass
+        self.assertTrue(self.watchdog.interrupted)
+
+        deadline = time.time() + .3
+        while time.time() < deadline:
+            pass
+
+    def test_interrupt_caught_by_callable(self):
+        def catching():
+            try:
+                busy_loop()
+            except KeyboardInterrupt:
+                return 'caught'
+
+        result, elapsed = self.watchdog.call(.1, catching)
+        self.assertEqual(result, 'caught')
+        self.assertTrue(self.watchdog.interrupted)
+
+    def test_threads_after_caught_interrupt(self):
+        # Threads that are started with a trace function (like when the
+        # debugger follows threads) still run after an interrupt.
+        def catching():
+            try:
+                busy_loop()
+            except KeyboardInterrupt:
+                pass
+
+        threading.settrace(lambda *a: None)
+        try:
+            self.watchdog.call(.1, catching)
+
+            started = threading.Event()
+            thread = threading.Thread(target=started.set)
+            thread.daemon = True
+            thread.start()
+            self.assertTrue(started.wait(5))
+
+            with self.assertRaises(EvaluationTimeout):
+                Watchdog().call(.1, busy_loop)
+        finally:
+            threading.settrace(None)
+
+    def test_keyboard_interrupt_of_callable(self):
+        def interrupt():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt) as cm:
+            self.watchdog.call(5, interrupt)
+        self.assertNotIsInstance(cm.exception, EvaluationTimeout)
+        self.assertFalse(self.watchdog.interrupted)
+
+    def test_without_budget(self):
+        result, elapsed = self.watchdog.call(None, time.sleep, .05)
+        self.assertGreaterEqual(elapsed, .04)
+        self.assertFalse(self.watchdog.interrupted)
+
+
+if __name__ == '__main__':
+    unittest.main()
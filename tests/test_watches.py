@@ -0,0 +1,87 @@
+from __future__ import unicode_literals
+
+from ptpdb.layout import WatchPanel
+from ptpdb.watches import Watch, fingerprint
+from pygments.token import Token
+from scripted import ScriptedPdb, create_debugger, stop_tracing
+
+import unittest
+import weakref
+
+
+def program(pdb):
+    x = 1
+    y = float('nan')
+    pdb.set_trace()
+    x = 2
+    y = float('nan')
+    return x, y
+
+
+class PanelPdb(ScriptedPdb):
+    " Records the values in the watch panel at every stop. "
+    def _get_input(self):
+        if not hasattr(self, 'panel'):
+            self.panel = WatchPanel(weakref.ref(self))
+            self.panels = []
+
+        self.panels.append([
+            (token, text) for token, text in self.panel.get_tokens(None)
+            if token in (Token.Watch.Value, Token.Watch.Changed)])
+        return ScriptedPdb._get_input(self)
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_nan(self):
+        self.assertEqual(fingerprint(float('nan')), fingerprint(float('nan')))
+        self.assertEqual(fingerprint(complex('nan')), fingerprint(complex('nan')))
+        self.assertNotEqual(fingerprint(float('nan')), fingerprint(1.))
+
+    def test_mutation(self):
+        value = [1, 2, 3]
+        before = fingerprint(value, sample_size=2)
+        value[0] = 4
+        self.assertNotEqual(fingerprint(value, sample_size=2), before)
+        self.assertEqual(fingerprint(value), fingerprint(value))
+
+
+class WatchTest(unittest.TestCase):
+    def test_nan_is_unchanged(self):
+        watch = Watch('value')
+        self.assertTrue(watch.update({}, {'value': float('nan')}))
+        self.assertFalse(watch.update({}, {'value': float('nan')}))
+        self.assertEqual(watch.value_repr, 'nan')
+
+    def test_error(self):
+        watch = Watch('1 / value')
+        self.assertTrue(watch.update({}, {'value': 0}))
+        self.assertTrue(watch.value_repr.startswith('** raised ZeroDivisionError'))
+        self.assertFalse(watch.update({}, {'value': 0}))
+        self.assertTrue(watch.update({}, {'value': 1}))
+
+
+class DisplayTest(unittest.TestCase):
+    def test_display_and_undisplay(self):
+        pdb = create_debugger(
+            ['display x', 'display y', 'next', 'next', 'undisplay x', 'display'], cls=PanelPdb)
+        try:
+            program(pdb)
+        finally:
+            stop_tracing()
+
+        V, C = Token.Watch.Value, Token.Watch.Changed
+        self.assertEqual(pdb.panels, [
+            [],
+            [(C, '1')],  # Just added.
+            [(C, '1'), (C, 'nan')],
+            [(C, '2'), (V, 'nan')],  # After `x = 2`.
+            [(V, '2'), (V, 'nan')],  # After `y = float('nan')`.
+            [(V, 'nan')],
+            [(V, 'nan')],  # (The final `continue`.)
+        ])
+        self.assertIn('display x: 1', pdb.output)
+        self.assertEqual(pdb.output[-2:], ['Currently displaying:', 'y: nan'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+from __future__ import unicode_literals
+
+from scripted import ScriptedPdb, create_debugger, stop_tracing
+
+import sys
+import types
+import unittest
+
+
+class Point(object):
+    def __init__(self):
+        self.x = 0
+
+
+def move(point):
+    point.x = 1
+    point.x += 1
+    return point.x
+
+
+def program(pdb, point):
+    pdb.set_trace()
+    move(point)
+    return point.x
+
+
+def set_in_frame(pdb, module):
+    pdb.set_trace()
+    module.x = 1
+    module.x = 2
+
+
+def program_with_frame_watchpoint(pdb, module):
+    set_in_frame(pdb, module)
+    return sys.gettrace()
+
+
+def line_of(function, offset):
+    return function.__code__.co_firstlineno + offset
+
+
+class FollowingPdb(ScriptedPdb):
+    follow_threads = True
+
+
+class WatchpointTest(unittest.TestCase):
+    def run_program(self, commands, cls=ScriptedPdb):
+        point = Point()
+        pdb = create_debugger(commands, cls=cls)
+        try:
+            program(pdb, point)
+        finally:
+            stop_tracing()
+            pdb.watchpoints.clear()
+        return pdb
+
+    def test_stop_after_change(self):
+        # (A stop is recorded for every command.)
+        pdb = self.run_program(['watch point.x', 'continue', 'continue', 'unwatch'])
+        self.assertEqual(pdb.stops, [
+            ('program', line_of(program, 2)),
+            ('program', line_of(program, 2)),
+            ('move', line_of(move, 2)),
+            ('move', line_of(move, 3)),
+            ('move', line_of(move, 3)),
+        ])
+        self.assertIn('New value: 2', pdb.output)
+
+    def test_step_after_change(self):
+        for cls in ScriptedPdb, FollowingPdb:
+            pdb = self.run_program(
+                ['watch point.x', 'continue', 'unwatch', 'step', 'step', 'step'], cls)
+            self.assertEqual(pdb.stops, [
+                ('program', line_of(program, 2)),
+                ('program', line_of(program, 2)),
+                ('move', line_of(move, 2)),
+                ('move', line_of(move, 2)),
+                ('move', line_of(move, 3)),
+                ('move', line_of(move, 3)),  # Return event.
+                ('program', line_of(program, 3)),
+            ])
+
+    def test_frame_watchpoint_removed_on_return(self):
+        # Modules can't be hooked, so this is compared after every line.
+        module = types.ModuleType('watched')
+        module.x = 0
+        pdb = create_debugger(['watch module.x', 'continue', 'continue'])
+        try:
+            trace = program_with_frame_watchpoint(pdb, module)
+        finally:
+            stop_tracing()
+            pdb.watchpoints.clear()
+
+        self.assertEqual(pdb.stops, [
+            ('set_in_frame', line_of(set_in_frame, 2)),
+            ('set_in_frame', line_of(set_in_frame, 2)),
+            ('set_in_frame', line_of(set_in_frame, 3)),
+        ])
+        self.assertIn('Watchpoint 1 deleted: frame set_in_frame returned.', pdb.output)
+        self.assertEqual(len(pdb.watchpoints), 0)
+
+        # Without watchpoints, the caller runs without tracing.
+        self.assertIsNone(trace)
+
+
+if __name__ == '__main__':
+    unittest.main()